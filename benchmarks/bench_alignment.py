@@ -0,0 +1,64 @@
+"""Sibling alignment benchmark: thousands of repeated premis:event elements.
+
+The delivered section has one event inserted at the start and one removed
+in the middle. Compares the section with tag-only alignment
+(SequenceMatcher) and with keyed alignment on the event identifier, and
+reports time and number of findings per size.
+
+    python benchmarks/bench_alignment.py --sizes 1000 4000
+"""
+import argparse
+import json
+import time
+
+from lxml import etree
+
+from compare_mets.config import DEFAULT_NAMESPACES, DEFAULT_SECTIONS, make_config
+from compare_mets.tree_compare import compare_trees
+
+PREMIS = "info:lc/xmlns/premis-v2"
+KEY = "premis:eventIdentifier/premis:eventIdentifierValue"
+
+
+def event(value: str):
+    el = etree.Element(f"{{{PREMIS}}}event")
+    ident = etree.SubElement(el, f"{{{PREMIS}}}eventIdentifier")
+    etree.SubElement(ident, f"{{{PREMIS}}}eventIdentifierValue").text = value
+    etree.SubElement(el, f"{{{PREMIS}}}eventType").text = "migration"
+    etree.SubElement(el, f"{{{PREMIS}}}eventOutcome").text = f"ok {value}"
+    return el
+
+
+def section(n_events: int, mutated: bool = False):
+    root = etree.Element(f"{{{PREMIS}}}premis", nsmap={"premis": PREMIS})
+    for i in range(n_events):
+        root.append(event(f"EV{i}"))
+    if mutated:
+        root.insert(0, event("EV-NEW"))
+        root.remove(root[n_events // 2])
+    return root
+
+
+def timed(template, mets, config):
+    start = time.perf_counter()
+    findings = compare_trees(template, mets, "mets:digiprovMD", config)
+    return {"seconds": time.perf_counter() - start, "findings": len(findings)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000])
+    args = parser.parse_args()
+
+    tag_only = make_config(DEFAULT_NAMESPACES, DEFAULT_SECTIONS, ())
+    keyed = make_config(DEFAULT_NAMESPACES, DEFAULT_SECTIONS, (), {"premis:event": KEY})
+    results = {}
+    for n in args.sizes:
+        template, mets = section(n), section(n, mutated=True)
+        results[str(n)] = {"tag_only": timed(template, mets, tag_only),
+                           "keyed": timed(template, mets, keyed)}
+    print(json.dumps({"benchmark": "alignment", "sizes": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
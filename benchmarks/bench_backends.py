@@ -0,0 +1,73 @@
+"""Backend benchmark: process versus thread workers at several worker counts.
+
+Compares all pairs of a synthetic corpus (see corpus.py) with
+compare_files on the process backend and on the thread backend, for each
+worker count, and reports wall time, files/s and the speedup of threads
+over processes. Threads scale as far as lxml releases the GIL while it
+parses; on a free-threaded Python build they do not share a GIL at all.
+
+    python benchmarks/bench_backends.py --objects 1000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sysconfig
+import tempfile
+import time
+from pathlib import Path
+
+from compare_mets.compare import compare_files
+from compare_mets.config import default_config
+from compare_mets.execution import BACKENDS
+from compare_mets.parser import discover
+
+from corpus import CorpusSpec, generate
+
+
+def timed(mets, templates, config, workers: int, backend: str) -> dict:
+    start = time.perf_counter()
+    errors = compare_files(mets, templates, config, max_workers=workers, backend=backend)
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3), "files_per_s": round(len(mets) / seconds, 1),
+            "objects_with_findings": len(errors)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=CorpusSpec.files)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per case; the fastest counts.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    config = default_config()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate(root, CorpusSpec(objects=args.objects, files=args.files))
+        mets, templates = discover([root / "batch" / "BATCH1"], root / "templates")
+        for workers in args.workers:
+            case = {"workers": workers}
+            for backend in BACKENDS:
+                runs = [timed(mets, templates, config, workers, backend)
+                        for _ in range(args.repeat)]
+                case[backend] = min(runs, key=lambda run: run["seconds"])
+            case["thread_speedup"] = round(case["process"]["seconds"]
+                                           / case["thread"]["seconds"], 2)
+            results.append(case)
+    print(json.dumps({
+        "benchmark": "backends",
+        "python": platform.python_version(),
+        "free_threaded": bool(sysconfig.get_config_var("Py_GIL_DISABLED")),
+        "cpus": os.cpu_count(),
+        "objects": args.objects,
+        "runs": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
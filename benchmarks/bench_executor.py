@@ -0,0 +1,63 @@
+"""Executor benchmark: small runs in the main process versus on a process pool.
+
+Compares the first n pairs of a synthetic corpus (see corpus.py) for
+several n, once in the main process (--workers 0) and once on a freshly
+started pool, and reports the wall time of both and what the execution
+policy picks for that run.
+
+    python benchmarks/bench_executor.py --objects 200 --sizes 5 20 50 200 --workers 4
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from compare_mets.compare import _auto_workers, compare_files
+from compare_mets.config import default_config
+from compare_mets.execution import choose_strategy, sample_sizes
+from compare_mets.parser import discover
+
+from corpus import CorpusSpec, generate
+
+
+def timed(mets, templates, config, workers) -> float:
+    start = time.perf_counter()
+    compare_files(mets, templates, config, max_workers=workers)
+    return round(time.perf_counter() - start, 3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 50, 200])
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Pool size to compare with (default: half the cores).")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    config = default_config()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate(root, CorpusSpec(objects=max(args.sizes + [args.objects])))
+        mets, templates = discover([root / "batch" / "BATCH1"], root / "templates")
+        ids = sorted(mets)
+        for n in args.sizes:
+            subset = {cid: mets[cid] for cid in ids[:n]}
+            workers = args.workers or _auto_workers(n)
+            strategy = choose_strategy(n, sample_sizes(list(subset.values())),
+                                       _auto_workers(n))
+            results.append({
+                "files": n,
+                "inline_seconds": timed(subset, templates, config, 0),
+                "pool_seconds": timed(subset, templates, config, workers),
+                "pool_workers": workers,
+                "policy": "inline" if strategy.inline else f"{strategy.workers} workers",
+            })
+    print(json.dumps({"benchmark": "executor", "runs": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
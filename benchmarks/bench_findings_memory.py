@@ -0,0 +1,100 @@
+"""Memory benchmark: compact Finding representation vs the former dataclass.
+
+Simulates a systemic supplier error: every object carries the same few
+findings, with strings rebuilt per object as a worker does. Reports the
+parent-side memory (tracemalloc) of holding all findings and the bytes
+pickled from the workers, for the former representation (frozen dataclass
+without slots, one pickled Finding list per object) and the compact one
+(slotted Finding, string table per chunk, pooled strings in the parent).
+
+    python benchmarks/bench_findings_memory.py --objects 100000
+"""
+import argparse
+import json
+import pickle
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+from compare_mets.findings import (Finding, StringPool, StringTable, decode_findings,
+                                   encode_findings)
+
+
+@dataclass(frozen=True)
+class LegacyFinding:
+    """The Finding class before it was slotted."""
+    section: str
+    kind: str
+    path: str
+    template_value: Optional[str] = None
+    mets_value: Optional[str] = None
+
+
+SYSTEMIC = [
+    ("mets:digiprovMD", "text", "mets:digiprovMD[DPMD2]/mets:mdWrap/mets:xmlData/"
+     "premis:agent/premis:agentName", "Karmac Informatie & Innovatie B.V.", "Karmac B.V."),
+    ("mets:dmdSec", "attribute", "mets:dmdSec[DMD1]/mets:mdWrap/@MDTYPE", "MODS", "mods"),
+    ("kbmd:catalogRecord", "missing-element", "kbmd:catalogRecord/kbmd:annotation",
+     "kbmd:annotation", None),
+]
+
+
+def worker_findings(cls, object_index: int):
+    """Findings of one object, with fresh string objects like a worker produces."""
+    return [cls(*(None if v is None else "".join(list(v)) for v in row)) for row in SYSTEMIC]
+
+
+def measure(build):
+    tracemalloc.start()
+    kept, transported = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current, transported
+
+
+def legacy(n_objects: int, chunk_size: int):
+    kept, transported = {}, 0
+    for start in range(0, n_objects, chunk_size):
+        chunk = [(f"OBJ{i}", worker_findings(LegacyFinding, i))
+                 for i in range(start, min(start + chunk_size, n_objects))]
+        payload = pickle.dumps(chunk)
+        transported += len(payload)
+        for key, findings in pickle.loads(payload):
+            kept[key] = findings
+    return kept, transported
+
+
+def compact(n_objects: int, chunk_size: int):
+    kept, transported, pool = {}, 0, StringPool()
+    for start in range(0, n_objects, chunk_size):
+        table = StringTable()
+        rows = [(f"OBJ{i}", encode_findings(worker_findings(Finding, i), table))
+                for i in range(start, min(start + chunk_size, n_objects))]
+        payload = pickle.dumps((table.strings, rows))
+        transported += len(payload)
+        strings, rows = pickle.loads(payload)
+        shared = pool.resolve(strings)
+        for key, encoded in rows:
+            kept[key] = decode_findings(encoded, shared)
+    return kept, transported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    args = parser.parse_args()
+
+    results = {}
+    for name, build in (("legacy", legacy), ("compact", compact)):
+        memory, transported = measure(lambda: build(args.objects, args.chunk_size))
+        results[name] = {"parent_bytes": memory, "pickled_bytes": transported}
+    results["parent_ratio"] = results["compact"]["parent_bytes"] / results["legacy"]["parent_bytes"]
+    results["pickled_ratio"] = results["compact"]["pickled_bytes"] / results["legacy"]["pickled_bytes"]
+    print(json.dumps({"benchmark": "findings_memory", "objects": args.objects, **results},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Scaling benchmark: grouping findings of a change that hits every object.
+
+A systemic supplier error puts the same finding in every object, so one
+group collects all object IDs. Groups N and 4N objects with the grouping
+engine and with the former list-based grouping (which checked every new ID
+against the list so far), and reports the time per object. Exits with
+status 1 if the engine scales worse than linearly.
+
+    python benchmarks/bench_grouping.py --objects 20000
+"""
+import argparse
+import json
+import sys
+import time
+from collections import OrderedDict
+
+from compare_mets.findings import Finding
+from compare_mets.writer import group_findings
+
+SYSTEMIC = [
+    Finding("mets:digiprovMD", "text", "mets:digiprovMD[DPMD2]/premis:agentName",
+            "Karmac Informatie & Innovatie B.V.", "Karmac B.V."),
+    Finding("mets:dmdSec", "attribute", "mets:dmdSec[DMD1]/mets:mdWrap/@MDTYPE",
+            "MODS", "mods"),
+]
+
+# Allowed growth of the time per object from N to 4N before the run fails.
+SUPERLINEAR_FACTOR = 2.0
+
+
+def legacy_group_findings(errors):
+    """writer.group_findings before the grouping engine."""
+    groups = OrderedDict()
+    for report_key, findings in errors.items():
+        oid = report_key.split(" - ")[0]
+        for f in findings:
+            occurrences = groups.setdefault((f.section, f.kind, f.path), OrderedDict())
+            ids = occurrences.setdefault((f.template_value, f.mets_value), [])
+            if oid not in ids:
+                ids.append(oid)
+    return groups
+
+
+def timed(group, n_objects: int) -> float:
+    errors = {f"OBJ{i:08d} - batch": SYSTEMIC for i in range(n_objects)}
+    start = time.perf_counter()
+    group(errors)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=20_000)
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="do not time the former quadratic grouping")
+    args = parser.parse_args()
+
+    sizes = (args.objects, 4 * args.objects)
+    groupings = [("engine", group_findings)]
+    if not args.skip_legacy:
+        groupings.append(("legacy", legacy_group_findings))
+    results = {}
+    for name, group in groupings:
+        seconds = [timed(group, n) for n in sizes]
+        results[name] = {
+            "seconds": dict(zip(map(str, sizes), seconds)),
+            "scaling": (seconds[1] / sizes[1]) / (seconds[0] / sizes[0]),
+        }
+    print(json.dumps({"benchmark": "grouping", "objects": args.objects, **results}, indent=2))
+    if results["engine"]["scaling"] > SUPERLINEAR_FACTOR:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
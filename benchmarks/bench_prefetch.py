@@ -0,0 +1,95 @@
+"""Prefetch benchmark: worker utilisation with simulated slow storage.
+
+Compares the pairs of a synthetic corpus (see corpus.py) in one process,
+as a worker does, with every file read through a reader that sleeps for
+a per-file latency plus size / bandwidth, like an SMB share. Without
+prefetching each read blocks the parser; with a Prefetcher the reads of
+the next pairs overlap with parsing. Reports wall time, CPU time and
+utilisation (CPU / wall) for both.
+
+    python benchmarks/bench_prefetch.py --objects 200 --latency-ms 5 --bandwidth-mb 100
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from compare_mets.compare import compare_one
+from compare_mets.config import default_config
+from compare_mets.parser import discover
+from compare_mets.plan import compile_plan
+from compare_mets.prefetch import DEFAULT_BUDGET, DEFAULT_THREADS, Prefetcher, read_file
+
+from corpus import CorpusSpec, generate
+
+
+class SlowStorage:
+    """read_file with a latency per file and a limited bandwidth."""
+
+    def __init__(self, latency: float, bandwidth: float):
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def read(self, path: Path) -> bytes:
+        data = read_file(path)
+        time.sleep(self.latency + len(data) / self.bandwidth)
+        return data
+
+
+def run(pairs, plan, storage: SlowStorage, prefetcher=None) -> dict:
+    wall, cpu = time.perf_counter(), time.process_time()
+    findings = 0
+    if prefetcher is None:
+        items = ((pair, {path: storage.read(path) for path in pair[1:]}) for pair in pairs)
+    else:
+        items = prefetcher.iterate(pairs, lambda pair: list(pair[1:]))
+    for (cid, mets_path, template_path), prefetched in items:
+        result = compare_one(cid, mets_path, template_path, plan, prefetched=prefetched)
+        findings += len(result[1]) if result else 0
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return {"seconds": round(wall, 3), "cpu_seconds": round(cpu, 3),
+            "utilisation": round(cpu / wall, 3), "files_per_s": round(len(pairs) / wall, 1),
+            "findings": findings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--files", type=int, default=CorpusSpec.files)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--bandwidth-mb", type=float, default=100.0, help="MB/s")
+    parser.add_argument("--budget-mb", type=int, default=DEFAULT_BUDGET // (1024 * 1024))
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    args = parser.parse_args()
+
+    storage = SlowStorage(args.latency_ms / 1000, args.bandwidth_mb * 1024 * 1024)
+    plan = compile_plan(default_config())
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate(root, CorpusSpec(objects=args.objects, files=args.files))
+        mets, templates = discover([root / "batch" / "BATCH1"], root / "templates")
+        pairs = [(cid, mets[cid], templates[cid]) for cid in sorted(mets)]
+        n_bytes = sum(path.stat().st_size for pair in pairs for path in pair[1:])
+        run(pairs[:5], plan, SlowStorage(0, float("inf")))  # warm up
+        sequential = run(pairs, plan, storage)
+        prefetcher = Prefetcher(args.budget_mb * 1024 * 1024, args.threads, storage.read)
+        try:
+            pipelined = run(pairs, plan, storage, prefetcher)
+        finally:
+            prefetcher.close()
+    print(json.dumps({
+        "benchmark": "prefetch",
+        "pairs": len(pairs),
+        "bytes": n_bytes,
+        "latency_ms": args.latency_ms,
+        "bandwidth_mb_per_s": args.bandwidth_mb,
+        "threads": args.threads,
+        "sequential": sequential,
+        "prefetch": pipelined,
+        "speedup": round(sequential["seconds"] / pipelined["seconds"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
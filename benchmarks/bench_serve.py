@@ -0,0 +1,119 @@
+"""Serve benchmark: latency of small jobs on the warm service versus cold CLI runs.
+
+Generates a corpus (see corpus.py) whose template tree stands in for the
+full template store, and small deliveries of a few of its objects. Each
+delivery is compared once by a fresh ``python -m compare_mets`` process
+and once as a job posted to a ``serve`` process that was started before
+(its start-up is reported separately). Reports the latency of every job
+and the median of both.
+
+    python benchmarks/bench_serve.py --templates 2000 --jobs 5 --job-objects 20
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import compare_mets
+from compare_mets.serve import submit_job
+
+from corpus import CorpusSpec, generate
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("serve did not start in time")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--templates", type=int, default=2000,
+                        help="Objects in the template tree.")
+    parser.add_argument("--jobs", type=int, default=5)
+    parser.add_argument("--job-objects", type=int, default=20,
+                        help="METS files per delivery.")
+    parser.add_argument("--files", type=int, default=CorpusSpec.files)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    src = str(Path(compare_mets.__file__).resolve().parent.parent)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate(root, CorpusSpec(objects=args.templates, files=args.files))
+        delivered = sorted((root / "batch" / "BATCH1").iterdir())
+        batches = []
+        for job in range(args.jobs):
+            batch = root / "jobs" / f"JOB{job}"
+            for obj in delivered[job * args.job_objects:(job + 1) * args.job_objects]:
+                shutil.copytree(obj, batch / obj.name)
+            batches.append(batch)
+
+        cold = []
+        for batch in batches:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "compare_mets", str(root / "templates"),
+                            str(batch), "-o", str(root / "cold"), "--quiet"],
+                           cwd=root, env=env, check=False,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            cold.append(time.perf_counter() - start)
+
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "-m", "compare_mets", "serve",
+                                   str(root / "templates"), "--port", str(port), "--quiet"],
+                                  cwd=root, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(url, server)
+            startup = time.perf_counter() - start
+            warm, exit_codes = [], []
+            for batch in batches:
+                start = time.perf_counter()
+                result = submit_job(url, [batch], root / "warm")
+                warm.append(time.perf_counter() - start)
+                exit_codes.append(result["exit_code"])
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps({
+        "benchmark": "serve",
+        "templates": args.templates,
+        "jobs": args.jobs,
+        "objects_per_job": args.job_objects,
+        "serve_startup_seconds": round(startup, 3),
+        "cold_cli_seconds": [round(t, 3) for t in cold],
+        "serve_job_seconds": [round(t, 3) for t in warm],
+        "cold_cli_median": round(statistics.median(cold), 3),
+        "serve_job_median": round(statistics.median(warm), 3),
+        "speedup": round(statistics.median(cold) / statistics.median(warm), 2),
+        "exit_codes": exit_codes,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Allocation benchmark: the tree comparator on a large sample METS.
+
+Builds a large MODS record (nested relatedItems, as for the articles of a
+thick issue) and a copy with a few changed values, and compares the
+trees directly, as the detailed walk does when the digests differ. Reports
+the peak of memory allocated during the comparison (tracemalloc) and the
+time, for the current engine and for the original recursive engine that
+built a path string for every child (tests/reference_tree_compare.py).
+
+    python benchmarks/bench_tree_compare_alloc.py --depth 6 --branching 5
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from lxml import etree
+
+from compare_mets.config import default_config
+from compare_mets.tree_compare import compare_trees
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+import reference_tree_compare  # noqa: E402
+
+MODS = "http://www.loc.gov/mods/v3"
+
+
+def sample(depth: int, branching: int, changed=()) -> etree._Element:
+    """A mods:mods record nested depth levels deep, branching children per element.
+
+    Leaves carry a title; leaves whose number is in changed get another one.
+    """
+    root = etree.Element(f"{{{MODS}}}mods", nsmap={"mods": MODS})
+    level = [root]
+    for _ in range(depth):
+        level = [etree.SubElement(parent, f"{{{MODS}}}relatedItem", type="constituent")
+                 for parent in level for _ in range(branching)]
+    for i, item in enumerate(level):
+        title = etree.SubElement(etree.SubElement(item, f"{{{MODS}}}titleInfo"),
+                                 f"{{{MODS}}}title")
+        title.text = f"Artikel {i}" if i not in changed else f"Gewijzigd {i}"
+    return root
+
+
+def measure(compare, template, mets, config):
+    tracemalloc.start()
+    start = time.perf_counter()
+    findings = compare(template, mets, "mets:dmdSec", config, "mods:mods")
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_bytes": peak, "seconds": seconds, "findings": len(findings)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--branching", type=int, default=5)
+    args = parser.parse_args()
+
+    config = default_config()
+    n_leaves = args.branching ** args.depth
+    template = sample(args.depth, args.branching)
+    mets = sample(args.depth, args.branching, changed={1, n_leaves // 2, n_leaves - 1})
+    results = {
+        "current": measure(compare_trees, template, mets, config),
+        "reference": measure(reference_tree_compare.compare_trees, template, mets, config),
+    }
+    assert results["current"]["findings"] == results["reference"]["findings"]
+    results["peak_ratio"] = results["current"]["peak_bytes"] / results["reference"]["peak_bytes"]
+    print(json.dumps({"benchmark": "tree_compare_alloc", "elements": sum(1 for _ in template.iter()),
+                      **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Synthetic corpus of METS templates and deliveries, shaped like KB METS.
+
+Every object gets a template with the compared sections (dmdSec DMD1,
+techMD TMD00001, rightsMD, sourceMD SMD1/SMD2 and a configurable number of
+digiprovMD sections) and a delivered METS that adds a fileSec and
+structMap of configurable size, as a digitisation supplier does.
+
+The injected difference is one of:
+
+- none: deliveries match their templates (only eventDateTime differs);
+- random: about one in five objects has one random change;
+- systemic: every object has the same changed agent name;
+- missing: every object lacks its last digiprovMD section.
+
+    python benchmarks/corpus.py /tmp/corpus --objects 1000 --difference random
+"""
+import argparse
+import json
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict
+
+DIFFERENCES = ("none", "random", "systemic", "missing")
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/"
+           xmlns:mods="http://www.loc.gov/mods/v3"
+           xmlns:premis="info:lc/xmlns/premis-v2"
+           xmlns:kbmd="http://schemas.kb.nl/kbmd/v1"
+           xmlns:xlink="http://www.w3.org/1999/xlink"
+           OBJID="{object_id}">
+"""
+
+DMD = """  <mets:dmdSec ID="DMD1">
+    <mets:mdWrap MDTYPE="MODS"><mets:xmlData>
+      <mods:mods>
+        <mods:titleInfo><mods:title>{title}</mods:title></mods:titleInfo>
+        <mods:name type="corporate"><mods:namePart>{publisher}</mods:namePart></mods:name>
+        <mods:originInfo><mods:dateIssued encoding="iso8601">{date}</mods:dateIssued></mods:originInfo>
+        <mods:part><mods:detail type="issue"><mods:number>{issue}</mods:number></mods:detail></mods:part>
+      </mods:mods>
+    </mets:xmlData></mets:mdWrap>
+  </mets:dmdSec>
+"""
+
+AMD_START = """  <mets:amdSec ID="AMD1">
+    <mets:techMD ID="TMD00001">
+      <mets:mdWrap MDTYPE="PREMIS:OBJECT"><mets:xmlData>
+        <premis:object><premis:objectIdentifier>
+          <premis:objectIdentifierType>local</premis:objectIdentifierType>
+          <premis:objectIdentifierValue>{object_id}</premis:objectIdentifierValue>
+        </premis:objectIdentifier></premis:object>
+      </mets:xmlData></mets:mdWrap>
+    </mets:techMD>
+    <mets:rightsMD ID="RMD1" ADMID="TMD00001">
+      <mets:mdWrap MDTYPE="PREMIS:RIGHTS"><mets:xmlData>
+        <premis:rights><premis:rightsStatement>
+          <premis:rightsBasis>{rights}</premis:rightsBasis>
+        </premis:rightsStatement></premis:rights>
+      </mets:xmlData></mets:mdWrap>
+    </mets:rightsMD>
+    <mets:sourceMD ID="SMD1">
+      <mets:mdWrap MDTYPE="OTHER"><mets:xmlData>
+        <kbmd:catalogRecord><kbmd:ppn>{ppn}</kbmd:ppn><kbmd:annotation/></kbmd:catalogRecord>
+      </mets:xmlData></mets:mdWrap>
+    </mets:sourceMD>
+    <mets:sourceMD ID="SMD2">
+      <mets:mdWrap MDTYPE="OTHER"><mets:xmlData>
+        <kbmd:metadatadump sourceProvider="KB"><kbmd:dump>{dump}</kbmd:dump></kbmd:metadatadump>
+      </mets:xmlData></mets:mdWrap>
+    </mets:sourceMD>
+"""
+
+DIGIPROV_EVENT = """    <mets:digiprovMD ID="DPMD{n}">
+      <mets:mdWrap MDTYPE="PREMIS:EVENT"><mets:xmlData>
+        <premis:event>
+          <premis:eventIdentifier><premis:eventIdentifierValue>EV{n}</premis:eventIdentifierValue></premis:eventIdentifier>
+          <premis:eventType>{event_type}</premis:eventType>
+          <premis:eventDateTime>{datetime}</premis:eventDateTime>
+          <premis:eventDetail>project=TK4;step={n}</premis:eventDetail>
+        </premis:event>
+      </mets:xmlData></mets:mdWrap>
+    </mets:digiprovMD>
+"""
+
+DIGIPROV_AGENT = """    <mets:digiprovMD ID="DPMD{n}">
+      <mets:mdWrap MDTYPE="PREMIS:AGENT"><mets:xmlData>
+        <premis:agent>
+          <premis:agentName>{agent}</premis:agentName>
+          <premis:agentType>organization</premis:agentType>
+        </premis:agent>
+      </mets:xmlData></mets:mdWrap>
+    </mets:digiprovMD>
+"""
+
+FOOTER = "</mets:mets>\n"
+
+EVENT_TYPES = ("capture", "migration", "validation", "ingestion")
+
+
+@dataclass
+class CorpusSpec:
+    objects: int = 100
+    digiprov: int = 4
+    files: int = 200          # mets:file entries in fileSec (and divs in structMap)
+    difference: str = "random"
+    seed: int = 1
+
+
+def _values(object_id: str, rng: random.Random) -> Dict[str, str]:
+    return {
+        "object_id": object_id,
+        "title": "Het Dagblad",
+        "publisher": "Uitgeverij De Courant",
+        "date": f"19{rng.randint(10, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        "issue": str(rng.randint(1, 300)),
+        "rights": "copyright",
+        "ppn": str(rng.randint(10**8, 10**9 - 1)),
+        "dump": "x" * 200,
+        "agent": "Karmac Informatie &amp; Innovatie B.V.",
+        "datetime": "2023-05-24T14:31:19.620+02:00",
+    }
+
+
+def _amd(values: Dict[str, str], digiprov: int, skip_last: bool = False) -> str:
+    parts = [AMD_START.format(**values)]
+    for n in range(1, digiprov + 1 - int(skip_last)):
+        if n % 2:
+            parts.append(DIGIPROV_EVENT.format(n=n, event_type=EVENT_TYPES[n % 4], **values))
+        else:
+            parts.append(DIGIPROV_AGENT.format(n=n, **values))
+    parts.append("  </mets:amdSec>\n")
+    return "".join(parts)
+
+
+def _file_sections(object_id: str, files: int) -> str:
+    parts = ['  <mets:fileSec>\n    <mets:fileGrp USE="Images">\n']
+    for i in range(files):
+        parts.append(f'      <mets:file ID="FILE{i:05d}" MIMETYPE="image/jp2" '
+                     f'SIZE="{1_000_000 + i}"><mets:FLocat LOCTYPE="URL" '
+                     f'xlink:href="file:///{object_id}/{object_id}_{i:05d}.jp2"/>'
+                     f'</mets:file>\n')
+    parts.append("    </mets:fileGrp>\n  </mets:fileSec>\n")
+    parts.append('  <mets:structMap TYPE="physical">\n    <mets:div TYPE="issue">\n')
+    for i in range(files):
+        parts.append(f'      <mets:div TYPE="page" ORDER="{i + 1}">'
+                     f'<mets:fptr FILEID="FILE{i:05d}"/></mets:div>\n')
+    parts.append("    </mets:div>\n  </mets:structMap>\n")
+    return "".join(parts)
+
+
+def _delivery_values(values: Dict[str, str], difference: str,
+                     rng: random.Random) -> Dict[str, str]:
+    delivered = {**values, "datetime": "2026-01-15T09:12:44.000+01:00"}
+    if difference == "systemic":
+        delivered["agent"] = "Karmac B.V."
+    elif difference == "random" and rng.random() < 0.2:
+        field = rng.choice(("title", "publisher", "issue", "rights", "ppn", "agent"))
+        delivered[field] = f"{values[field]} (gewijzigd)"
+    return delivered
+
+
+def generate(root: Path, spec: CorpusSpec) -> Dict[str, Path]:
+    """Write templates to root/templates and deliveries to root/batch/BATCH1/<id>/.
+
+    Returns the paths of both directories and writes root/corpus.json with
+    the spec, so an existing corpus can be reused.
+    """
+    if spec.difference not in DIFFERENCES:
+        raise ValueError(f"difference must be one of {DIFFERENCES}")
+    rng = random.Random(spec.seed)
+    templates = root / "templates"
+    batch = root / "batch" / "BATCH1"
+    templates.mkdir(parents=True, exist_ok=True)
+    for i in range(spec.objects):
+        object_id = f"MMKB{i:08d}"
+        values = _values(object_id, rng)
+        template = (HEADER.format(**values) + DMD.format(**values)
+                    + _amd(values, spec.digiprov) + FOOTER)
+        (templates / f"{object_id}_mets_template.xml").write_text(template, encoding="utf-8")
+
+        delivered = _delivery_values(values, spec.difference, rng)
+        mets = (HEADER.format(**delivered) + DMD.format(**delivered)
+                + _amd(delivered, spec.digiprov, skip_last=spec.difference == "missing")
+                + _file_sections(object_id, spec.files) + FOOTER)
+        object_dir = batch / object_id
+        object_dir.mkdir(parents=True, exist_ok=True)
+        (object_dir / f"{object_id}_mets.xml").write_text(mets, encoding="utf-8")
+    (root / "corpus.json").write_text(json.dumps(asdict(spec)), encoding="utf-8")
+    return {"templates": templates, "batch": batch}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", type=Path)
+    parser.add_argument("--objects", type=int, default=CorpusSpec.objects)
+    parser.add_argument("--digiprov", type=int, default=CorpusSpec.digiprov)
+    parser.add_argument("--files", type=int, default=CorpusSpec.files)
+    parser.add_argument("--difference", choices=DIFFERENCES, default=CorpusSpec.difference)
+    parser.add_argument("--seed", type=int, default=CorpusSpec.seed)
+    args = parser.parse_args()
+    spec = CorpusSpec(args.objects, args.digiprov, args.files, args.difference, args.seed)
+    paths = generate(args.root, spec)
+    print(json.dumps({"corpus": asdict(spec), **{k: str(v) for k, v in paths.items()}},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Benchmark suite: discovery, comparison, grouping and report writers.
+
+Generates (or reuses) a synthetic corpus (see corpus.py) and runs every
+case in a fresh interpreter, so that the peak RSS reported for a case is
+its own. Prints one JSON document with files/s, MB/s and peak RSS per
+case; store it to compare runs, e.g. before and after a change:
+
+    python benchmarks/run.py --objects 500 --workers 1 2 4 --output before.json
+
+compare_files reports the peak RSS of the parent and, separately, the
+largest peak among its worker processes.
+"""
+import argparse
+import json
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from compare_mets import __version__
+from compare_mets.compare import compare_files, compare_one
+from compare_mets.config import default_config
+from compare_mets.parser import discover
+from compare_mets.plan import compile_plan
+from compare_mets.procinfo import peak_children_rss_bytes, peak_rss_bytes
+from compare_mets.writer import (_write_html, _write_json, _write_markdown, group_findings,
+                                 total_findings)
+
+from corpus import DIFFERENCES, CorpusSpec, generate
+
+CASES = ("discovery", "compare_one", "compare_files", "group_findings",
+         "write_markdown", "write_json", "write_html")
+FINDINGS_CACHE = "findings.pickle"
+
+
+def _result(case: str, files: int, n_bytes: Optional[int], seconds: float,
+            **extra) -> Dict:
+    return {
+        "case": case,
+        **extra,
+        "files": files,
+        "bytes": n_bytes,
+        "seconds": round(seconds, 4),
+        "files_per_s": round(files / seconds, 1) if seconds else None,
+        "mb_per_s": round(n_bytes / (1024 * 1024) / seconds, 2)
+        if n_bytes is not None and seconds else None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "peak_children_rss_bytes": peak_children_rss_bytes(),
+    }
+
+
+def _findings(corpus: Path, mets, templates):
+    """Findings of the corpus, computed once and then read from a pickle."""
+    path = corpus / FINDINGS_CACHE
+    if path.exists():
+        with path.open("rb") as f:
+            return pickle.load(f)
+    errors = compare_files(mets, templates, default_config())
+    with path.open("wb") as f:
+        pickle.dump(dict(errors), f)
+    return errors
+
+
+def run_case(case: str, corpus: Path, workers: int) -> Dict:
+    templates_dir, batch = corpus / "templates", corpus / "batch" / "BATCH1"
+    start = time.perf_counter()
+    mets, templates = discover([batch], templates_dir)
+    if case == "discovery":
+        return _result(case, len(mets) + len(templates), None,
+                       time.perf_counter() - start)
+
+    ids = sorted(set(mets) & set(templates))
+    n_bytes = sum(mets[cid].stat().st_size + templates[cid].stat().st_size for cid in ids)
+    config = default_config()
+    if case == "compare_one":
+        plan = compile_plan(config)
+        start = time.perf_counter()
+        for cid in ids:
+            compare_one(cid, mets[cid], templates[cid], plan)
+        return _result(case, len(ids), n_bytes, time.perf_counter() - start)
+    if case == "compare_files":
+        start = time.perf_counter()
+        compare_files(mets, templates, config, max_workers=workers)
+        return _result(case, len(ids), n_bytes, time.perf_counter() - start,
+                       workers=workers)
+
+    errors = _findings(corpus, mets, templates)
+    if case == "group_findings":
+        start = time.perf_counter()
+        group_findings(errors)
+        return _result(case, len(errors), None, time.perf_counter() - start)
+
+    groups = group_findings(errors)
+    n_findings = total_findings(errors)
+    dt = datetime.now()
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "report"
+        start = time.perf_counter()
+        if case == "write_markdown":
+            _write_markdown(out, errors, set(), set(), "BATCH1", dt, n_findings,
+                            len(ids), None)
+        elif case == "write_json":
+            _write_json(out, errors, groups, set(), set(), [batch], "BATCH1", dt,
+                        n_findings, len(ids), None, "pretty")
+        elif case == "write_html":
+            _write_html(out, errors, groups, set(), set(), "BATCH1", dt, n_findings,
+                        len(ids), None)
+        else:
+            raise ValueError(f"Unknown case {case}")
+        seconds = time.perf_counter() - start
+        return _result(case, len(errors), out.stat().st_size, seconds)
+
+
+def _corpus(args) -> Path:
+    spec = CorpusSpec(args.objects, args.digiprov, args.files, args.difference, args.seed)
+    root = args.corpus or Path(tempfile.mkdtemp(prefix="compare_mets_corpus_"))
+    marker = root / "corpus.json"
+    if not marker.exists() or json.loads(marker.read_text(encoding="utf-8")) != asdict(spec):
+        (root / FINDINGS_CACHE).unlink(missing_ok=True)
+        generate(root, spec)
+    return root
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--digiprov", type=int, default=CorpusSpec.digiprov)
+    parser.add_argument("--files", type=int, default=CorpusSpec.files)
+    parser.add_argument("--difference", choices=DIFFERENCES, default=CorpusSpec.difference)
+    parser.add_argument("--seed", type=int, default=CorpusSpec.seed)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="worker counts for the compare_files case")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--corpus", type=Path, default=None,
+                        help="corpus directory to create or reuse (default: a temporary one)")
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON here")
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:  # one case, in this (fresh) interpreter
+        print(json.dumps(run_case(args.case, args.corpus, args.workers[0])))
+        return
+
+    corpus = _corpus(args)
+    results: List[Dict] = []
+    for case in args.cases:
+        for workers in (args.workers if case == "compare_files" else args.workers[:1]):
+            proc = subprocess.run(
+                [sys.executable, __file__, "--case", case, "--corpus", str(corpus),
+                 "--workers", str(workers)],
+                capture_output=True, text=True)
+            if proc.returncode != 0:
+                sys.stderr.write(proc.stderr)
+                sys.exit(proc.returncode)
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "benchmark": "suite",
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {"path": str(corpus), **asdict(CorpusSpec(
+            args.objects, args.digiprov, args.files, args.difference, args.seed))},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""METS files and templates inside zip and tar archives.
+
+Suppliers sometimes deliver a batch as one zip or tar archive, with plain
+or gzip-compressed (.xml.gz) METS files inside. Extracting such a batch
+first doubles the I/O and needs as much temporary space as the batch.
+Instead, discovery lists the members (one read of the zip central
+directory or of the tar headers) and every member becomes an ArchivePath
+holding its offset in the archive. A worker opens the archive, seeks to
+the member and streams it: stored and deflated zip members and tar
+members are read directly at their offset, so workers read different
+members of one archive in parallel without reading anything in between.
+
+Tar archives must be uncompressed (.tar): a .tar.gz has no member offsets
+to seek to. Zip members with other compression methods are read through
+zipfile.
+"""
+import gzip
+import io
+import logging
+import os
+import struct
+import tarfile
+import zipfile
+import zlib
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+ARCHIVE_SUFFIXES = (".zip", ".tar")
+GZIP_SUFFIX = ".gz"
+READ_SIZE = 64 * 1024
+
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_ZIP_LOCAL_MAGIC = b"PK\x03\x04"
+
+
+class ArchiveError(OSError):
+    """An archive or member that cannot be read; handled like any read error."""
+
+
+@dataclass(frozen=True)
+class ArchivePath:
+    """A member of a zip or tar archive, used where a file path is expected."""
+    archive: Path
+    member: str           # name inside the archive, with / separators
+    kind: str             # "zip" or "tar"
+    offset: int           # zip: offset of the local header; tar: offset of the data
+    size: int             # bytes of the member once extracted (still gzipped for .gz)
+    stored_size: int      # bytes of the member in the archive
+    method: int = zipfile.ZIP_STORED
+
+    @property
+    def name(self) -> str:
+        return PurePosixPath(self.member).name
+
+    @property
+    def stem(self) -> str:
+        """Name without its extension, and without .gz for compressed members."""
+        name = self.name
+        if name.endswith(GZIP_SUFFIX):
+            name = name[:-len(GZIP_SUFFIX)]
+        return PurePosixPath(name).stem
+
+    @property
+    def parents(self):
+        """Parents as if the archive were a directory, e.g. for the batch name."""
+        return (self.archive / self.member).parents
+
+    def __str__(self) -> str:
+        return f"{self.archive}/{self.member}"
+
+
+Source = Union[Path, ArchivePath]
+
+
+def is_archive(path: Path) -> bool:
+    return path.suffix.lower() in ARCHIVE_SUFFIXES and not path.is_dir()
+
+
+def _wanted(member: str, suffix: str, max_depth: Optional[int],
+            prune: Tuple[str, ...]) -> bool:
+    """Same selection as a directory walk: suffix (or suffix.gz), depth and prune."""
+    parts = PurePosixPath(member).parts
+    name = os.path.normcase(parts[-1])
+    if name.endswith(GZIP_SUFFIX):
+        name = name[:-len(GZIP_SUFFIX)]
+    if not name.endswith(suffix):
+        return False
+    dirs = parts[:-1]
+    if max_depth is not None and len(dirs) > max_depth:
+        return False
+    return not any(fnmatch(os.path.normcase(d), pattern)
+                   for d in dirs for pattern in prune)
+
+
+def list_members(archive: Path, suffix: str, max_depth: Optional[int] = None,
+                 prune: Iterable[str] = ()) -> List[ArchivePath]:
+    """Return the members of archive whose name ends in suffix (or suffix.gz).
+
+    max_depth and prune apply to the directories inside the archive, as for
+    a directory walk. An unreadable archive is logged and yields nothing.
+    """
+    suffix = os.path.normcase(suffix)
+    prune = tuple(os.path.normcase(pattern) for pattern in prune)
+    found = []
+    try:
+        if archive.suffix.lower() == ".zip":
+            with zipfile.ZipFile(archive) as zf:
+                for info in zf.infolist():
+                    if not info.is_dir() and _wanted(info.filename, suffix, max_depth, prune):
+                        found.append(ArchivePath(
+                            archive, info.filename, "zip", info.header_offset,
+                            info.file_size, info.compress_size, info.compress_type))
+        else:
+            with tarfile.open(archive, "r:") as tf:
+                for info in tf:
+                    if info.isreg() and _wanted(info.name, suffix, max_depth, prune):
+                        found.append(ArchivePath(archive, info.name, "tar", info.offset_data,
+                                                 info.size, info.size))
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        logging.warning(f"Cannot list archive {archive}: {e}")
+        return []
+    logging.debug(f"Listed {len(found)} members of {archive}")
+    return sorted(found, key=lambda p: p.member)
+
+
+class _Slice(io.RawIOBase):
+    """The stored_size bytes of a member, read from its offset."""
+
+    def __init__(self, f: BinaryIO, start: int, length: int):
+        f.seek(start)
+        self._f = f
+        self._remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self._remaining)
+        if n <= 0:
+            return 0
+        n = self._f.readinto(memoryview(b)[:n])
+        self._remaining -= n
+        return n
+
+
+class _Inflate(io.RawIOBase):
+    """Decompress a raw deflate stream (a deflated zip member) while reading."""
+
+    def __init__(self, raw: io.RawIOBase):
+        self._raw = raw
+        self._z = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._z.eof:
+            data = self._z.unconsumed_tail or self._raw.read(READ_SIZE)
+            if not data:
+                raise ArchiveError("Truncated deflate data")
+            try:
+                out = self._z.decompress(data, len(b))
+            except zlib.error as e:
+                raise ArchiveError(f"Corrupt deflate data: {e}") from e
+            if out:
+                b[:len(out)] = out
+                return len(out)
+        return 0
+
+
+def _zip_data_offset(f: BinaryIO, header_offset: int) -> int:
+    f.seek(header_offset)
+    header = f.read(_ZIP_LOCAL_HEADER.size)
+    if len(header) != _ZIP_LOCAL_HEADER.size:
+        raise ArchiveError("Truncated zip local header")
+    fields = _ZIP_LOCAL_HEADER.unpack(header)
+    if fields[0] != _ZIP_LOCAL_MAGIC:
+        raise ArchiveError(f"No zip local header at offset {header_offset}")
+    name_length, extra_length = fields[-2:]
+    return header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length
+
+
+@contextmanager
+def open_member(path: ArchivePath) -> Iterator[BinaryIO]:
+    """Stream the (uncompressed) content of an archive member."""
+    with ExitStack() as stack:
+        if path.kind == "zip" and path.method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            try:
+                zf = stack.enter_context(zipfile.ZipFile(path.archive))
+                stream = stack.enter_context(zf.open(path.member))
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError, KeyError) as e:
+                raise ArchiveError(f"Cannot read {path}: {e}") from e
+        else:
+            f = stack.enter_context(open(path.archive, "rb"))
+            start = _zip_data_offset(f, path.offset) if path.kind == "zip" else path.offset
+            raw = _Slice(f, start, path.stored_size)
+            if path.method == zipfile.ZIP_DEFLATED:
+                raw = _Inflate(raw)
+            stream = stack.enter_context(io.BufferedReader(raw, READ_SIZE))
+        if path.member.endswith(GZIP_SUFFIX):
+            stream = stack.enter_context(gzip.GzipFile(fileobj=stream, mode="rb"))
+        yield stream
+
+
+@contextmanager
+def open_source(path: Source):
+    """A parser source for path: the file name, or a stream for an archive member."""
+    if isinstance(path, ArchivePath):
+        with open_member(path) as stream:
+            yield stream
+    else:
+        yield str(path)
+
+
+@contextmanager
+def open_binary(path: Source) -> Iterator[BinaryIO]:
+    """Open a file or archive member for reading bytes."""
+    if isinstance(path, ArchivePath):
+        with open_member(path) as stream:
+            yield stream
+    else:
+        with open(path, "rb") as f:
+            yield f
+
+
+def read_member(path: ArchivePath) -> bytes:
+    with open_member(path) as stream:
+        return stream.read()
+
+
+def source_size(path: Source) -> int:
+    """Size of a file, or the stored size of an archive member (before gunzip)."""
+    if isinstance(path, ArchivePath):
+        return path.size
+    return os.stat(path).st_size
+
+
+def read_order(path: Source) -> Tuple[str, int]:
+    """Sort key that puts the members of an archive in the order of their offsets.
+
+    All plain files get the same key, so a stable sort leaves them in place.
+    """
+    if isinstance(path, ArchivePath):
+        return str(path.archive), path.offset
+    return "", 0
@@ -1,17 +1,32 @@
 import argparse
 import logging
 import multiprocessing
+import os
 import sys
+import tempfile
 from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Optional
 
 from tqdm.contrib.logging import logging_redirect_tqdm
 
 from . import __version__
-from .compare import compare_files, different_ids
-from .config import default_config, load_config
-from .parser import get_mets, get_templates
-from .writer import write_reports
+from .archive import is_archive
+from .compare import compare_files, different_ids, index_templates
+from .config import CompareConfig, ConfigError, config_digest, default_config, load_config
+from .execution import BACKENDS
+from .grouping import FindingGroups
+from .metrics import DEFAULT_INTERVAL, MetricsWriter
+from .parser import Manifest, discover, get_templates
+from .partial import (PartialError, merge_partials, parse_shard, partial_path, select_shard,
+                      write_partial)
+from .plan import compile_plan
+from .result_cache import DEFAULT_MAX_BYTES, ResultCache
+from .serve import DEFAULT_HOST, DEFAULT_PORT, CompareService, make_server
+from .template_index import default_index_path
+from .timings import Timings
+from .watch import DEFAULT_INTERVAL as DEFAULT_WATCH_INTERVAL, DEFAULT_SETTLE, watch
+from .writer import JSON_FORMATS, total_findings, write_reports
 
 log_queue = multiprocessing.Queue()
 
@@ -21,15 +36,18 @@ EXIT_FINDINGS = 1
 EXIT_USAGE = 2
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv=None) -> argparse.Namespace:
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(
-        description="Compare delivered METS files with KB METS templates."
+        description="Compare delivered METS files with KB METS templates.",
+        epilog="Other commands: index-templates, merge, watch, serve "
+               "(run '%(prog)s <command> -h').",
     )
     parser.add_argument("templates", type=Path,
-                        help="Path to the METS templates directory.")
+                        help="Path to the METS templates directory (or a zip/tar archive).")
     parser.add_argument("batches", type=Path, nargs="+",
-                        help="One or more batch directories with delivered METS files.")
+                        help="One or more batch directories (or zip/tar archives) with "
+                             "delivered METS files.")
     parser.add_argument(
         "-o", "--output",
         type=Path,
@@ -38,6 +56,68 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument("-c", "--config", type=Path, default=None,
                         help="Optional TOML file overriding sections/allowed deviations.")
+    parser.add_argument("--max-depth", type=int, default=None,
+                        help="Only search this many directory levels below each "
+                             "batch/template directory for METS files.")
+    parser.add_argument("--prune-dir", action="append", default=[], metavar="PATTERN",
+                        help="Do not search directories matching this name pattern, "
+                             "e.g. 'images' or '*_jp2' (repeatable).")
+    parser.add_argument("--manifest", type=Path, default=None,
+                        help="Directory manifest file; on later runs only directories "
+                             "whose modification time changed are listed again.")
+    parser.add_argument("--rescan", action="store_true",
+                        help="Ignore the stored manifest and list all directories.")
+    parser.add_argument("--no-streaming", dest="streaming", action="store_false",
+                        help="Parse complete METS documents instead of streaming "
+                             "only the compared sections.")
+    parser.add_argument("--no-fast-path", dest="fast_path", action="store_false",
+                        help="Always run the detailed comparison, also for sections "
+                             "whose normalised digests match (for verification).")
+    parser.add_argument("--prefetch", type=_count_arg(0), default=0, metavar="MB",
+                        help="Read files ahead in every worker, up to this many MB "
+                             "read but not yet parsed; helps on network shares "
+                             "(default: off).")
+    parser.add_argument("--template-index", type=Path, default=None,
+                        help="Template index built with index-templates (default: "
+                             f"{default_index_path(Path('<templates>'))} if it exists).")
+    parser.add_argument("--workers", type=_count_arg(0), default=None, metavar="N",
+                        help="Number of worker processes; 0 compares in the main process "
+                             "(default: in the main process for small runs, otherwise "
+                             "half the cores, fewer if memory is short).")
+    parser.add_argument("--max-memory", type=_count_arg(1), default=None, metavar="MB",
+                        help="Memory the workers may use together (default: 80%% of the "
+                             "available memory).")
+    parser.add_argument("--backend", choices=BACKENDS, default="process",
+                        help="Run the workers as processes, or as threads of this process: "
+                             "lxml releases the GIL while parsing, and threads need no "
+                             "pickling or logging relay (default: %(default)s).")
+
+    parser.add_argument("--json-format", choices=JSON_FORMATS, default="pretty",
+                        help="JSON report layout: indented, compact, or compact and "
+                             "gzip-compressed (.json.gz) (default: %(default)s).")
+    parser.add_argument("--spill-findings", action="store_true",
+                        help="Write findings to a temporary file in the output directory "
+                             "during the run instead of keeping them in memory.")
+    parser.add_argument("--cache", type=Path, default=None,
+                        help="Result cache file; unchanged METS/template pairs are "
+                             "served from it on re-runs.")
+    parser.add_argument("--cache-max-size", type=_count_arg(1),
+                        default=DEFAULT_MAX_BYTES // (1024 * 1024), metavar="MB",
+                        help="Evict least recently used cache entries above this size "
+                             "(default: %(default)s MB).")
+    parser.add_argument("--metrics", type=Path, default=None, metavar="FILE",
+                        help="Write live progress metrics to FILE during the comparison "
+                             "(Prometheus textfile format for *.prom, JSON otherwise).")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_INTERVAL,
+                        metavar="SECONDS",
+                        help="Rewrite the metrics file at least this often "
+                             "(default: %(default)s).")
+    parser.add_argument("--shard", type=_shard_arg, default=None, metavar="I/N",
+                        help="Compare only shard I of N of the object IDs and write a "
+                             "partial result for the merge command instead of reports.")
+    parser.add_argument("--profile", type=Path, default=None, metavar="FILE",
+                        help="Run cProfile in every worker and write the merged "
+                             "profile (pstats format) to FILE (not with --backend thread).")
 
     parser.add_argument("-v", "--verbose", action="store_true",
                         help="Enable verbose logging (DEBUG level)")
@@ -47,7 +127,159 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--version", action="version",
                         version=f"%(prog)s {__version__}",
                         help="Show program version and exit.")
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.profile is not None and args.backend == "thread":
+        parser.error("--profile cannot be combined with --backend thread")
+    return args
+
+
+def _shard_arg(text: str):
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _count_arg(minimum: int):
+    """argparse type for a whole number of at least minimum."""
+    def parse(text: str) -> int:
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"not a whole number: {text!r}") from None
+        if value < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}: {value}")
+        return value
+    return parse
+
+
+def parse_merge_args(argv) -> argparse.Namespace:
+    """Parse arguments of the merge command."""
+    parser = argparse.ArgumentParser(
+        prog="tk4-compare merge",
+        description="Combine the partial results of a sharded run (--shard) into one report.",
+    )
+    parser.add_argument("partials", type=Path, nargs="+",
+                        help="Partial result files (compare_partial-*.jsonl.gz) of all shards.")
+    parser.add_argument("-o", "--output", type=Path, default=Path("./output"),
+                        help="Directory to save output reports (default: ./output).")
+    parser.add_argument("--json-format", choices=JSON_FORMATS, default="pretty",
+                        help="JSON report layout (default: %(default)s).")
+    parser.add_argument("--spill-findings", action="store_true",
+                        help="Write findings to a temporary file in the output directory "
+                             "while merging instead of keeping them in memory.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose logging (DEBUG level)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Suppress info messages, only show errors (ERROR level)")
+    return parser.parse_args(argv)
+
+
+def parse_watch_args(argv) -> argparse.Namespace:
+    """Parse arguments of the watch command."""
+    parser = argparse.ArgumentParser(
+        prog="tk4-compare watch",
+        description="Compare delivered METS files as they arrive in the batch directories, "
+                    "rewriting the reports after every round.",
+    )
+    parser.add_argument("templates", type=Path,
+                        help="Path to the METS templates directory (or a zip/tar archive).")
+    parser.add_argument("batches", type=Path, nargs="+",
+                        help="One or more batch directories that are being uploaded.")
+    parser.add_argument("-o", "--output", type=Path, default=Path("./output"),
+                        help="Directory to save output reports (default: ./output).")
+    parser.add_argument("-c", "--config", type=Path, default=None,
+                        help="Optional TOML file overriding sections/allowed deviations.")
+    parser.add_argument("--interval", type=float, default=DEFAULT_WATCH_INTERVAL,
+                        metavar="SECONDS",
+                        help="Poll the batch directories this often (default: %(default)s).")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE, metavar="SECONDS",
+                        help="Compare a METS file once its size and modification time "
+                             "have not changed for this long (default: %(default)s).")
+    parser.add_argument("--idle", type=float, default=None, metavar="SECONDS",
+                        help="Stop after this long without new METS files "
+                             "(default: run until interrupted).")
+    parser.add_argument("--max-depth", type=int, default=None,
+                        help="Only search this many directory levels below each batch.")
+    parser.add_argument("--prune-dir", action="append", default=[], metavar="PATTERN",
+                        help="Do not search directories matching this name pattern "
+                             "(repeatable).")
+    parser.add_argument("--template-index", type=Path, default=None,
+                        help="Template index built with index-templates (default: "
+                             f"{default_index_path(Path('<templates>'))} if it exists).")
+    parser.add_argument("--prefetch", type=_count_arg(0), default=0, metavar="MB",
+                        help="Read files ahead in every worker, up to this many MB "
+                             "(default: off).")
+    parser.add_argument("--workers", type=_count_arg(1), default=None, metavar="N",
+                        help="Number of worker processes (default: half the cores).")
+    parser.add_argument("--backend", choices=BACKENDS, default="process",
+                        help="Run the workers as processes or as threads (default: "
+                             "%(default)s).")
+    parser.add_argument("--json-format", choices=JSON_FORMATS, default="pretty",
+                        help="JSON report layout (default: %(default)s).")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose logging (DEBUG level)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Suppress info messages, only show errors (ERROR level)")
+    return parser.parse_args(argv)
+
+
+def parse_serve_args(argv) -> argparse.Namespace:
+    """Parse arguments of the serve command."""
+    parser = argparse.ArgumentParser(
+        prog="tk4-compare serve",
+        description="Keep warm workers and the template listings, and run comparison "
+                    "jobs posted to a local HTTP endpoint (POST /jobs).",
+    )
+    parser.add_argument("templates", type=Path,
+                        help="Path to the METS templates directory (or a zip/tar archive) "
+                             "used by jobs that do not name one.")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="Loopback address to listen on (default: %(default)s); "
+                             "other addresses are refused, as jobs are not authenticated.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="Port to listen on (default: %(default)s).")
+    parser.add_argument("-c", "--config", type=Path, default=None,
+                        help="TOML config for jobs that do not name one.")
+    parser.add_argument("--max-depth", type=int, default=None,
+                        help="Only search this many directory levels below each "
+                             "batch/template directory for METS files.")
+    parser.add_argument("--prune-dir", action="append", default=[], metavar="PATTERN",
+                        help="Do not search directories matching this name pattern "
+                             "(repeatable).")
+    parser.add_argument("--prefetch", type=_count_arg(0), default=0, metavar="MB",
+                        help="Read files ahead in every worker, up to this many MB "
+                             "(default: off).")
+    parser.add_argument("--workers", type=_count_arg(1), default=None, metavar="N",
+                        help="Number of worker processes (default: half the cores).")
+    parser.add_argument("--backend", choices=BACKENDS, default="process",
+                        help="Run the workers as processes or as threads (default: "
+                             "%(default)s).")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose logging (DEBUG level)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Suppress info messages, only show errors (ERROR level)")
+    return parser.parse_args(argv)
+
+
+def parse_index_args(argv) -> argparse.Namespace:
+    """Parse arguments of the index-templates command."""
+    parser = argparse.ArgumentParser(
+        prog="tk4-compare index-templates",
+        description="Extract the compared sections of all METS templates into an index.",
+    )
+    parser.add_argument("templates", type=Path,
+                        help="Path to the METS templates directory (or a zip/tar archive).")
+    parser.add_argument("--index", type=Path, default=None,
+                        help="Index file to create or refresh "
+                             f"(default: {default_index_path(Path('<templates>'))}).")
+    parser.add_argument("-c", "--config", type=Path, default=None,
+                        help="Optional TOML file overriding sections/allowed deviations.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose logging (DEBUG level)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Suppress info messages, only show errors (ERROR level)")
+    return parser.parse_args(argv)
 
 
 def setup_logging(verbose: bool = False, quiet: bool = False) -> QueueListener:
@@ -83,31 +315,199 @@ def setup_logging(verbose: bool = False, quiet: bool = False) -> QueueListener:
 
 
 def validate_paths(templates: Path, batches: list) -> None:
-    """Ensure provided paths exist and are directories."""
-    if not templates.exists() or not templates.is_dir():
-        logging.error(f"Template path does not exist or is not a directory: {templates}")
+    """Ensure provided paths exist and are directories or zip/tar archives."""
+    if not templates.is_dir() and not (is_archive(templates) and templates.is_file()):
+        logging.error(f"Template path does not exist or is not a directory or archive: "
+                      f"{templates}")
         sys.exit(EXIT_USAGE)
 
     for batch in batches:
-        if not batch.exists() or not batch.is_dir():
-            logging.error(f"Batch path does not exist or is not a directory: {batch}")
+        if not batch.is_dir() and not (is_archive(batch) and batch.is_file()):
+            logging.error(f"Batch path does not exist or is not a directory or archive: "
+                          f"{batch}")
             sys.exit(EXIT_USAGE)
 
 
+def checked_config(path: Optional[Path]) -> CompareConfig:
+    """Load the config (or the defaults) and compile it once, to fail before any work starts."""
+    try:
+        config = load_config(path) if path else default_config()
+        compile_plan(config)
+    except ConfigError as e:
+        logging.error(f"Invalid configuration: {e}")
+        sys.exit(EXIT_USAGE)
+    return config
+
+
+def index_main(argv) -> None:
+    """Build or refresh the template index."""
+    args = parse_index_args(argv)
+    listener = setup_logging(verbose=args.verbose, quiet=args.quiet)
+
+    try:
+        validate_paths(args.templates, [])
+        config = checked_config(args.config)
+        templates_dict = get_templates(args.templates)
+        if not templates_dict:
+            logging.error("No template files found in the given template path.")
+            sys.exit(EXIT_USAGE)
+        index_path = args.index or default_index_path(args.templates)
+        n_indexed = index_templates(templates_dict, index_path, config=config,
+                                    log_queue=log_queue)
+        logging.info(f"Indexed {n_indexed} templates ({len(templates_dict)} in total) "
+                     f"into {index_path}")
+    finally:
+        listener.stop()
+
+    sys.exit(EXIT_OK)
+
+
+def spill_file(output: Path) -> Path:
+    """A new temporary findings spill file in the output directory."""
+    output.mkdir(parents=True, exist_ok=True)
+    fd, spill_name = tempfile.mkstemp(prefix="findings-", suffix=".jsonl.gz", dir=output)
+    os.close(fd)
+    logging.info(f"Spilling findings to {spill_name}")
+    return Path(spill_name)
+
+
+def merge_main(argv) -> None:
+    """Combine the partial results of a sharded run into one set of reports."""
+    args = parse_merge_args(argv)
+    listener = setup_logging(verbose=args.verbose, quiet=args.quiet)
+    exit_code = EXIT_OK
+
+    try:
+        spill = spill_file(args.output) if args.spill_findings else None
+        timings = Timings()
+        try:
+            with timings.phase("merge"):
+                run = merge_partials(args.partials, spill)
+        except PartialError as e:
+            logging.error(f"Cannot merge partial results: {e}")
+            if spill is not None:
+                spill.unlink(missing_ok=True)
+            sys.exit(EXIT_USAGE)
+        timings.merge(run.timings.export())
+
+        logging.info(f"Writing output to {args.output}")
+        write_reports(run.errors, run.mets_diff_ids, run.templates_diff_ids,
+                      args.output, run.batch_paths, n_compared=run.n_compared,
+                      cache_stats=run.cache_stats, json_format=args.json_format,
+                      timings=timings)
+        logging.info(
+            f"Summary: {len(run.errors)} objects with findings | "
+            f"{total_findings(run.errors)} total findings")
+        if run.errors or run.mets_diff_ids or run.templates_diff_ids:
+            exit_code = EXIT_FINDINGS
+        if spill is not None:
+            run.errors.remove()
+    finally:
+        listener.stop()
+
+    sys.exit(exit_code)
+
+
+def watch_main(argv) -> None:
+    """Compare METS files while they are being uploaded."""
+    args = parse_watch_args(argv)
+    listener = setup_logging(verbose=args.verbose, quiet=args.quiet)
+    exit_code = EXIT_OK
+
+    try:
+        validate_paths(args.templates, args.batches)
+        config = checked_config(args.config)
+        templates_dict = get_templates(args.templates)
+        if not templates_dict:
+            logging.error("No template files found in the given template path.")
+            sys.exit(EXIT_USAGE)
+        template_index = args.template_index
+        if template_index is None and default_index_path(args.templates).exists():
+            template_index = default_index_path(args.templates)
+
+        errors, mets_diff_ids, templates_diff_ids = watch(
+            args.batches, templates_dict, config, args.output,
+            interval=args.interval, settle=args.settle, idle=args.idle,
+            max_depth=args.max_depth, prune=args.prune_dir,
+            template_index=template_index, max_workers=args.workers, log_queue=log_queue,
+            json_format=args.json_format, prefetch=args.prefetch * 1024 * 1024 or None,
+            backend=args.backend)
+        logging.info(
+            f"Summary: {len(errors)} objects with findings | "
+            f"{total_findings(errors)} total findings")
+        if errors or mets_diff_ids or templates_diff_ids:
+            exit_code = EXIT_FINDINGS
+    finally:
+        listener.stop()
+
+    sys.exit(exit_code)
+
+
+def serve_main(argv) -> None:
+    """Run comparison jobs posted over HTTP until interrupted."""
+    args = parse_serve_args(argv)
+    listener = setup_logging(verbose=args.verbose, quiet=args.quiet)
+
+    try:
+        validate_paths(args.templates, [])
+        config = checked_config(args.config)
+        try:
+            server = make_server(None, args.host, args.port)
+        except ValueError as e:
+            logging.error(str(e))
+            sys.exit(EXIT_USAGE)
+        except OSError as e:
+            logging.error(f"Cannot listen on {args.host}:{args.port}: {e}")
+            sys.exit(EXIT_USAGE)
+        with server, CompareService(args.templates, config, max_workers=args.workers,
+                                    log_queue=log_queue,
+                                    max_depth=args.max_depth, prune=args.prune_dir,
+                                    prefetch=args.prefetch * 1024 * 1024 or None,
+                                    backend=args.backend) as service:
+            server.service = service
+            logging.info(f"Serving comparison jobs on "
+                         f"http://{args.host}:{server.server_port}/jobs")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                logging.info("Stopping")
+    finally:
+        listener.stop()
+
+    sys.exit(EXIT_OK)
+
+
+COMMANDS = {
+    "index-templates": index_main,
+    "merge": merge_main,
+    "watch": watch_main,
+    "serve": serve_main,
+}
+
+
 def main() -> None:
-    """Run the comparison process."""
+    """Run the comparison process, or one of the other COMMANDS."""
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     args = parse_args()
     listener = setup_logging(verbose=args.verbose, quiet=args.quiet)
     exit_code = EXIT_OK
 
     try:
         validate_paths(args.templates, args.batches)
-        config = load_config(args.config) if args.config else default_config()
-
-        logging.info("Loading METS files from batches...")
-        mets = get_mets(args.batches)
-        logging.info(f"Loading template files from {args.templates}")
-        templates_dict = get_templates(args.templates)
+        config = checked_config(args.config)
+        timings = Timings()
+
+        logging.info(f"Loading METS files from batches and templates from {args.templates}...")
+        manifest = Manifest(args.manifest, rescan=args.rescan) if args.manifest else None
+        with timings.phase("discovery"):
+            mets, templates_dict = discover(args.batches, args.templates,
+                                            max_depth=args.max_depth, prune=args.prune_dir,
+                                            manifest=manifest)
+            if manifest is not None:
+                manifest.save()
 
         if not mets:
             logging.error("No METS files found in the given batch paths.")
@@ -116,29 +516,82 @@ def main() -> None:
             logging.error("No template files found in the given template path.")
             sys.exit(EXIT_USAGE)
 
+        if args.shard is not None:
+            mets = select_shard(mets, args.shard)
+            templates_dict = select_shard(templates_dict, args.shard)
+            logging.info(f"Shard {args.shard[0]}/{args.shard[1]}: {len(mets)} METS files "
+                         f"and {len(templates_dict)} templates")
+
+        template_index = args.template_index
+        if template_index is None and default_index_path(args.templates).exists():
+            template_index = default_index_path(args.templates)
+        if template_index is not None:
+            logging.info(f"Using template index {template_index}")
+
         common_ids = set(mets.keys()) & set(templates_dict.keys())
         logging.info(
             f"Total METS: {len(mets)} | Total templates: {len(templates_dict)} "
             f"| Common IDs: {len(common_ids)}")
 
+        cache = None
+        if args.cache is not None:
+            logging.info(f"Using result cache {args.cache}")
+            cache = ResultCache(args.cache, config_digest(config),
+                                max_bytes=args.cache_max_size * 1024 * 1024)
+
+        spill = spill_file(args.output) if args.spill_findings else None
+
+        # Spilled findings are grouped from the spill file when the reports are written.
+        groups = FindingGroups() if spill is None else None
         logging.info("Comparing METS files against templates...")
-        errors = compare_files(
-            mets,
-            templates_dict,
-            config=config,
-            log_queue=log_queue,
-        )
+        try:
+            errors = compare_files(
+                mets,
+                templates_dict,
+                config=config,
+                log_queue=log_queue,
+                streaming=args.streaming,
+                template_index=template_index,
+                fast_path=args.fast_path,
+                cache=cache,
+                spill=spill,
+                groups=groups,
+                timings=timings,
+                profile=args.profile,
+                metrics=(MetricsWriter(args.metrics, args.metrics_interval)
+                         if args.metrics else None),
+                prefetch=args.prefetch * 1024 * 1024 or None,
+                max_workers=args.workers,
+                max_memory=args.max_memory * 1024 * 1024 if args.max_memory else None,
+                backend=args.backend,
+            )
+        finally:
+            if cache is not None:
+                cache.close()
 
         logging.info("Checking delivery completeness (IDs sent vs returned)...")
         mets_diff_ids, templates_diff_ids = different_ids(mets, templates_dict)
 
-        logging.info(f"Writing output to {args.output}")
-        write_reports(errors, mets_diff_ids, templates_diff_ids,
-                      args.output, args.batches, n_compared=len(common_ids))
+        cache_stats = cache.stats() if cache is not None else None
+        if args.shard is not None:
+            path = write_partial(partial_path(args.output, args.batches, args.shard),
+                                 errors, mets_diff_ids, templates_diff_ids, args.batches,
+                                 args.shard, config_digest(config), len(common_ids),
+                                 cache_stats, timings)
+            logging.info(f"Wrote partial result of shard {args.shard[0]}/{args.shard[1]} "
+                         f"to {path}; combine all shards with the merge command")
+        else:
+            logging.info(f"Writing output to {args.output}")
+            write_reports(errors, mets_diff_ids, templates_diff_ids,
+                          args.output, args.batches, n_compared=len(common_ids),
+                          cache_stats=cache_stats, json_format=args.json_format,
+                          groups=groups, timings=timings)
 
-        total_findings = sum(len(findings) for findings in errors.values())
         logging.info(
-            f"Summary: {len(errors)} objects with findings | {total_findings} total findings")
+            f"Summary: {len(errors)} objects with findings | "
+            f"{total_findings(errors)} total findings")
+        if spill is not None:
+            errors.remove()
 
         if mets_diff_ids or templates_diff_ids:
             logging.info(
@@ -147,7 +600,8 @@ def main() -> None:
         else:
             logging.info("All object IDs matched between METS and templates.")
 
-        if errors or mets_diff_ids or templates_diff_ids:
+        # A shard only reports success; the merged report decides on findings.
+        if (errors or mets_diff_ids or templates_diff_ids) and args.shard is None:
             exit_code = EXIT_FINDINGS
         logging.info("Done.")
     finally:
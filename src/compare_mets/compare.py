@@ -1,30 +1,43 @@
 import collections
+import contextlib
+import cProfile
+import itertools
 import logging
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import signal
+import threading
+import time
+from concurrent.futures import (FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor, as_completed, wait)
 from logging.handlers import QueueHandler
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
 from lxml import etree
 from tqdm import tqdm
 
-from .config import CompareConfig, default_config
-from .findings import Finding
-from .tree_compare import compare_trees, prefix_map, qname
+from .archive import open_source, read_order, source_size
+from .config import CompareConfig, config_digest, default_config
+from .execution import MemoryLimit, RecyclingExecutor, choose_strategy, sample_sizes
+from .findings import Finding, StringPool, StringTable, decode_findings, encode_findings
+from .grouping import ChunkGroups, FindingGroups
+from .metrics import MetricsWriter
+from .plan import ComparePlan, as_plan, compile_plan
+from .prefetch import Prefetched, Prefetcher
+from .procinfo import current_rss_bytes
+from .result_cache import ResultCache
+from .spill import SpilledFindings
+from .template_index import CorruptEntry, TemplateIndex, decode_sections, extract_template
+from .timings import ProfileMerger, Timings
+from .tree_compare import compare_trees, qname, tree_digest
 
 
-def _parse(path: Path):
-    parser = etree.XMLParser(remove_comments=True, remove_pis=True)
-    return etree.parse(str(path), parser)
-
-
-def _compare_section(label: str, xpath: str, template_tree, mets_tree,
-                     config: CompareConfig, common_id: str) -> List[Finding]:
-    ns = config.namespaces
-    prefixes = prefix_map(config)
-    template_nodes = template_tree.xpath(xpath, namespaces=ns)
-    mets_nodes = mets_tree.xpath(xpath, namespaces=ns)
+def _compare_section(label: str, xpath: str, template_nodes: list, mets_nodes: list,
+                     plan: ComparePlan, common_id: str,
+                     fast_path: bool = True,
+                     timings: Optional[Timings] = None) -> List[Finding]:
+    config, prefixes = plan.config, plan.prefixes
     if not template_nodes and not mets_nodes:
         logging.warning(f"XPath {xpath} not found for ID {common_id}")
         return []
@@ -56,47 +69,239 @@ def _compare_section(label: str, xpath: str, template_tree, mets_tree,
         pairs = list(zip(template_nodes, mets_nodes))
 
     for template_node, mets_node in pairs:
+        # Identical sections (the normal case) produce equal digests; only
+        # mismatches need the detailed walk.
+        if fast_path and tree_digest(template_node, config) == tree_digest(mets_node, config):
+            if timings is not None:
+                timings.count("sections_identical")
+            continue
+        if timings is not None:
+            timings.count("sections_compared")
         root_path = qname(template_node.tag, prefixes)
         if template_node.get("ID"):
             root_path += f"[{template_node.get('ID')}]"
-        findings.extend(compare_trees(template_node, mets_node, label, config, root_path))
+        findings.extend(compare_trees(template_node, mets_node, label, config, root_path,
+                                      prefixes, plan.align, timings))
     return findings
 
 
 def compare_one(common_id: str, mets_path: Path, template_path: Path,
-                config: CompareConfig) -> Optional[Tuple[str, List[Finding]]]:
-    """Compare a single METS/template pair and return (report key, findings)."""
+                config: Union[CompareConfig, ComparePlan],
+                streaming: bool = True,
+                template_blob: Optional[bytes] = None,
+                fast_path: bool = True,
+                timings: Optional[Timings] = None,
+                prefetched: Optional[Prefetched] = None,
+                ) -> Optional[Tuple[str, List[Finding]]]:
+    """Compare a single METS/template pair and return (report key, findings).
+
+    With streaming enabled only the configured sections are kept while
+    reading (see sections.py); XPaths that cannot be streamed fall back to
+    parsing the full document. template_blob holds the template sections
+    from the template index; the template file is then not read at all.
+    fast_path skips the detailed comparison of sections whose normalised
+    digests match; disable it to verify the digest against the full walk.
+    config may be a compiled plan (see plan.py), as the workers pass it.
+    timings, if given, receives bytes read, parse time, time per section
+    and the time of this file. prefetched holds the bytes of files already
+    read by a Prefetcher (see prefetch.py); those are parsed from memory.
+    """
+    plan = as_plan(config)
     findings: List[Finding] = []
+    start = time.perf_counter()
 
-    mets_tree = template_tree = None
+    mets_sections = template_sections = None
     try:
-        mets_tree = _parse(mets_path)
+        mets_sections = _extract(plan, mets_path, prefetched, streaming)
     except (etree.XMLSyntaxError, OSError) as e:
         logging.error(f"Failed to parse METS file {mets_path}: {e}")
         findings.append(Finding("(file)", "parse-error", mets_path.name, None, str(e)))
+    if template_blob is not None:
+        try:
+            template_sections = decode_sections(template_blob)
+        except CorruptEntry as e:
+            # A damaged index costs only the index lookup: read the template itself.
+            logging.warning(f"Ignoring corrupt template index entry of {template_path}: {e}")
+            template_blob = None
     try:
-        template_tree = _parse(template_path)
+        if template_sections is None:
+            template_sections = _extract(plan, template_path, prefetched, streaming)
     except (etree.XMLSyntaxError, OSError) as e:
         logging.error(f"Failed to parse template file {template_path}: {e}")
         findings.append(Finding("(file)", "parse-error", template_path.name, None, str(e)))
 
-    if mets_tree is not None and template_tree is not None:
-        for label, xpath in config.sections:
+    if timings is not None:
+        timings.add_phase("worker_parse", time.perf_counter() - start)
+        timings.count("bytes_read", _size(mets_path, prefetched) + (
+            len(template_blob) if template_blob is not None
+            else _size(template_path, prefetched)))
+
+    if mets_sections is not None and template_sections is not None:
+        for label, xpath in plan.sections:
+            section_start = time.perf_counter()
             findings.extend(_compare_section(
-                label, xpath, template_tree, mets_tree, config, common_id))
+                label, xpath, template_sections[xpath], mets_sections[xpath],
+                plan, common_id, fast_path, timings))
+            if timings is not None:
+                timings.add_section(label, time.perf_counter() - section_start)
+
+    if timings is not None:
+        seconds = time.perf_counter() - start
+        timings.add_phase("worker_files", seconds)
+        timings.count("files")
+        timings.add_file(common_id, seconds)
 
     if findings:
-        parents = mets_path.parents
-        batch_name = parents[2].name if len(parents) > 2 else parents[0].name
-        return f"{common_id} - {batch_name}", findings
+        return report_key(common_id, mets_path), findings
     return None
 
 
-def _init_worker(log_queue, level: int) -> None:
-    """Route worker-process logging into the main process via the queue."""
-    root = logging.getLogger()
-    root.handlers = [QueueHandler(log_queue)]
-    root.setLevel(level)
+def _extract(plan: ComparePlan, path: Path, prefetched: Optional[Prefetched],
+             streaming: bool) -> Dict[str, list]:
+    """Extract the sections of path from its prefetched bytes, or by reading it
+    (a file, or an archive member); re-raises a failed prefetch."""
+    data = prefetched.get(path) if prefetched is not None else None
+    if isinstance(data, OSError):
+        raise data
+    if data is not None:
+        return plan.extract(data, streaming)
+    with open_source(path) as source:
+        return plan.extract(source, streaming)
+
+
+def _size(path: Path, prefetched: Optional[Prefetched] = None) -> int:
+    data = prefetched.get(path) if prefetched is not None else None
+    if isinstance(data, bytes):
+        return len(data)
+    try:
+        return source_size(path)
+    except OSError:
+        return 0
+
+
+def report_key(common_id: str, mets_path: Path) -> str:
+    """Key of an object in the reports: its ID and the name of its batch."""
+    parents = mets_path.parents
+    batch_name = parents[2].name if len(parents) > 2 else parents[0].name
+    return f"{common_id} - {batch_name}"
+
+
+# Per-worker state, set once by the pool initializer so that the config is
+# not pickled again for every submitted task. Thread-local: with the thread
+# backend every thread is a worker of its own.
+_local = threading.local()
+
+
+def _worker_state() -> Dict:
+    return _local.__dict__
+
+
+def _init_worker(log_queue, level: int, config: CompareConfig,
+                 streaming: bool = True, fast_path: bool = True,
+                 profile: bool = False, prefetch: Optional[int] = None) -> None:
+    """Set up a worker process or thread: logging relay, the pool's compiled
+    plan and, with a prefetch byte budget, the worker's Prefetcher."""
+    if log_queue is not None:
+        # Route worker-process logging into the main process via the queue.
+        root = logging.getLogger()
+        root.handlers = [QueueHandler(log_queue)]
+        root.setLevel(level)
+    if multiprocessing.parent_process() is not None:
+        # Ctrl-C is handled by the main process, which stops the pool (and,
+        # in watch and serve mode, still writes the reports).
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    plan = compile_plan(config)
+    _worker_state().update(plan=plan, plans={config_digest(config): plan},
+                         streaming=streaming, fast_path=fast_path, profile=profile,
+                         prefetcher=Prefetcher(prefetch) if prefetch else None)
+
+
+def _plan(config: Optional[CompareConfig]) -> ComparePlan:
+    """The worker's plan for config; None means the config of the pool.
+
+    A pool that serves several runs (see serve.py) gets the config of each
+    run with its tasks; its plan is compiled once per worker and kept by
+    config digest.
+    """
+    if config is None:
+        return _worker_state()["plan"]
+    plans = _worker_state()["plans"]
+    digest = config_digest(config)
+    if digest not in plans:
+        plans[digest] = compile_plan(config)
+    return plans[digest]
+
+
+class _ChunkResult(NamedTuple):
+    """What a worker sends back for one chunk."""
+    strings: List[str]          # string table, see findings.encode_findings
+    results: list               # [(object_id, report key or None, encoded findings)]
+    groups: list                # grouping.ChunkGroups.export()
+    timings: tuple              # timings.Timings.export()
+    profile: Optional[dict]     # cProfile stats, with profiling enabled
+    pid: int
+    rss: Optional[int]          # worker's resident set size after the chunk
+    seconds: float
+
+
+def _compare_chunk(tasks: List[Tuple[str, Path, Path, Optional[bytes]]],
+                   config: Optional[CompareConfig] = None) -> _ChunkResult:
+    """Compare a chunk of (object_id, mets_path, template_path, template_blob) tasks."""
+    start = time.perf_counter()
+    state = _worker_state()
+    profiler = cProfile.Profile() if state["profile"] else None
+    if profiler is not None:
+        profiler.enable()
+    plan = _plan(config)
+    table = StringTable()
+    groups = ChunkGroups()
+    timings = Timings()
+    results = []
+    prefetcher = state["prefetcher"]
+    if prefetcher is not None:
+        items = _waited(prefetcher.iterate(tasks, _task_paths), timings)
+    else:
+        items = ((task, None) for task in tasks)
+    for (cid, mets_path, template_path, template_blob), prefetched in items:
+        result = compare_one(cid, mets_path, template_path, plan,
+                             state["streaming"], template_blob,
+                             state["fast_path"], timings, prefetched)
+        if result:
+            rows = encode_findings(result[1], table)
+            groups.add(cid, rows)
+            results.append((cid, result[0], rows))
+        else:
+            results.append((cid, None, []))
+    profile_stats = None
+    if profiler is not None:
+        profiler.disable()
+        profiler.create_stats()
+        profile_stats = profiler.stats
+    return _ChunkResult(table.strings, results, groups.export(), timings.export(),
+                        profile_stats, os.getpid(), current_rss_bytes(),
+                        time.perf_counter() - start)
+
+
+def _task_paths(task: Tuple[str, Path, Path, Optional[bytes]]) -> List[Path]:
+    """Files a task reads: the METS, and the template unless it comes from the index."""
+    _, mets_path, template_path, template_blob = task
+    return [mets_path] if template_blob is not None else [mets_path, template_path]
+
+
+def _waited(items, timings: Timings):
+    """Pass items through, adding the time spent waiting for each to worker_read_wait."""
+    items = iter(items)
+    while True:
+        start = time.perf_counter()
+        item = next(items, None)
+        timings.add_phase("worker_read_wait", time.perf_counter() - start)
+        if item is None:
+            return
+        yield item
+
+
+def _extract_template(object_id: str, path: Path, config: Optional[CompareConfig] = None):
+    return extract_template(object_id, path, _plan(config))
 
 
 def _auto_workers(n_tasks: int) -> int:
@@ -110,44 +315,364 @@ def _auto_workers(n_tasks: int) -> int:
     return max(1, min(cores // 2, 61, n_tasks))
 
 
+def _check_profile(profile: bool, backend: str) -> None:
+    # Python 3.12+ allows one active profiler per interpreter, so the
+    # threads of the thread backend cannot each run cProfile.
+    if profile and backend == "thread":
+        raise ValueError("Profiling is not supported with the thread backend")
+
+
+def worker_pool(n_tasks: int, max_workers: Optional[int], log_queue,
+                config: CompareConfig, streaming: bool = True,
+                fast_path: bool = True, profile: bool = False,
+                prefetch: Optional[int] = None,
+                recycle_after: Optional[int] = None,
+                backend: str = "process") -> Executor:
+    """Process pool whose workers hold the compiled plan of config (see _init_worker).
+
+    With recycle_after, the pool is replaced after that many tasks (see
+    execution.RecyclingExecutor). backend "thread" gives a _ThreadPool
+    instead, which is not recycled and cannot profile (ValueError).
+    """
+    _check_profile(profile, backend)
+    if backend == "thread":
+        return _ThreadPool(max_workers or _auto_workers(n_tasks), config, streaming,
+                           fast_path, profile, prefetch)
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=max_workers or _auto_workers(n_tasks),
+            initializer=_init_worker,
+            initargs=(log_queue, logging.getLogger().getEffectiveLevel(),
+                      config, streaming, fast_path, profile, prefetch),
+        )
+    return RecyclingExecutor(new_pool, recycle_after) if recycle_after else new_pool()
+
+
+class _ThreadPool(ThreadPoolExecutor):
+    """The thread backend: every thread is a worker with its own plan, XML
+    parser and Prefetcher (see _init_worker). lxml releases the GIL while it
+    parses and evaluates XPaths, and results need no pickling or logging relay.
+    """
+
+    def __init__(self, max_workers: int, config: CompareConfig, streaming: bool = True,
+                 fast_path: bool = True, profile: bool = False,
+                 prefetch: Optional[int] = None):
+        self._prefetchers: List[Prefetcher] = []
+        self._prefetchers_lock = threading.Lock()
+        super().__init__(max_workers, thread_name_prefix="compare_mets-worker",
+                         initializer=self._init_thread,
+                         initargs=(config, streaming, fast_path, profile, prefetch))
+
+    def _init_thread(self, *args) -> None:
+        _init_worker(None, logging.NOTSET, *args)
+        prefetcher = _worker_state()["prefetcher"]
+        if prefetcher is not None:
+            with self._prefetchers_lock:
+                self._prefetchers.append(prefetcher)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        super().shutdown(wait=wait, cancel_futures=cancel_futures)
+        if wait:
+            for prefetcher in self._prefetchers:
+                prefetcher.close()
+
+
+class _InlineExecutor(Executor):
+    """Runs every task in the calling process as it is submitted, with the
+    worker state of a pool worker, for runs too small to start a pool."""
+
+    def __init__(self, config: CompareConfig, streaming: bool = True,
+                 fast_path: bool = True, profile: bool = False,
+                 prefetch: Optional[int] = None):
+        self._saved = dict(_worker_state())
+        _init_worker(None, logging.NOTSET, config, streaming, fast_path, profile, prefetch)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        state = _worker_state()
+        if state["prefetcher"] is not None:
+            state["prefetcher"].close()
+        state.clear()
+        state.update(self._saved)
+
+
+class _ChunkSizer:
+    """Adapt the chunk size so that one chunk keeps a worker busy for about
+    target seconds: small files get large chunks (less IPC per file), slow
+    files small ones. Chunks never exceed a fair share of the remaining
+    work, so the last chunks do not leave workers idle.
+    """
+
+    def __init__(self, workers: int, target: float = 0.5, max_size: int = 256):
+        self.workers = workers
+        self.target = target
+        self.max_size = max_size
+        self.per_file: Optional[float] = None
+
+    def observe(self, n_files: int, seconds: float) -> None:
+        per_file = seconds / max(n_files, 1)
+        if self.per_file is None:
+            self.per_file = per_file
+        else:
+            self.per_file = 0.8 * self.per_file + 0.2 * per_file
+
+    def next_size(self, remaining: int) -> int:
+        size = self.target / self.per_file if self.per_file else 1
+        fair_share = remaining // (self.workers * 4)
+        return int(max(1, min(size, self.max_size, fair_share)))
+
+
+def update_index(index: TemplateIndex, templates: Dict[str, Path], executor,
+                 config: Optional[CompareConfig] = None) -> int:
+    """(Re)build the index entries that are missing or stale; returns their number.
+
+    config is sent to the workers with every task when it may differ from
+    the config of the pool (see _plan).
+    """
+    stale = index.stale_ids(templates)
+    if not stale:
+        logging.info(f"Template index {index.path} is up to date")
+        return 0
+    logging.info(f"Indexing {len(stale)} templates into {index.path}")
+    futures = [executor.submit(_extract_template, oid, templates[oid], config)
+               for oid in stale]
+    for future in tqdm(as_completed(futures), total=len(futures),
+                       desc="Indexing templates", unit="file"):
+        object_id, entry = future.result()
+        if entry is not None:
+            index.store(object_id, *entry)
+        else:
+            index.remove(object_id)  # never compare against the outdated sections
+    index.commit()
+    return len(stale)
+
+
+def index_templates(
+    templates: Dict[str, Path],
+    index_path: Path,
+    config: Optional[CompareConfig] = None,
+    max_workers: Optional[int] = None,
+    log_queue=None,
+) -> int:
+    """Build or refresh the template index for all given templates."""
+    config = config or default_config()
+    compile_plan(config)  # raise ConfigError here rather than in every worker
+    with TemplateIndex(index_path, config_digest(config)) as index, \
+            worker_pool(len(templates), max_workers, log_queue, config) as executor:
+        return update_index(index, templates, executor)
+
+
 def compare_files(
     mets: Dict[str, Path],
     templates: Dict[str, Path],
     config: Optional[CompareConfig] = None,
     max_workers: Optional[int] = None,
     log_queue=None,
+    streaming: bool = True,
+    template_index: Optional[Path] = None,
+    fast_path: bool = True,
+    cache: Optional[ResultCache] = None,
+    spill: Optional[Path] = None,
+    groups: Optional[FindingGroups] = None,
+    timings: Optional[Timings] = None,
+    profile: Optional[Path] = None,
+    metrics: Optional[MetricsWriter] = None,
+    prefetch: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    max_memory: Optional[int] = None,
+    backend: str = "process",
 ) -> Dict[str, List[Finding]]:
-    """Compare METS files with templates in parallel using a process pool."""
+    """Compare METS files with templates in parallel using a process (or thread) pool.
+
+    The config is sent to each worker once, by the pool initializer. Object
+    IDs are submitted in adaptive chunks with at most two chunks per worker
+    in flight, so memory in the parent stays flat whatever the batch size.
+
+    With a template_index, template sections are loaded from the index
+    (stale entries are rebuilt first) instead of parsing the template files.
+    With a result cache, pairs whose files and config are unchanged since
+    an earlier run are served from the cache and not compared again.
+    With a spill path, findings are appended to that file as they come in
+    and a SpilledFindings is returned instead of a dict; their strings are
+    then not pooled, so the parent keeps nothing per finding but groups.
+    groups, if given, is filled with the findings bundled per change: the
+    workers group their chunk and the parent merges, so the reports do not
+    have to group all findings again. timings, if given, receives the
+    phases of the run and the merged counters of the workers. With a
+    profile path, every worker runs cProfile and the merged stats are
+    written there (readable with pstats or snakeviz). metrics, if given, is
+    rewritten with the progress of the run at least every metrics.interval
+    seconds. With a prefetch byte budget, every worker reads the files of
+    its chunk ahead in a thread pool while it parses (see prefetch.py).
+    executor is a pool from worker_pool to use instead of starting one; it
+    is left running, and its own streaming, fast_path, profile and prefetch
+    settings apply. config is then sent with every chunk, so the pool may
+    have been started with another config.
+
+    Without an executor, the executor follows execution.choose_strategy:
+    small runs are compared in the main process, larger ones on a pool
+    sized on the cores and on max_memory (bytes; default: most of the
+    available memory). max_workers fixes the number of workers (0: in the
+    main process). While the run goes on, fewer chunks are run at once if
+    the workers turn out to need more memory than estimated. backend
+    "thread" runs the workers as threads of this process (see _ThreadPool);
+    it cannot be combined with a profile path (ValueError).
+    """
+    _check_profile(profile is not None, backend)
     config = config or default_config()
+    compile_plan(config)  # raise ConfigError here rather than in every worker
     errors: Dict[str, List[Finding]] = collections.OrderedDict()
+    if spill is not None:
+        errors = SpilledFindings(spill)
     common_ids = sorted(set(mets.keys()).intersection(templates.keys()))
 
-    initializer, initargs = None, ()
-    if log_queue is not None:
-        initializer = _init_worker
-        initargs = (log_queue, logging.getLogger().getEffectiveLevel())
-
-    workers = max_workers or _auto_workers(len(common_ids))
-    logging.info(f"Starting parallel comparison with {len(common_ids)} files "
-                 f"using {workers} workers...")
-
-    with ProcessPoolExecutor(
-        max_workers=workers,
-        initializer=initializer,
-        initargs=initargs,
-    ) as executor:
-        futures = {
-            executor.submit(compare_one, cid, mets[cid], templates[cid], config): cid
-            for cid in common_ids
-        }
-        for future in tqdm(as_completed(futures), total=len(futures),
-                           desc="Comparing METS files", unit="file"):
-            result = future.result()
-            if result:
-                err_key, findings = result
-                errors[err_key] = findings
-
-    logging.info(f"Completed comparison for {len(common_ids)} common object IDs")
+    n_pairs = len(common_ids)
+    pool = StringPool()
+    cache_keys: Dict[str, Optional[str]] = {}
+    cached_findings = [0, 0]  # objects with findings, findings
+    if cache is not None:
+        logging.info(f"Hashing {len(common_ids)} METS/template pairs for the result cache...")
+        cache_keys = cache.keys_for((cid, mets[cid], templates[cid]) for cid in common_ids)
+        todo = []
+        for cid in common_ids:
+            findings = cache.get(cache_keys[cid])
+            if findings is None:
+                todo.append(cid)
+            elif findings:
+                if spill is None:
+                    findings = pool.share(findings)
+                errors[report_key(cid, mets[cid])] = findings
+                cached_findings[0] += 1
+                cached_findings[1] += len(findings)
+                if groups is not None:
+                    groups.add(cid, findings)
+        logging.info(f"Result cache: {cache.hits} unchanged pairs served from cache, "
+                     f"{cache.misses} to compare")
+        common_ids = todo
+    # Members of an archive are compared in the order of their offsets, so a
+    # chunk reads one stretch of the archive; files keep the order of their IDs.
+    common_ids.sort(key=lambda cid: read_order(mets[cid]))
+
+    strategy = None
+    if executor is None:
+        strategy = choose_strategy(len(common_ids),
+                                   sample_sizes([mets[cid] for cid in common_ids]),
+                                   _auto_workers(len(common_ids)), max_workers,
+                                   max_memory, streaming, backend)
+        workers = max(1, strategy.workers)
+        logging.info(strategy.describe(len(common_ids)))
+    else:
+        workers = max_workers or _auto_workers(len(common_ids))
+        logging.info(f"Starting parallel comparison with {len(common_ids)} files "
+                     f"using {workers} workers...")
+    # Workers report their resident size; threads report that of the whole process.
+    memory = MemoryLimit(strategy.memory_limit if strategy is not None and not strategy.inline
+                         and backend == "process" else None, workers)
+
+    index = None
+    if template_index is not None:
+        index = TemplateIndex(template_index, config_digest(config))
+    sizer = _ChunkSizer(workers)
+    profiles = ProfileMerger() if profile is not None else None
+    max_in_flight = 2 * workers  # lowered by the memory limit, see below
+    pending_ids = iter(common_ids)
+    remaining = len(common_ids)
+    in_flight: Dict = {}
+    task_config = config if executor is not None else None  # see _plan
+    if metrics is not None:
+        metrics.start(n_pairs, files_cached=n_pairs - len(common_ids))
+        metrics.objects_with_findings, metrics.findings = cached_findings
+    try:
+        if executor is not None:
+            run_executor = contextlib.nullcontext(executor)
+        elif strategy.inline:
+            run_executor = _InlineExecutor(config, streaming, fast_path, profile is not None,
+                                           prefetch)
+        else:
+            run_executor = worker_pool(len(common_ids), workers, log_queue, config,
+                                       streaming, fast_path, profile is not None, prefetch,
+                                       strategy.recycle_after, backend)
+        with run_executor as executor:
+            if index is not None:
+                index_start = time.perf_counter()
+                update_index(index, {cid: templates[cid] for cid in common_ids}, executor,
+                             task_config)
+                if timings is not None:
+                    timings.add_phase("template_index", time.perf_counter() - index_start)
+            compare_start = time.perf_counter()
+            progress = tqdm(total=len(common_ids), desc="Comparing METS files", unit="file")
+            while True:
+                while len(in_flight) < max_in_flight and remaining:
+                    chunk = list(itertools.islice(pending_ids, sizer.next_size(remaining)))
+                    remaining -= len(chunk)
+                    tasks = [(cid, mets[cid], templates[cid],
+                              index.load(cid) if index is not None else None)
+                             for cid in chunk]
+                    in_flight[executor.submit(_compare_chunk, tasks, task_config)] = len(chunk)
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED,
+                               timeout=metrics.interval if metrics is not None else None)
+                for future in done:
+                    n_files = in_flight.pop(future)
+                    chunk = future.result()
+                    sizer.observe(n_files, chunk.seconds)
+                    memory.observe(chunk.rss)
+                    if timings is not None:
+                        timings.merge(chunk.timings)
+                    if profiles is not None:
+                        profiles.add(chunk.profile)
+                    # Spilled findings are not kept, so their strings are not pooled.
+                    shared = chunk.strings if spill is not None else pool.resolve(chunk.strings)
+                    if groups is not None:
+                        groups.merge(chunk.groups, shared)
+                    n_objects = n_findings = 0
+                    for cid, err_key, rows in chunk.results:
+                        findings = decode_findings(rows, shared)
+                        if cache is not None:
+                            cache.put(cache_keys[cid], findings)
+                        if err_key is not None:
+                            errors[err_key] = findings
+                            n_objects += 1
+                            n_findings += len(findings)
+                    if metrics is not None:
+                        metrics.add_results(n_files, n_objects, n_findings)
+                        metrics.set_worker_rss(chunk.pid, chunk.rss)
+                    progress.update(n_files)
+                running = memory.max_running
+                if running < workers and running < max_in_flight:
+                    logging.info(f"Workers use up to {memory.peak // (1024 * 1024)} MB; "
+                                 f"running at most {running} chunks at once to stay "
+                                 f"under {memory.limit // (1024 * 1024)} MB")
+                    max_in_flight = running
+                if metrics is not None:
+                    metrics.set_in_flight(len(in_flight), sum(in_flight.values()))
+                    metrics.maybe_write()
+            progress.close()
+            if timings is not None:
+                timings.add_phase("comparison", time.perf_counter() - compare_start)
+    finally:
+        if index is not None:
+            index.close()
+        if cache is not None:
+            cache.evict()
+        if spill is not None:
+            errors.close()
+        if metrics is not None:
+            metrics.finish()
+        if profiles is not None and profiles.dump(profile):
+            logging.info(f"Wrote merged worker profile to {profile}")
+
+    n_cached = n_pairs - len(common_ids)
+    logging.info(f"Completed comparison for {n_pairs} common object IDs"
+                 + (f" ({n_cached} served from the result cache)" if n_cached else ""))
     return errors
 
 
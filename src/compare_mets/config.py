@@ -8,9 +8,14 @@ override them with a small TOML file passed via --config, e.g.:
     [[sections]]
     label = "mets:dmdSec"
     xpath = '//mets:dmdSec[@ID="DMD1"]'
+
+    [align]
+    "premis:event" = "premis:eventIdentifier/premis:eventIdentifierValue"
 """
+import hashlib
+import json
 import tomllib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, FrozenSet, Tuple
 
@@ -39,11 +44,19 @@ DEFAULT_SECTIONS = (
 DEFAULT_IGNORE_TEXT = ("premis:eventDateTime",)
 
 
+class ConfigError(ValueError):
+    """The comparison config is invalid (bad TOML, unknown prefix, bad XPath)."""
+
+
 @dataclass(frozen=True)
 class CompareConfig:
     namespaces: Dict[str, str]
     sections: Tuple[Tuple[str, str], ...]
     ignore_text: FrozenSet[str]  # element tags in Clark notation ({uri}local)
+    # Repeated siblings with these tags (Clark notation) are aligned on a key:
+    # "@ATTR", a child path like "premis:eventIdentifier/premis:eventIdentifierValue",
+    # or "hash" (the normalised content). See tree_compare.alignment_keys.
+    align: Dict[str, str] = field(default_factory=dict)
 
 
 def _clark(name: str, namespaces: Dict[str, str]) -> str:
@@ -51,14 +64,17 @@ def _clark(name: str, namespaces: Dict[str, str]) -> str:
     prefix, _, local = name.rpartition(":")
     if not prefix:
         return local
+    if prefix not in namespaces:
+        raise ConfigError(f"Unknown namespace prefix in {name!r}")
     return f"{{{namespaces[prefix]}}}{local}"
 
 
-def make_config(namespaces, sections, ignore_text) -> CompareConfig:
+def make_config(namespaces, sections, ignore_text, align=None) -> CompareConfig:
     return CompareConfig(
         namespaces=dict(namespaces),
         sections=tuple((label, xpath) for label, xpath in sections),
         ignore_text=frozenset(_clark(name, namespaces) for name in ignore_text),
+        align={_clark(name, namespaces): key for name, key in (align or {}).items()},
     )
 
 
@@ -66,13 +82,38 @@ def default_config() -> CompareConfig:
     return make_config(DEFAULT_NAMESPACES, DEFAULT_SECTIONS, DEFAULT_IGNORE_TEXT)
 
 
+def config_digest(config: CompareConfig) -> str:
+    """Stable hash of a config, used to key stored results on it."""
+    data = {
+        "namespaces": sorted(config.namespaces.items()),
+        "sections": config.sections,
+        "ignore_text": sorted(config.ignore_text),
+    }
+    if config.align:  # left out when unused, so existing digests stay valid
+        data["align"] = sorted(config.align.items())
+    data = json.dumps(data, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
 def load_config(path: Path) -> CompareConfig:
-    """Load a project config from TOML; unspecified keys keep their defaults."""
-    data = tomllib.loads(path.read_text(encoding="utf-8"))
+    """Load a project config from TOML; unspecified keys keep their defaults.
+
+    Raises ConfigError if the file cannot be read or is malformed.
+    """
+    try:
+        data = tomllib.loads(path.read_text(encoding="utf-8"))
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise ConfigError(f"Cannot read config {path}: {e}") from e
     namespaces = {**DEFAULT_NAMESPACES, **data.get("namespaces", {})}
     if "sections" in data:
-        sections = tuple((s["label"], s["xpath"]) for s in data["sections"])
+        try:
+            sections = tuple((s["label"], s["xpath"]) for s in data["sections"])
+        except (KeyError, TypeError) as e:
+            raise ConfigError(f"Each section in {path} needs a label and an xpath") from e
     else:
         sections = DEFAULT_SECTIONS
     ignore_text = tuple(data.get("ignore_text", DEFAULT_IGNORE_TEXT))
-    return make_config(namespaces, sections, ignore_text)
+    align = data.get("align", {})
+    if not isinstance(align, dict) or not all(isinstance(v, str) for v in align.values()):
+        raise ConfigError(f"[align] in {path} must map element names to key strings")
+    return make_config(namespaces, sections, ignore_text, align)
@@ -0,0 +1,180 @@
+"""Execution policy: where, and on how many workers, a run compares its files.
+
+Starting worker processes costs more than comparing a redelivery of a few
+dozen files, so small runs are compared in the main process. Larger runs
+get a process pool sized on the cores (half of them, see
+compare._auto_workers) and on memory. Every worker needs the memory of an
+interpreter with lxml plus what the largest file takes to compare, which
+is estimated from a sample of the file sizes; a MemoryLimit corrects the
+estimate during the run with the resident size the workers report.
+
+lxml does not give the memory of a large document back to the system
+while the worker lives, so runs on large files replace their workers
+after a number of chunks (RecyclingExecutor).
+
+The workers are processes, or with the thread backend threads of the
+main process (see compare._ThreadPool). Threads share one interpreter,
+so they need no memory of their own beyond the file they compare, and
+they are not recycled.
+"""
+import logging
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+from .archive import Source, source_size
+from .procinfo import available_memory_bytes, format_bytes
+
+MB = 1024 * 1024
+
+BACKENDS = ("process", "thread")
+
+# Runs up to this size are compared in the main process (without --workers).
+INLINE_MAX_FILES = 32
+INLINE_MAX_BYTES = 16 * MB
+
+SIZE_SAMPLE = 64              # files whose size is looked up to estimate memory
+MEMORY_SHARE = 0.8            # of the available memory, without --max-memory
+WORKER_BASE_BYTES = 48 * MB   # interpreter, lxml and the compiled plan
+# Peak memory per byte of METS while it is compared: streaming keeps only
+# the compared sections, a full parse the whole tree.
+STREAMING_FACTOR = 4
+FULL_PARSE_FACTOR = 12
+
+# Workers are replaced after this many chunks each on runs with files this large.
+RECYCLE_FILE_BYTES = 16 * MB
+RECYCLE_CHUNKS = 20
+
+
+@dataclass(frozen=True)
+class Strategy:
+    """How a run is executed; workers 0 means in the main process."""
+    workers: int
+    reason: str
+    worker_bytes: int = 0                 # estimated peak memory of one worker
+    memory_limit: Optional[int] = None    # for all workers together
+    recycle_after: Optional[int] = None   # chunks per pool, see RecyclingExecutor
+    backend: str = "process"
+
+    @property
+    def inline(self) -> bool:
+        return self.workers == 0
+
+    def describe(self, n_files: int) -> str:
+        if self.inline:
+            return f"Comparing {n_files} files in the main process ({self.reason})"
+        kind = "worker threads" if self.backend == "thread" else "workers"
+        text = (f"Starting parallel comparison with {n_files} files using "
+                f"{self.workers} {kind} ({self.reason}")
+        if self.memory_limit is not None:
+            text += (f"; about {format_bytes(self.worker_bytes)} per worker, "
+                     f"limit {format_bytes(self.memory_limit)}")
+        if self.recycle_after is not None:
+            text += f"; workers replaced after {RECYCLE_CHUNKS} chunks"
+        return text + ")..."
+
+
+def sample_sizes(paths: Sequence[Source], n: int = SIZE_SAMPLE) -> List[int]:
+    """Sizes of up to n files spread evenly over paths (one stat each)."""
+    sizes = []
+    for path in paths[::max(1, len(paths) // n)][:n]:
+        try:
+            sizes.append(source_size(path))
+        except OSError:
+            pass
+    return sizes
+
+
+def choose_strategy(n_files: int, sizes: List[int], cpu_workers: int,
+                    max_workers: Optional[int] = None, max_memory: Optional[int] = None,
+                    streaming: bool = True, backend: str = "process") -> Strategy:
+    """Pick the executor of a run of n_files with the given sample of file sizes.
+
+    max_workers (--workers) fixes the number of workers; 0 compares in the
+    main process. Without it small runs are compared in the main process
+    and larger ones use at most cpu_workers workers, fewer if max_memory
+    (default: a share of the available memory) does not fit more.
+    """
+    if max_workers == 0:
+        return Strategy(0, "--workers 0")
+    largest = max(sizes, default=0)
+    estimated_bytes = sum(sizes) / len(sizes) * n_files if sizes else 0
+    if max_workers is None and n_files <= INLINE_MAX_FILES and \
+            estimated_bytes <= INLINE_MAX_BYTES:
+        return Strategy(0, "too few files to start workers")
+
+    worker_bytes = int((WORKER_BASE_BYTES if backend == "process" else 0)
+                       + largest * (STREAMING_FACTOR if streaming else FULL_PARSE_FACTOR))
+    memory_limit = max_memory
+    if memory_limit is None:
+        available = available_memory_bytes()
+        memory_limit = int(available * MEMORY_SHARE) if available is not None else None
+    recycle_after = (RECYCLE_CHUNKS if largest >= RECYCLE_FILE_BYTES and backend == "process"
+                     else None)
+
+    if max_workers is not None:
+        workers, reason = max_workers, "--workers"
+    else:
+        workers, reason = max(1, min(cpu_workers, n_files)), "half the cores"
+        fits = memory_limit // max(worker_bytes, 1) if memory_limit is not None else None
+        if fits is not None and fits < workers:
+            workers, reason = max(1, fits), "limited by memory"
+    return Strategy(workers, reason, worker_bytes, memory_limit,
+                    recycle_after * workers if recycle_after is not None else None, backend)
+
+
+class MemoryLimit:
+    """Caps how many chunks run at once, so that the workers together stay
+    under limit bytes, from the largest resident size a worker reported."""
+
+    def __init__(self, limit: Optional[int], workers: int):
+        self.limit = limit
+        self.workers = workers
+        self.peak: Optional[int] = None
+
+    def observe(self, rss: Optional[int]) -> None:
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    @property
+    def max_running(self) -> int:
+        if self.limit is None or not self.peak:
+            return self.workers
+        return max(1, min(self.workers, self.limit // self.peak))
+
+
+class RecyclingExecutor(Executor):
+    """Executor that replaces its process pool after every recycle_after
+    submitted tasks, so that no worker lives long enough to pile up memory.
+
+    The old pool finishes its tasks and exits while new tasks already go
+    to the new one. (ProcessPoolExecutor's max_tasks_per_child does this
+    per worker, but can deadlock on Python 3.11 when tasks are queued
+    behind a retiring worker.)
+    """
+
+    def __init__(self, factory: Callable[[], Executor], recycle_after: int):
+        self._factory = factory
+        self.recycle_after = recycle_after
+        self.generations = 1
+        self._pool = factory()
+        self._retired: Optional[Executor] = None
+        self._submitted = 0
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        if self._submitted >= self.recycle_after:
+            if self._retired is not None:
+                self._retired.shutdown(wait=True)  # drained during a whole generation
+            self._pool.shutdown(wait=False)
+            self._retired, self._pool = self._pool, self._factory()
+            self._submitted = 0
+            self.generations += 1
+            logging.debug(f"Replaced the worker pool (generation {self.generations})")
+        self._submitted += 1
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if self._retired is not None:
+            self._retired.shutdown(wait=wait, cancel_futures=cancel_futures)
+            self._retired = None
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -1,6 +1,14 @@
-"""Typed comparison results."""
+"""Typed comparison results.
+
+Findings are slotted and their strings shared: systemic findings repeat
+the same few sections, paths and values across thousands of objects. For
+transport from a worker, a chunk's findings are encoded as integer codes
+into a string table that is sent once per chunk (encode_findings); the
+parent decodes them into Findings whose strings are interned in one
+StringPool (decode_findings), so each distinct string is stored once.
+"""
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 
 def _fmt(value: Optional[str], limit: int = 120) -> str:
@@ -11,7 +19,7 @@ def _fmt(value: Optional[str], limit: int = 120) -> str:
     return f"'{value}'"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Finding:
     """A single difference between a METS template and a delivered METS file.
 
@@ -45,3 +53,58 @@ class Finding:
         if self.kind == "parse-error":
             return f"`{self.path}` — file could not be parsed: {self.mets_value}"
         return f"`{self.path}` — {self.kind}: template {t} → METS {m}"
+
+
+# (section, kind, path, template_value, mets_value) as string-table codes;
+# None values are kept as None.
+EncodedFinding = Tuple[int, int, int, Optional[int], Optional[int]]
+
+
+class StringTable:
+    """Assign each distinct string an integer code, in order of first use."""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> Optional[int]:
+        if value is None:
+            return None
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+
+class StringPool:
+    """Parent-side intern pool: one shared object per distinct string."""
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+
+    def intern(self, value: str) -> str:
+        return self._strings.setdefault(value, value)
+
+    def resolve(self, strings: List[str]) -> List[str]:
+        """Map a chunk's string table onto the pooled strings."""
+        return [self.intern(s) for s in strings]
+
+    def share(self, findings: List[Finding]) -> List[Finding]:
+        """Rebuild findings from another source (e.g. the result cache) on pooled strings."""
+        table = StringTable()
+        return decode_findings(encode_findings(findings, table), self.resolve(table.strings))
+
+
+def encode_findings(findings: List[Finding], table: StringTable) -> List[EncodedFinding]:
+    code = table.code
+    return [(code(f.section), code(f.kind), code(f.path),
+             code(f.template_value), code(f.mets_value)) for f in findings]
+
+
+def decode_findings(rows: List[EncodedFinding], shared: List[str]) -> List[Finding]:
+    """Rebuild Findings from rows, with shared = StringPool.resolve(table strings)."""
+    return [Finding(shared[s], shared[k], shared[p],
+                    None if t is None else shared[t],
+                    None if m is None else shared[m])
+            for s, k, p, t, m in rows]
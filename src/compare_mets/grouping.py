@@ -0,0 +1,66 @@
+"""Bundling of identical findings across objects.
+
+A systemic supplier error produces the same finding in every compared
+object, so a group can hold 100k object IDs. IDs are kept in insertion-
+ordered sets (dict keys), which makes adding an ID O(1) instead of a scan
+of the list, and are sorted once when the groups are finalised.
+
+Workers pre-aggregate the findings of their chunk (ChunkGroups); the
+parent merges those into one FindingGroups.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .findings import EncodedFinding, Finding
+
+GroupKey = Tuple[str, str, str]                   # (section, kind, path)
+ValueKey = Tuple[Optional[str], Optional[str]]    # (template_value, mets_value)
+
+
+class ChunkGroups:
+    """Worker-side groups of one chunk, on string-table codes."""
+
+    def __init__(self):
+        self.groups: Dict[EncodedFinding, Dict[str, None]] = {}
+
+    def add(self, object_id: str, rows: List[EncodedFinding]) -> None:
+        for row in rows:
+            self.groups.setdefault(row, {})[object_id] = None
+
+    def export(self) -> List[Tuple[EncodedFinding, List[str]]]:
+        return [(row, list(ids)) for row, ids in self.groups.items()]
+
+
+class FindingGroups:
+    """Findings bundled on (section, kind, path) and (template, METS) value."""
+
+    def __init__(self):
+        self._groups: Dict[GroupKey, Dict[ValueKey, Dict[str, None]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def _ids(self, section, kind, path, template_value, mets_value) -> Dict[str, None]:
+        occurrences = self._groups.setdefault((section, kind, path), {})
+        return occurrences.setdefault((template_value, mets_value), {})
+
+    def add(self, object_id: str, findings: Iterable[Finding]) -> None:
+        for f in findings:
+            self._ids(f.section, f.kind, f.path, f.template_value,
+                      f.mets_value)[object_id] = None
+
+    def merge(self, exported: List[Tuple[EncodedFinding, List[str]]],
+              shared: List[str]) -> None:
+        """Merge ChunkGroups.export() output, decoded with the chunk's shared strings."""
+        for (s, k, p, t, m), object_ids in exported:
+            ids = self._ids(shared[s], shared[k], shared[p],
+                            None if t is None else shared[t],
+                            None if m is None else shared[m])
+            ids.update(dict.fromkeys(object_ids))
+
+    def finalise(self) -> "OrderedDict[GroupKey, OrderedDict[ValueKey, List[str]]]":
+        """Return the groups in the structure of writer.group_findings, IDs sorted."""
+        return OrderedDict(
+            (key, OrderedDict((values, sorted(ids)) for values, ids in occurrences.items()))
+            for key, occurrences in self._groups.items()
+        )
@@ -0,0 +1,156 @@
+"""Live metrics of a comparison run, for schedulers and dashboards.
+
+compare_files updates a MetricsWriter as chunks come back from the workers
+and at least every interval seconds, also while no chunk finishes, so a
+stalled run is visible from a growing seconds_since_progress. The file is
+written to a temporary name and renamed, so readers never see a partial
+file. Two formats are supported: JSON, and the Prometheus textfile format
+(for the node_exporter textfile collector), chosen by a .prom suffix.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_INTERVAL = 10.0
+# A worker that has not reported for this many intervals while others did
+# is taken to be gone (recycled or died) and is left out of worker_rss.
+WORKER_STALE_INTERVALS = 3
+METRICS_FORMATS = ("json", "prometheus")
+
+_PROMETHEUS_HELP = {
+    "files_total": "METS/template pairs in this run.",
+    "files_done": "Pairs compared or served from the result cache.",
+    "files_cached": "Pairs served from the result cache.",
+    "files_per_second": "Compared pairs per second since the comparison started.",
+    "objects_with_findings": "Objects with at least one finding so far.",
+    "findings": "Findings so far.",
+    "in_flight_chunks": "Chunks submitted to the workers and not yet returned.",
+    "in_flight_files": "Pairs in the in-flight chunks.",
+    "eta_seconds": "Estimated seconds until all pairs are compared.",
+    "elapsed_seconds": "Seconds since the comparison started.",
+    "seconds_since_progress": "Seconds since the last chunk came back.",
+    "running": "1 while the run is in progress, 0 when it has finished.",
+}
+
+
+class MetricsWriter:
+    """Progress counters of one run, written to path in the chosen format."""
+
+    def __init__(self, path: Path, interval: float = DEFAULT_INTERVAL,
+                 format: Optional[str] = None):
+        self.path = path
+        self.interval = interval
+        self.format = format or ("prometheus" if path.suffix == ".prom" else "json")
+        if self.format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format {self.format}")
+        self.started = time.time()
+        self.last_progress = self.started
+        self.running = True
+        self.files_total = 0
+        self.files_done = 0
+        self.files_cached = 0
+        self.objects_with_findings = 0
+        self.findings = 0
+        self.in_flight_chunks = 0
+        self.in_flight_files = 0
+        self.worker_rss: Dict[int, Optional[int]] = {}
+        self._rss_reported: Dict[int, float] = {}
+        self._written = 0.0
+
+    def start(self, files_total: int, files_cached: int = 0) -> None:
+        """Begin the comparison phase; cached pairs count as done."""
+        self.started = self.last_progress = time.time()
+        self.files_total = files_total
+        self.files_cached = self.files_done = files_cached
+        self.write()
+
+    def add_results(self, n_files: int, n_objects_with_findings: int, n_findings: int) -> None:
+        self.files_done += n_files
+        self.objects_with_findings += n_objects_with_findings
+        self.findings += n_findings
+        self.last_progress = time.time()
+
+    def set_in_flight(self, chunks: int, files: int) -> None:
+        self.in_flight_chunks = chunks
+        self.in_flight_files = files
+
+    def set_worker_rss(self, pid: int, rss: Optional[int]) -> None:
+        self.worker_rss[pid] = rss
+        self._rss_reported[pid] = time.time()
+
+    def _prune_workers(self) -> None:
+        """Forget workers that stopped reporting while the run made progress."""
+        cutoff = self.last_progress - WORKER_STALE_INTERVALS * self.interval
+        for pid, reported in list(self._rss_reported.items()):
+            if reported < cutoff:
+                del self.worker_rss[pid], self._rss_reported[pid]
+
+    def snapshot(self) -> Dict:
+        self._prune_workers()
+        now = time.time()
+        elapsed = now - self.started
+        compared = self.files_done - self.files_cached
+        rate = compared / elapsed if elapsed > 0 else 0.0
+        remaining = self.files_total - self.files_done
+        return {
+            "running": self.running,
+            "updated": now,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "files_cached": self.files_cached,
+            "files_per_second": round(rate, 3),
+            "objects_with_findings": self.objects_with_findings,
+            "findings": self.findings,
+            "in_flight_chunks": self.in_flight_chunks,
+            "in_flight_files": self.in_flight_files,
+            "eta_seconds": round(remaining / rate, 1) if rate > 0 else None,
+            "elapsed_seconds": round(elapsed, 1),
+            "seconds_since_progress": round(now - self.last_progress, 1),
+            "worker_rss_bytes": {str(pid): rss for pid, rss in self.worker_rss.items()},
+        }
+
+    def maybe_write(self) -> None:
+        """Write if the last write is at least interval seconds ago."""
+        if time.monotonic() - self._written >= self.interval:
+            self.write()
+
+    def finish(self) -> None:
+        self.running = False
+        self.set_in_flight(0, 0)
+        self.write()
+
+    def write(self) -> None:
+        snapshot = self.snapshot()
+        text = (_prometheus(snapshot) if self.format == "prometheus"
+                else json.dumps(snapshot, indent=2) + "\n")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._written = time.monotonic()
+
+
+def _number(value) -> str:
+    if isinstance(value, (bool, int)):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _prometheus(snapshot: Dict) -> str:
+    lines = []
+    for name, help_text in _PROMETHEUS_HELP.items():
+        value = snapshot[name]
+        if value is None:
+            continue
+        metric = f"compare_mets_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge",
+                  f"{metric} {_number(value)}"]
+    metric = "compare_mets_worker_rss_bytes"
+    lines += [f"# HELP {metric} Resident set size of a worker process at its last chunk.",
+              f"# TYPE {metric} gauge"]
+    for pid, rss in snapshot["worker_rss_bytes"].items():
+        if rss is not None:
+            lines.append(f'{metric}{{pid="{pid}"}} {rss}')
+    return "\n".join(lines) + "\n"
@@ -1,16 +1,184 @@
+"""Discovery of delivered METS files and METS templates.
+
+Directories are listed with os.scandir in a thread pool, so the many
+round-trips to an SMB/NFS share overlap instead of running one after the
+other. Batches and the template tree can be walked together (discover).
+Subtrees that never contain METS files, such as image folders, can be
+skipped with prune patterns or a maximum depth.
+
+With a Manifest, listings are stored on disk together with the directory
+mtime; a later run only lists the directories whose mtime changed.
+
+A batch or template path may also be a zip or tar archive; its members
+are listed instead (see archive.py) and are found as ArchivePaths.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
 from pathlib import Path
 import collections
+import json
 import logging
-from typing import Dict
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .archive import Source, is_archive, list_members
+
+METS_SUFFIX = "_mets.xml"
+TEMPLATE_SUFFIX = "_mets_template.xml"
+DEFAULT_SCAN_WORKERS = 16
+
+# A directory modified this shortly before it was listed may change again
+# within the same mtime tick (2 s on FAT, coarse on some SMB servers), so
+# such listings are not trusted on the next run.
+MTIME_GRACE_NS = 2_000_000_000
+
+
+def _scan(path: str) -> Tuple[List[str], List[str]]:
+    """Return (names of METS/template files, names of subdirectories) of one directory."""
+    suffixes = (os.path.normcase(METS_SUFFIX), os.path.normcase(TEMPLATE_SUFFIX))
+    files, dirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                    elif os.path.normcase(entry.name).endswith(suffixes) and entry.is_file():
+                        files.append(entry.name)
+                except OSError as e:
+                    logging.warning(f"Skipping {entry.path}: {e}")
+    except OSError as e:
+        logging.warning(f"Cannot list directory {path}: {e}")
+    return files, dirs
+
+
+class Manifest:
+    """On-disk record of directory listings, keyed on directory mtime.
+
+    Adding or removing an entry changes the mtime of its directory, so a
+    directory with an unchanged mtime does not need to be listed again.
+    The mtime of every known directory is still checked (one stat per
+    directory instead of a full listing). Without a path the listings are
+    only kept in memory, for a long-running process (see serve.py).
+    """
+
+    def __init__(self, path: Optional[Path] = None, rescan: bool = False):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, list] = {}
+        if path is not None and path.exists() and not rescan:
+            try:
+                self._dirs = json.loads(path.read_text(encoding="utf-8"))["dirs"]
+            except (ValueError, KeyError) as e:
+                logging.warning(f"Ignoring unreadable manifest {path}: {e}")
+
+    def listing(self, path: str) -> Tuple[List[str], List[str]]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return _scan(path)
+        with self._lock:
+            known = self._dirs.get(path)
+        if known is not None and known[0] == mtime_ns:
+            with self._lock:
+                self.hits += 1
+            return known[1], known[2]
+        listed_at = time.time_ns()
+        files, dirs = _scan(path)
+        trusted = listed_at - mtime_ns > MTIME_GRACE_NS
+        with self._lock:
+            self.misses += 1
+            self._dirs[path] = [mtime_ns if trusted else None, files, dirs]
+        return files, dirs
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"version": 1, "dirs": self._dirs}), encoding="utf-8")
+        os.replace(tmp, self.path)
+        logging.info(f"Manifest {self.path}: {self.hits} directories unchanged, "
+                     f"{self.misses} listed")
+
 
+def _list_dir(path: str, suffix: str, prune: Sequence[str],
+              manifest: Optional[Manifest]) -> Tuple[List[str], List[str]]:
+    """Return (matching files, subdirectories to descend into) of one directory."""
+    names, dirnames = manifest.listing(path) if manifest is not None else _scan(path)
+    files = [os.path.join(path, name) for name in names
+             if os.path.normcase(name).endswith(suffix)]
+    dirs = [os.path.join(path, name) for name in dirnames
+            if not any(fnmatch(os.path.normcase(name), pattern) for pattern in prune)]
+    return files, dirs
 
-def get_mets(paths: list[Path]) -> Dict[str, Path]:
-    """Return dictionary of object_id to METS XML file path from batch folders."""
+
+def walk(jobs: Sequence[Tuple[Path, str]], max_depth: Optional[int] = None,
+         prune: Iterable[str] = (), manifest: Optional[Manifest] = None,
+         max_workers: int = DEFAULT_SCAN_WORKERS) -> List[List[Path]]:
+    """Find files ending in suffix below root, for each (root, suffix) job.
+
+    All jobs are walked concurrently in one thread pool. max_depth limits
+    how many directory levels below each root are listed (None: no limit);
+    directories whose name matches one of the prune glob patterns are not
+    entered. Returns the sorted matches per job. Only files ending in
+    METS_SUFFIX or TEMPLATE_SUFFIX can be found.
+    """
+    prune = tuple(os.path.normcase(pattern) for pattern in prune)
+    results: List[List[str]] = [[] for _ in jobs]
+    n_listed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {
+            pool.submit(_list_dir, str(root), os.path.normcase(suffix), prune,
+                        manifest): (i, 0)
+            for i, (root, suffix) in enumerate(jobs)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, depth = pending.pop(future)
+                files, dirs = future.result()
+                n_listed += 1
+                results[i].extend(files)
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                suffix = os.path.normcase(jobs[i][1])
+                for subdir in dirs:
+                    pending[pool.submit(_list_dir, subdir, suffix, prune,
+                                        manifest)] = (i, depth + 1)
+    logging.debug(f"Listed {n_listed} directories")
+    return [sorted(Path(p) for p in found) for found in results]
+
+
+def find(jobs: Sequence[Tuple[Path, str]], max_depth: Optional[int] = None,
+         prune: Iterable[str] = (), manifest: Optional[Manifest] = None
+         ) -> List[List[Source]]:
+    """Like walk, but a root that is an archive has its members listed instead."""
+    prune = tuple(prune)
+    dir_jobs = [(i, job) for i, job in enumerate(jobs) if not is_archive(job[0])]
+    found: List[Optional[List[Source]]] = [None] * len(jobs)
+    walked = walk([job for _, job in dir_jobs], max_depth, prune, manifest) if dir_jobs else []
+    for (i, _), files in zip(dir_jobs, walked):
+        found[i] = files
+    for i, (root, suffix) in enumerate(jobs):
+        if found[i] is None:
+            found[i] = list_members(root, suffix, max_depth, prune)
+    return found
+
+
+def mets_object_id(path: Source) -> str:
+    """Object ID of a delivered METS file, from its name (<id>_mets.xml)."""
+    return path.stem.replace("_mets", "")
+
+
+def _mets_map(paths: List[Path], found: List[List[Source]]) -> Dict[str, Source]:
     mets = collections.OrderedDict()
-    for path_batch in paths:
+    for path_batch, batch_files in zip(paths, found):
         logging.info(f"Searching METS files in {path_batch}")
-        for path in path_batch.rglob("*_mets.xml"):
-            object_id = path.stem.replace("_mets", "")
+        for path in batch_files:
+            object_id = mets_object_id(path)
             if object_id in mets:
                 logging.warning(
                     f"Duplicate object ID {object_id}: {path} overwrites {mets[object_id]}")
@@ -20,13 +188,46 @@ def get_mets(paths: list[Path]) -> Dict[str, Path]:
     return mets
 
 
-def get_templates(path_templates: Path) -> Dict[str, Path]:
-    """Return dictionary of object_id to METS template file path."""
+def _template_map(path_templates: Path, found: List[Source]) -> Dict[str, Source]:
     templates = collections.OrderedDict()
     logging.info(f"Searching templates in {path_templates}")
-    for path in path_templates.rglob("*_mets_template.xml"):
+    for path in found:
         object_id = path.stem.replace("_mets_template", "")
         templates[object_id] = path
         logging.debug(f"Found template file for object_id={object_id}: {path}")
     logging.info(f"Found {len(templates)} template files")
     return templates
+
+
+def get_mets(paths: list[Path], max_depth: Optional[int] = None,
+             prune: Iterable[str] = (),
+             manifest: Optional[Manifest] = None) -> Dict[str, Source]:
+    """Return dictionary of object_id to METS XML file path from batch folders or archives."""
+    found = find([(path, METS_SUFFIX) for path in paths], max_depth, prune, manifest)
+    return _mets_map(paths, found)
+
+
+def get_templates(path_templates: Path, max_depth: Optional[int] = None,
+                  prune: Iterable[str] = (),
+                  manifest: Optional[Manifest] = None) -> Dict[str, Source]:
+    """Return dictionary of object_id to METS template file path (or archive member)."""
+    [found] = find([(path_templates, TEMPLATE_SUFFIX)], max_depth, prune, manifest)
+    return _template_map(path_templates, found)
+
+
+def discover(paths: list[Path], path_templates: Path, max_depth: Optional[int] = None,
+             prune: Iterable[str] = (), manifest: Optional[Manifest] = None,
+             ) -> Tuple[Dict[str, Source], Dict[str, Source]]:
+    """Walk the batches and the template tree concurrently.
+
+    Returns the same mappings as get_mets and get_templates.
+    """
+    start = time.perf_counter()
+    found = find([(path, METS_SUFFIX) for path in paths]
+                 + [(path_templates, TEMPLATE_SUFFIX)], max_depth, prune, manifest)
+    elapsed = time.perf_counter() - start
+    mets = _mets_map(paths, found[:-1])
+    templates = _template_map(path_templates, found[-1])
+    logging.info(f"Discovered {len(mets)} METS files and {len(templates)} templates "
+                 f"in {elapsed:.2f}s")
+    return mets, templates
@@ -0,0 +1,189 @@
+"""Sharded runs: partial results per node, merged into one report.
+
+One delivery can be spread over several machines that share its storage.
+Every node runs with ``--shard i/N``: it compares only the object IDs of
+its shard and writes a partial result instead of reports. The ``merge``
+command then combines the N partial results into the reports of a single
+run. Object IDs are assigned to shards on a stable hash (CRC-32) of the
+ID, so all nodes make the same split without coordinating, and the
+completeness check (METS without template, templates not returned) is
+split the same way: every ID is counted by exactly one shard.
+
+A partial result is a gzip JSON Lines file. The first line is a header
+with the shard, the config digest, the tool version, the run totals and
+the timings; every further line holds the findings of one object, in the
+spill file format (see spill.py).
+"""
+import collections
+import gzip
+import json
+import logging
+import os
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, TypeVar
+
+from . import __version__
+from .findings import Finding
+from .spill import SpilledFindings
+from .timings import Timings
+
+PARTIAL_FORMAT = "compare_mets-partial"
+PARTIAL_VERSION = 1
+
+Shard = Tuple[int, int]  # (i, N), 1 <= i <= N
+T = TypeVar("T")
+
+
+class PartialError(ValueError):
+    """Partial results that cannot be merged into one run."""
+
+
+def parse_shard(text: str) -> Shard:
+    """Parse "i/N" into (i, N); raises ValueError unless 1 <= i <= N."""
+    try:
+        i, n = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, e.g. 1/4: {text!r}") from None
+    if not 1 <= i <= n:
+        raise ValueError(f"Shard {text!r} out of range: need 1 <= i <= N")
+    return i, n
+
+
+def shard_of(object_id: str, n_shards: int) -> int:
+    """The shard (1..n_shards) an object ID belongs to; the same on every node."""
+    return zlib.crc32(object_id.encode("utf-8")) % n_shards + 1
+
+
+def select_shard(paths: Dict[str, T], shard: Shard) -> Dict[str, T]:
+    """The entries of an object ID mapping that belong to shard."""
+    i, n = shard
+    return collections.OrderedDict(
+        (object_id, path) for object_id, path in paths.items() if shard_of(object_id, n) == i)
+
+
+def partial_path(output: Path, batch_paths: List[Path], shard: Shard) -> Path:
+    batch_id = batch_paths[0].name.replace(" ", "_")
+    return output / f"compare_partial-{batch_id}-{shard[0]}of{shard[1]}.jsonl.gz"
+
+
+def write_partial(path: Path, errors: Dict[str, List[Finding]],
+                  mets_diff_ids: Set[str], templates_diff_ids: Set[str],
+                  batch_paths: List[Path], shard: Shard, config_digest: str,
+                  n_compared: int, cache_stats: Optional[Dict[str, int]] = None,
+                  timings: Optional[Timings] = None) -> Path:
+    """Write the results of one shard; errors may be a SpilledFindings.
+
+    The file is written under a temporary name and then renamed, so a node
+    that is killed halfway never leaves a partial result that looks complete.
+    """
+    header = {
+        "format": PARTIAL_FORMAT,
+        "version": PARTIAL_VERSION,
+        "tool_version": __version__,
+        "shard": list(shard),
+        "config": config_digest,
+        "batches": [str(p) for p in batch_paths],
+        "n_compared": n_compared,
+        "mets_without_template": sorted(mets_diff_ids),
+        "templates_not_returned": sorted(templates_diff_ids),
+        "cache": cache_stats,
+        "timings": timings.export() if timings is not None else None,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for report_key, findings in errors.items():
+            rows = [[x.section, x.kind, x.path, x.template_value, x.mets_value]
+                    for x in findings]
+            f.write(json.dumps([report_key, rows], ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def read_header(path: Path) -> Dict:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError) as e:
+        raise PartialError(f"Cannot read partial result {path}: {e}") from e
+    if not isinstance(header, dict) or header.get("format") != PARTIAL_FORMAT:
+        raise PartialError(f"{path} is not a partial result")
+    if header.get("version") != PARTIAL_VERSION:
+        raise PartialError(f"{path} has partial format version {header.get('version')}, "
+                           f"expected {PARTIAL_VERSION}")
+    return header
+
+
+def _check_headers(paths: List[Path], headers: List[Dict]) -> None:
+    """All shards 1..N present once, from the same config and tool version."""
+    first = headers[0]
+    for path, header in zip(paths, headers):
+        for key, what in (("config", "project config"), ("tool_version", "tool version")):
+            if header[key] != first[key]:
+                raise PartialError(f"{path} was made with another {what} than {paths[0]}")
+        if header["shard"][1] != first["shard"][1]:
+            raise PartialError(f"{path} is shard {header['shard'][0]}/{header['shard'][1]}, "
+                               f"but {paths[0]} splits into {first['shard'][1]} shards")
+    n_shards = first["shard"][1]
+    seen: Dict[int, Path] = {}
+    for path, header in zip(paths, headers):
+        i = header["shard"][0]
+        if i in seen:
+            raise PartialError(f"Shard {i}/{n_shards} given twice: {seen[i]} and {path}")
+        seen[i] = path
+    missing = sorted(set(range(1, n_shards + 1)) - set(seen))
+    if missing:
+        raise PartialError(f"Missing shards of {n_shards}: "
+                           + ", ".join(str(i) for i in missing))
+
+
+@dataclass
+class MergedRun:
+    """Everything write_reports needs, combined from all shards."""
+    errors: Dict[str, List[Finding]]
+    mets_diff_ids: Set[str] = field(default_factory=set)
+    templates_diff_ids: Set[str] = field(default_factory=set)
+    batch_paths: List[Path] = field(default_factory=list)
+    n_compared: int = 0
+    cache_stats: Optional[Dict[str, int]] = None
+    timings: Timings = field(default_factory=Timings)
+
+
+def merge_partials(paths: List[Path], spill: Optional[Path] = None) -> MergedRun:
+    """Combine the partial results of all shards of one run.
+
+    Raises PartialError if a shard is missing or given twice, or if the
+    partials come from different configs or tool versions. With a spill
+    path the findings are collected in a SpilledFindings, as in a run with
+    spilling enabled.
+    """
+    if not paths:
+        raise PartialError("No partial results given")
+    headers = [read_header(path) for path in paths]
+    _check_headers(paths, headers)
+    order = sorted(range(len(paths)), key=lambda k: headers[k]["shard"][0])
+
+    errors = SpilledFindings(spill) if spill is not None else collections.OrderedDict()
+    run = MergedRun(errors, batch_paths=[Path(p) for p in headers[order[0]]["batches"]])
+    for k in order:
+        header = headers[k]
+        run.mets_diff_ids.update(header["mets_without_template"])
+        run.templates_diff_ids.update(header["templates_not_returned"])
+        run.n_compared += header["n_compared"]
+        if header["cache"] is not None:
+            stats = run.cache_stats = run.cache_stats or {"hits": 0, "misses": 0}
+            for key in stats:
+                stats[key] += header["cache"][key]
+        if header["timings"] is not None:
+            run.timings.merge(header["timings"])
+        with gzip.open(paths[k], "rt", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                report_key, rows = json.loads(line)
+                errors[report_key] = [Finding(*row) for row in rows]
+        logging.info(f"Merged shard {header['shard'][0]}/{header['shard'][1]} "
+                     f"from {paths[k]}")
+    return run
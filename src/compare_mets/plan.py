@@ -0,0 +1,64 @@
+"""Compiled form of a CompareConfig, built once per process.
+
+Comparing a pair needs more than the config itself: compiled XPaths, the
+namespace-URI-to-prefix map for readable paths, the streaming specs of
+the sections and the sibling alignment keys. compile_plan derives all of
+these once (the pool initializer does it per worker), so no file pays for
+them again, and it is also where a broken config is detected: before any
+worker starts.
+"""
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple, Union
+
+from lxml import etree
+
+from .config import CompareConfig, ConfigError
+from .sections import StreamSpec, read_sections, stream_specs
+from .tree_compare import KeyFunction, alignment_keys, prefix_map
+
+
+@dataclass(frozen=True)
+class ComparePlan:
+    config: CompareConfig
+    prefixes: Dict[str, str]                    # namespace URI -> prefix
+    ignore_text: FrozenSet[str]
+    xpaths: Dict[str, etree.XPath]              # section XPath -> compiled XPath
+    specs: Optional[Dict[str, StreamSpec]]      # None if a section XPath is not simple
+    align: Dict[str, KeyFunction]               # sibling alignment key per tag
+
+    @property
+    def sections(self) -> Tuple[Tuple[str, str], ...]:
+        return self.config.sections
+
+    def extract(self, source, streaming: bool = True) -> Dict[str, list]:
+        """Return the elements matched by each section XPath (see sections.read_sections)."""
+        return read_sections(source, self.specs, self.xpaths, streaming)
+
+
+def compile_plan(config: CompareConfig) -> ComparePlan:
+    """Compile config into a ComparePlan; raises ConfigError for invalid XPaths or keys."""
+    if not config.sections:
+        raise ConfigError("No sections configured")
+    xpaths = {}
+    probe = etree.Element("probe")
+    for label, xpath in config.sections:
+        try:
+            compiled = etree.XPath(xpath, namespaces=config.namespaces)
+            # Undefined prefixes only surface on evaluation.
+            compiled(probe)
+        except etree.XPathError as e:
+            raise ConfigError(f"Invalid XPath {xpath!r} for section {label}: {e}") from e
+        xpaths[xpath] = compiled
+    return ComparePlan(
+        config=config,
+        prefixes=prefix_map(config),
+        ignore_text=config.ignore_text,
+        xpaths=xpaths,
+        specs=stream_specs(config),
+        align=alignment_keys(config),
+    )
+
+
+def as_plan(config: Union[CompareConfig, ComparePlan]) -> ComparePlan:
+    """Return config as a plan, compiling it if it is a plain CompareConfig."""
+    return config if isinstance(config, ComparePlan) else compile_plan(config)
@@ -0,0 +1,159 @@
+"""Read files ahead of the parser, to overlap network-share I/O with parsing.
+
+Without prefetching a worker alternates between waiting for a file and
+parsing it, so on an SMB/NFS share its CPU is idle for much of the time.
+A Prefetcher reads the files of the next tasks in a small thread pool
+(file reads release the GIL) while the worker parses the current one,
+and stops reading ahead once the bytes read but not yet parsed reach a
+byte budget. Large files are mapped with mmap and hinted for sequential
+readahead; their bytes are still copied in the reader thread, as lxml
+parses from bytes.
+"""
+import mmap
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, TypeVar, Union
+
+from .archive import ArchivePath, Source, read_member, source_size
+
+DEFAULT_BUDGET = 64 * 1024 * 1024
+DEFAULT_THREADS = 4
+MMAP_THRESHOLD = 8 * 1024 * 1024
+MAX_AHEAD = 64  # tasks read ahead at most, whatever their size
+
+T = TypeVar("T")
+Prefetched = Dict[Source, Union[bytes, OSError]]
+
+
+def read_file(path: Source, mmap_threshold: int = MMAP_THRESHOLD) -> bytes:
+    """Return the bytes of path; files from mmap_threshold on are read through mmap.
+
+    Archive members are streamed from their archive (see archive.py).
+    """
+    if isinstance(path, ArchivePath):
+        return read_member(path)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < mmap_threshold or not size:
+            return f.read()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+                if hasattr(mmap, "MADV_WILLNEED"):
+                    mm.madvise(mmap.MADV_WILLNEED)
+            return mm[:]
+
+
+class Prefetcher:
+    """Thread pool that reads the files of upcoming tasks within a byte budget."""
+
+    def __init__(self, budget: int = DEFAULT_BUDGET, threads: int = DEFAULT_THREADS,
+                 read: Callable[[Source], bytes] = read_file):
+        self.budget = budget
+        self._read = read
+        self._pool = ThreadPoolExecutor(max_workers=threads,
+                                        thread_name_prefix="prefetch")
+        self._budget_changed = threading.Condition()
+        self._held = 0  # bytes reserved for reads not yet handed out
+
+    def _reserve(self, size: int, stop: threading.Event) -> bool:
+        """Wait until size fits in the budget (or nothing is held); False once stopped."""
+        with self._budget_changed:
+            while (self._held and self._held + size > self.budget
+                   and not stop.is_set()):
+                self._budget_changed.wait(timeout=0.1)
+            if stop.is_set():
+                return False
+            self._held += size
+            return True
+
+    def _release(self, size: int) -> None:
+        with self._budget_changed:
+            self._held -= size
+            self._budget_changed.notify_all()
+
+    def iterate(self, items: Iterable[T], paths_of: Callable[[T], List[Source]]
+                ) -> Iterator[Tuple[T, Prefetched]]:
+        """Yield (item, {path: bytes or the OSError of the read}) in the order of items.
+
+        A feeder thread reserves the size of each file in the budget and
+        submits its read, so reads of later items run while the caller
+        processes the current one. The reservation is returned when the
+        item is handed out.
+        """
+        ready: queue.Queue = queue.Queue(maxsize=MAX_AHEAD)
+        stop = threading.Event()
+
+        def put(entry) -> bool:
+            while not stop.is_set():
+                try:
+                    ready.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def feed() -> None:
+            reads = []
+            try:
+                for item in items:
+                    reads = []
+                    for path in paths_of(item):
+                        size = _file_size(path)
+                        if not self._reserve(size, stop):
+                            break
+                        reads.append((path, size, self._pool.submit(self._read, path)))
+                    if stop.is_set() or not put((item, reads)):
+                        break
+                    reads = []
+                else:
+                    put(_END)
+            except BaseException as e:  # handed to the caller
+                put(e)
+            for _, size, future in reads:  # stopped halfway through an item
+                future.cancel()
+                self._release(size)
+
+        feeder = threading.Thread(target=feed, name="prefetch-feeder", daemon=True)
+        feeder.start()
+        try:
+            while True:
+                entry = ready.get()
+                if entry is _END:
+                    return
+                if isinstance(entry, BaseException):
+                    raise entry
+                item, reads = entry
+                data: Prefetched = {}
+                for path, size, future in reads:
+                    try:
+                        data[path] = future.result()
+                    except OSError as e:
+                        data[path] = e
+                    finally:
+                        self._release(size)
+                yield item, data
+        finally:
+            stop.set()
+            feeder.join()
+            while not ready.empty():
+                entry = ready.get()
+                if isinstance(entry, tuple):
+                    for _, size, future in entry[1]:
+                        future.cancel()
+                        self._release(size)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+_END = object()
+
+
+def _file_size(path: Source) -> int:
+    try:
+        return source_size(path)
+    except OSError:
+        return 0  # the read reports the error
@@ -0,0 +1,137 @@
+"""Persistent cache of comparison results, for incremental re-runs.
+
+A supplier redelivery usually fixes a few hundred of many thousands of METS
+files. Results are keyed on the content hash of the METS file and of the
+template, the config digest and the tool version, so a re-run only has to
+compare pairs of which one of the files (or the config) changed.
+
+The cache is an SQLite file. Least recently used entries are evicted once
+the stored results exceed the configured size.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import __version__
+from .archive import Source, open_binary
+from .findings import Finding
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    findings BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+)
+"""
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def file_digest(path: Source) -> str:
+    with open_binary(path) as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _encode(findings: List[Finding]) -> bytes:
+    rows = [[f.section, f.kind, f.path, f.template_value, f.mets_value] for f in findings]
+    return zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"))
+
+
+def _decode(blob: bytes) -> List[Finding]:
+    return [Finding(*row) for row in json.loads(zlib.decompress(blob).decode("utf-8"))]
+
+
+class ResultCache:
+    """Content-addressed store of Finding lists (an empty list means clean)."""
+
+    def __init__(self, path: Path, config_digest: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.config = config_digest
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path))
+        self._db.execute(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self) -> "ResultCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def key(self, mets_digest: str, template_digest: str) -> str:
+        parts = f"{mets_digest}\0{template_digest}\0{self.config}\0{__version__}"
+        return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+    def keys_for(self, pairs: Iterable[Tuple[str, Path, Path]],
+                 max_workers: int = 8) -> Dict[str, Optional[str]]:
+        """Hash (object_id, mets_path, template_path) pairs into cache keys.
+
+        Hashing is I/O bound and hashlib releases the GIL, so the files are
+        read in a thread pool. Unreadable pairs get no key (None) and are
+        always compared, which reports the read error.
+        """
+        def hash_pair(pair):
+            object_id, mets_path, template_path = pair
+            try:
+                return object_id, self.key(file_digest(mets_path), file_digest(template_path))
+            except OSError:
+                return object_id, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(pool.map(hash_pair, pairs))
+
+    def get(self, key: Optional[str]) -> Optional[List[Finding]]:
+        """Return the cached findings for key, or None on a miss."""
+        row = None
+        if key is not None:
+            row = self._db.execute(
+                "SELECT findings FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+        return _decode(row[0])
+
+    def put(self, key: Optional[str], findings: List[Finding]) -> None:
+        # Parse errors may come from a transient read failure on a network
+        # share; they are cheap to recompute, so they are never cached.
+        if key is None or any(f.kind == "parse-error" for f in findings):
+            return
+        blob = _encode(findings)
+        self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                         (key, blob, len(blob), time.time()))
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits max_bytes."""
+        self._db.commit()
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self._db.commit()
+        logging.info(f"Evicted {len(evicted)} entries from result cache {self.path}")
+        return len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,163 @@
+"""Select the compared sections from a METS document.
+
+The compared sections are a small part of a delivered METS: fileSec and
+structMap can be tens of MB for a thick newspaper issue. When every section
+XPath has the simple form ``//prefix:tag`` or ``//prefix:tag[@ATTR="value"]``
+the document is read with iterparse: matching sections are kept and
+everything else is cleared as soon as it has been read. Any other XPath
+falls back to parsing the full document.
+
+A source is a path or, when its bytes were read ahead (see prefetch.py),
+the bytes of the document.
+"""
+import io
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from .config import CompareConfig
+
+# (Clark tag, attribute name or None, attribute value or None)
+StreamSpec = Tuple[str, Optional[str], Optional[str]]
+
+_SIMPLE_XPATH = re.compile(
+    r"""^//(?:(?P<prefix>[\w.-]+):)?(?P<local>[\w.-]+)"""
+    r"""(?:\[@(?P<attr>[\w.-]+)\s*=\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)')\])?$""")
+
+
+_local = threading.local()
+
+
+def _parser() -> etree.XMLParser:
+    """The XMLParser of this thread; lxml parsers may not be shared between threads."""
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = etree.XMLParser(remove_comments=True, remove_pis=True)
+    return parser
+
+
+def parse(source):
+    """Parse a complete document, dropping comments and processing instructions."""
+    if isinstance(source, bytes):
+        return etree.fromstring(source, _parser()).getroottree()
+    return etree.parse(source, _parser())
+
+
+def stream_spec(xpath: str, namespaces: Dict[str, str]) -> Optional[StreamSpec]:
+    """Return the streaming spec for a simple section XPath, or None."""
+    match = _SIMPLE_XPATH.match(xpath.strip())
+    if match is None:
+        return None
+    prefix, local = match["prefix"], match["local"]
+    if prefix is None:
+        tag = local
+    elif prefix in namespaces:
+        tag = f"{{{namespaces[prefix]}}}{local}"
+    else:
+        return None
+    value = match["dq"] if match["dq"] is not None else match["sq"]
+    return tag, match["attr"], value
+
+
+def stream_specs(config: CompareConfig) -> Optional[Dict[str, StreamSpec]]:
+    """Map every section XPath to its streaming spec; None if any cannot be streamed."""
+    specs = {}
+    for _, xpath in config.sections:
+        spec = stream_spec(xpath, config.namespaces)
+        if spec is None:
+            return None
+        specs[xpath] = spec
+    return specs
+
+
+def stream_sections(source, specs: Dict[str, StreamSpec]) -> Dict[str, List]:
+    """Collect the elements matching each spec in a single iterparse pass.
+
+    Elements outside a matching section are cleared once their end tag has
+    been read, so memory stays bounded by the size of the kept sections.
+    Matches are returned in document order, like ``tree.xpath`` would.
+    """
+    by_tag: Dict[str, List[Tuple[str, Optional[str], Optional[str]]]] = {}
+    for xpath, (tag, attr, value) in specs.items():
+        by_tag.setdefault(tag, []).append((xpath, attr, value))
+    found: Dict[str, List] = {xpath: [] for xpath in specs}
+    open_sections = []  # currently open matching elements, innermost last
+
+    for event, el in etree.iterparse(source, events=("start", "end"),
+                                     remove_comments=True, remove_pis=True):
+        if event == "start":
+            matched = False
+            for xpath, attr, value in by_tag.get(el.tag, ()):
+                if attr is None or el.get(attr) == value:
+                    found[xpath].append(el)
+                    matched = True
+            if matched:
+                open_sections.append(el)
+            continue
+
+        if open_sections and open_sections[-1] is el:
+            open_sections.pop()
+            kept = True
+        else:
+            kept = False
+        if open_sections:
+            continue  # inside a kept section: leave the subtree intact
+        if not kept:
+            el.clear(keep_tail=True)
+        # Drop siblings that have been fully read. Kept sections stay alive
+        # through the references in `found` after being unlinked.
+        parent = el.getparent()
+        if parent is not None:
+            while el.getprevious() is not None:
+                del parent[0]
+    return found
+
+
+def collect_sections(root, specs: Dict[str, StreamSpec]) -> Dict[str, List]:
+    """Collect the elements matching each spec from a parsed tree in one traversal.
+
+    Equivalent to evaluating every ``//prefix:tag[@ATTR="value"]`` XPath,
+    but the tree is walked once instead of once per section.
+    """
+    by_tag: Dict[str, List[Tuple[str, Optional[str], Optional[str]]]] = {}
+    for xpath, (tag, attr, value) in specs.items():
+        by_tag.setdefault(tag, []).append((xpath, attr, value))
+    found: Dict[str, List] = {xpath: [] for xpath in specs}
+    for el in root.iter(*by_tag):
+        for xpath, attr, value in by_tag[el.tag]:
+            if attr is None or el.get(attr) == value:
+                found[xpath].append(el)
+    return found
+
+
+def read_sections(source, specs: Optional[Dict[str, StreamSpec]],
+                  xpaths: Dict[str, Callable], streaming: bool = True) -> Dict[str, List]:
+    """Return the elements matched by each section XPath.
+
+    specs are the streaming specs of all sections (None if one of them is
+    not simple) and xpaths the compiled XPath per section. Simple sections
+    are collected in a single pass: while reading with streaming, or over
+    the parsed tree otherwise. Other XPaths are evaluated one by one.
+    """
+    if specs is not None and streaming:
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        return stream_sections(source, specs)
+    tree = parse(source)
+    if specs is not None:
+        return collect_sections(tree.getroot(), specs)
+    return {xpath: find(tree) for xpath, find in xpaths.items()}
+
+
+def extract_sections(source, config: CompareConfig,
+                     streaming: bool = True) -> Dict[str, List]:
+    """Return the elements matched by each configured section XPath.
+
+    Compiles the XPaths on every call; the comparison itself uses the
+    compiled plan (plan.ComparePlan.extract).
+    """
+    xpaths = {xpath: etree.XPath(xpath, namespaces=config.namespaces)
+              for _, xpath in config.sections}
+    return read_sections(source, stream_specs(config), xpaths, streaming)
@@ -0,0 +1,288 @@
+"""Comparison service: warm workers for many small runs.
+
+Every tk4-compare run pays for starting Python, importing lxml, starting
+the worker processes, compiling the config and listing the templates;
+for a small delivery that is most of the run. ``tk4-compare serve`` pays
+for it once. It keeps a worker pool and the template listings and takes
+comparison jobs over HTTP on a local port:
+
+    POST /jobs    {"batches": ["/data/in/batch1"], "output": "/data/reports",
+                   "config": "/data/project.toml", "json_format": "compact"}
+    GET  /health
+
+Only batches and output are required; a job may also name another
+"templates" path. The answer holds the report paths, the summary numbers
+and the exit code a CLI run would have had (2, with an "error", for a job
+that cannot run as given; HTTP status 400).
+
+The job API has no authentication, and a job makes the server read the
+paths it names and write reports wherever it asks. The server therefore
+only listens on a loopback address (make_server refuses any other), so
+only users of the machine itself can post jobs.
+
+Jobs run one at a time on the shared pool, in order of arrival. The
+workers compile the plan of each job's config once and keep it by config
+digest (see compare._plan). The template directories are listed again
+for every job, through an in-memory Manifest: only directories whose
+mtime changed are listed, so new templates are found without a restart.
+"""
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from . import __version__
+from .archive import is_archive
+from .compare import _auto_workers, compare_files, different_ids, worker_pool
+from .config import CompareConfig, ConfigError, load_config
+from .execution import RECYCLE_CHUNKS
+from .parser import Manifest, get_mets, get_templates
+from .plan import compile_plan
+from .template_index import default_index_path
+from .writer import JSON_FORMATS, total_findings, write_reports
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Exit codes of the equivalent CLI run (see cli.py).
+EXIT_OK = 0
+EXIT_FINDINGS = 1
+EXIT_USAGE = 2
+
+
+class JobError(ValueError):
+    """A job that cannot run as given: the usage errors of a CLI run."""
+
+
+def _existing(value, what: str) -> Path:
+    if not isinstance(value, str) or not value:
+        raise JobError(f"{what} must be a path")
+    path = Path(value)
+    if not path.is_dir() and not (is_archive(path) and path.is_file()):
+        raise JobError(f"{what} does not exist or is not a directory or archive: {path}")
+    return path
+
+
+class CompareService:
+    """The resident part of the serve command: worker pool, config and template listings.
+
+    config is the config of jobs that do not name one; the pool is started
+    with it. Use as a context manager, or call start and close.
+    """
+
+    def __init__(self, templates: Path, config: CompareConfig,
+                 max_workers: Optional[int] = None, log_queue=None,
+                 max_depth: Optional[int] = None, prune: Iterable[str] = (),
+                 prefetch: Optional[int] = None, backend: str = "process"):
+        self.templates = templates
+        self.config = config
+        self.workers = max_workers or _auto_workers(os.cpu_count() or 2)
+        self.log_queue = log_queue
+        self.max_depth = max_depth
+        self.prune = tuple(prune)
+        self.prefetch = prefetch
+        self.backend = backend
+        self.jobs = 0
+        self._manifest = Manifest()  # template directory listings, kept in memory
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _start_pool(self) -> None:
+        self._pool = worker_pool(self.workers, self.workers, self.log_queue, self.config,
+                                 prefetch=self.prefetch,
+                                 recycle_after=self.workers * RECYCLE_CHUNKS,
+                                 backend=self.backend)
+        # Start every worker now (they compile the plan of config on start),
+        # so the first job does not wait for them.
+        for future in [self._pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def start(self) -> "CompareService":
+        self._start_pool()
+        templates = get_templates(self.templates, self.max_depth, self.prune, self._manifest)
+        logging.info(f"Started {self.workers} workers; {len(templates)} templates "
+                     f"in {self.templates}")
+        return self
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "CompareService":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def run_job(self, job: Dict) -> Dict:
+        """Run one comparison job (see the module docstring); raises JobError."""
+        with self._lock:
+            return self._run(job)
+
+    def _config(self, job: Dict) -> CompareConfig:
+        if job.get("config") is None:
+            return self.config
+        try:
+            config = load_config(Path(job["config"]))
+            compile_plan(config)
+        except (ConfigError, TypeError) as e:
+            raise JobError(f"Invalid configuration: {e}") from e
+        return config
+
+    def _run(self, job: Dict) -> Dict:
+        start = time.perf_counter()
+        if not isinstance(job, dict):
+            raise JobError("A job must be a JSON object")
+        batches = job.get("batches")
+        if not isinstance(batches, list) or not batches:
+            raise JobError("batches must be a list of paths")
+        batches = [_existing(batch, "Batch path") for batch in batches]
+        if not isinstance(job.get("output"), str) or not job["output"]:
+            raise JobError("output must be a path")
+        output = Path(job["output"])
+        templates_path = (self.templates if job.get("templates") is None
+                          else _existing(job["templates"], "Template path"))
+        json_format = job.get("json_format", "pretty")
+        if json_format not in JSON_FORMATS:
+            raise JobError(f"json_format must be one of {', '.join(JSON_FORMATS)}")
+        config = self._config(job)
+
+        mets = get_mets(batches, self.max_depth, self.prune)
+        if not mets:
+            raise JobError("No METS files found in the given batch paths")
+        templates = get_templates(templates_path, self.max_depth, self.prune, self._manifest)
+        if not templates:
+            raise JobError("No template files found in the given template path")
+        template_index = default_index_path(templates_path)
+        try:
+            errors = compare_files(mets, templates, config, max_workers=self.workers,
+                                   log_queue=self.log_queue,
+                                   template_index=template_index if template_index.exists()
+                                   else None,
+                                   executor=self._pool)
+        except BrokenProcessPool:
+            logging.error("A worker process died; starting a new worker pool")
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._start_pool()
+            raise
+        mets_diff_ids, templates_diff_ids = different_ids(mets, templates)
+        n_compared = len(set(mets) & set(templates))
+        reports = write_reports(errors, mets_diff_ids, templates_diff_ids, output, batches,
+                                n_compared=n_compared, json_format=json_format)
+        self.jobs += 1
+        findings = errors or mets_diff_ids or templates_diff_ids
+        return {
+            "exit_code": EXIT_FINDINGS if findings else EXIT_OK,
+            "reports": [str(path) for path in reports],
+            "objects_compared": n_compared,
+            "objects_with_findings": len(errors),
+            "findings": total_findings(errors),
+            "mets_without_template": len(mets_diff_ids),
+            "templates_not_returned": len(templates_diff_ids),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = f"compare_mets/{__version__}"
+
+    def _reply(self, status: int, body: Dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._reply(404, {"error": f"Not found: {self.path}"})
+            return
+        service = self.server.service
+        self._reply(200, {"status": "ok", "version": __version__,
+                          "workers": service.workers, "jobs": service.jobs})
+
+    def do_POST(self) -> None:
+        if self.path != "/jobs":
+            self._reply(404, {"error": f"Not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            self._reply(400, {"exit_code": EXIT_USAGE, "error": f"Invalid JSON: {e}"})
+            return
+        try:
+            result = self.server.service.run_job(job)
+        except JobError as e:
+            logging.error(f"Rejected job: {e}")
+            self._reply(400, {"exit_code": EXIT_USAGE, "error": str(e)})
+        except Exception as e:
+            logging.exception("Job failed")
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._reply(200, result)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def is_loopback(host: str) -> bool:
+    """Whether every address host resolves to is a loopback address."""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except (socket.gaierror, UnicodeError):
+        return False
+    return bool(addresses) and all(
+        ipaddress.ip_address(address.split("%")[0]).is_loopback for address in addresses)
+
+
+def make_server(service: CompareService, host: str = DEFAULT_HOST,
+                port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """HTTP server for service's job API; port 0 picks a free port.
+
+    Raises ValueError for a host that is not a loopback address (see the
+    module docstring).
+    """
+    if not is_loopback(host):
+        raise ValueError(f"Refusing to listen on {host}: the job API has no "
+                         f"authentication, so it only listens on loopback addresses")
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.service = service
+    return server
+
+
+def submit_job(url: str, batches: List[Path], output: Path,
+               config: Optional[Path] = None, templates: Optional[Path] = None,
+               json_format: Optional[str] = None, timeout: Optional[float] = None) -> Dict:
+    """Run a job on the service at url (e.g. http://127.0.0.1:8765) and return its answer.
+
+    A rejected job is returned like any other, with exit_code 2 and an
+    error; a failed job raises urllib.error.HTTPError.
+    """
+    job = {"batches": [str(batch) for batch in batches], "output": str(output)}
+    for key, value in (("config", config), ("templates", templates)):
+        if value is not None:
+            job[key] = str(value)
+    if json_format is not None:
+        job["json_format"] = json_format
+    request = urllib.request.Request(f"{url.rstrip('/')}/jobs",
+                                     data=json.dumps(job).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        if e.code == 400:
+            return json.load(e)
+        raise
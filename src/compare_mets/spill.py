@@ -0,0 +1,64 @@
+"""Append-only spill file for findings, to keep the parent process small.
+
+When a supplier breaks a field in every object, a large batch produces
+millions of findings. Instead of collecting them in one dict, compare_files
+can append them to a gzip-compressed JSON Lines file as results come in.
+SpilledFindings behaves like the errors dict for the report writers: every
+call to items() is one streaming pass over the file.
+"""
+import gzip
+import json
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from .findings import Finding
+
+
+class SpilledFindings:
+    """Findings per report key, stored in a gzip JSON Lines file.
+
+    Each line is ``[report_key, [[section, kind, path, template, mets], ...]]``.
+    Writing happens through ``spill[report_key] = findings``; the file is
+    closed for writing on the first read.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.total_findings = 0
+        self._n_objects = 0
+        self._file = gzip.open(path, "wt", encoding="utf-8", compresslevel=1)
+
+    def __setitem__(self, report_key: str, findings: List[Finding]) -> None:
+        rows = [[f.section, f.kind, f.path, f.template_value, f.mets_value]
+                for f in findings]
+        self._file.write(json.dumps([report_key, rows], ensure_ascii=False))
+        self._file.write("\n")
+        self._n_objects += 1
+        self.total_findings += len(findings)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self) -> int:
+        return self._n_objects
+
+    def items(self) -> Iterator[Tuple[str, List[Finding]]]:
+        self.close()
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                report_key, rows = json.loads(line)
+                yield report_key, [Finding(*row) for row in rows]
+
+    def keys(self) -> Iterator[str]:
+        return (report_key for report_key, _ in self.items())
+
+    __iter__ = keys
+
+    def values(self) -> Iterator[List[Finding]]:
+        return (findings for _, findings in self.items())
+
+    def remove(self) -> None:
+        self.close()
+        self.path.unlink(missing_ok=True)
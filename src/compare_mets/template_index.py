@@ -0,0 +1,155 @@
+"""Precompiled on-disk index of template sections.
+
+Templates are written once and then compared against every (re)delivery.
+The index stores, per object ID, the configured sections of the template as
+canonical XML (exclusive C14N), so a comparison run loads a few small
+fragments instead of re-reading and re-parsing the full template from the
+(often network-mounted) template directory.
+
+Entries are keyed on object ID plus config digest and carry the template's
+size and mtime; an entry is stale as soon as either of them changed.
+"""
+import json
+import logging
+import os
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from lxml import etree
+
+from .archive import ArchivePath, Source, is_archive, open_source
+from .config import CompareConfig
+from .plan import ComparePlan, as_plan
+
+INDEX_NAME = ".compare_mets_index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    object_id TEXT NOT NULL,
+    config TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sections BLOB NOT NULL,
+    PRIMARY KEY (object_id, config)
+)
+"""
+
+
+def default_index_path(templates_dir: Path) -> Path:
+    """The index inside the template directory, or next to a template archive."""
+    if is_archive(templates_dir):
+        return templates_dir.with_name(templates_dir.name + INDEX_NAME)
+    return templates_dir / INDEX_NAME
+
+
+def _signature(path: Source) -> Tuple[int, int]:
+    """(size, mtime_ns) of a template; an archive member has the mtime of its archive."""
+    if isinstance(path, ArchivePath):
+        return path.size, os.stat(path.archive).st_mtime_ns
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def encode_sections(sections: Dict[str, List]) -> bytes:
+    """Serialise extracted sections to a compact, canonical blob."""
+    data = {
+        xpath: [etree.tostring(node, method="c14n", exclusive=True).decode("utf-8")
+                for node in nodes]
+        for xpath, nodes in sections.items()
+    }
+    return zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+
+class CorruptEntry(ValueError):
+    """An index blob that cannot be decoded (truncated or damaged index file)."""
+
+
+def decode_sections(blob: bytes) -> Dict[str, List]:
+    """Turn a blob from encode_sections back into section elements; raises CorruptEntry."""
+    parser = etree.XMLParser(remove_comments=True, remove_pis=True)
+    try:
+        data = json.loads(zlib.decompress(blob).decode("utf-8"))
+        return {
+            xpath: [etree.fromstring(fragment.encode("utf-8"), parser)
+                    for fragment in fragments]
+            for xpath, fragments in data.items()
+        }
+    except (zlib.error, ValueError, TypeError, AttributeError, etree.XMLSyntaxError) as e:
+        raise CorruptEntry(f"{type(e).__name__}: {e}") from e
+
+
+def extract_template(object_id: str, path: Path,
+                     config: Union[CompareConfig, ComparePlan]
+                     ) -> Tuple[str, Optional[Tuple[int, int, bytes]]]:
+    """Extract and encode one template; returns (object_id, (size, mtime_ns, blob)).
+
+    The signature is taken before reading, so a template that changes while
+    it is being indexed shows up as stale on the next run. Unreadable
+    templates return None and lose their entry (see update_index); the
+    comparison then reads the template itself and reports the parse error.
+    """
+    try:
+        size, mtime_ns = _signature(path)
+        with open_source(path) as source:
+            blob = encode_sections(as_plan(config).extract(source))
+    except (etree.XMLSyntaxError, OSError) as e:
+        logging.error(f"Failed to index template file {path}: {e}")
+        return object_id, None
+    return object_id, (size, mtime_ns, blob)
+
+
+class TemplateIndex:
+    """SQLite store of extracted template sections."""
+
+    def __init__(self, path: Path, config_digest: str):
+        self.path = path
+        self.config = config_digest
+        self._db = sqlite3.connect(str(path))
+        self._db.execute(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "TemplateIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def stale_ids(self, templates: Dict[str, Path]) -> List[str]:
+        """Return the object IDs whose entry is missing or out of date."""
+        known = {
+            object_id: (size, mtime_ns)
+            for object_id, size, mtime_ns in self._db.execute(
+                "SELECT object_id, size, mtime_ns FROM templates WHERE config = ?",
+                (self.config,))
+        }
+        stale = []
+        for object_id, path in templates.items():
+            try:
+                signature = _signature(path)
+            except OSError:
+                signature = None
+            if known.get(object_id) != signature:
+                stale.append(object_id)
+        return stale
+
+    def load(self, object_id: str) -> Optional[bytes]:
+        row = self._db.execute(
+            "SELECT sections FROM templates WHERE object_id = ? AND config = ?",
+            (object_id, self.config)).fetchone()
+        return row[0] if row else None
+
+    def store(self, object_id: str, size: int, mtime_ns: int, blob: bytes) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO templates VALUES (?, ?, ?, ?, ?)",
+            (object_id, self.config, size, mtime_ns, blob))
+
+    def remove(self, object_id: str) -> None:
+        self._db.execute("DELETE FROM templates WHERE object_id = ? AND config = ?",
+                         (object_id, self.config))
+
+    def commit(self) -> None:
+        self._db.commit()
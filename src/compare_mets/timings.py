@@ -0,0 +1,117 @@
+"""Timers and counters of a run, for the timings block of the JSON report.
+
+Workers collect per chunk (a Timings per chunk, exported as plain data) and
+the parent merges the chunks into the run's Timings, together with the
+phases it times itself (discovery, comparison, report writing). Timing
+uses time.perf_counter around whole files and sections, not per node.
+
+With profiling enabled, each worker also runs cProfile over its chunks;
+the raw stats are merged into one pstats file (see ProfileMerger).
+"""
+import heapq
+import pstats
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SLOWEST_FILES = 10
+
+
+class Timings:
+    def __init__(self, n_slowest: int = SLOWEST_FILES):
+        self.n_slowest = n_slowest
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.sections: Dict[str, List[float]] = {}   # label -> [seconds, count]
+        self.slowest: List[Tuple[float, str]] = []    # min-heap of (seconds, object_id)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_section(self, label: str, seconds: float) -> None:
+        entry = self.sections.setdefault(label, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def add_file(self, object_id: str, seconds: float) -> None:
+        item = (seconds, object_id)
+        if len(self.slowest) < self.n_slowest:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def export(self) -> tuple:
+        """Plain-data form, cheap to pickle from a worker."""
+        return self.phases, self.counters, self.sections, self.slowest
+
+    def merge(self, exported: tuple) -> None:
+        phases, counters, sections, slowest = exported
+        for name, seconds in phases.items():
+            self.add_phase(name, seconds)
+        for name, n in counters.items():
+            self.count(name, n)
+        for label, (seconds, count) in sections.items():
+            entry = self.sections.setdefault(label, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += count
+        for seconds, object_id in slowest:
+            self.add_file(object_id, seconds)
+
+    def to_json(self) -> Dict:
+        return {
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "counters": dict(self.counters),
+            "sections": {
+                label: {"seconds": round(seconds, 4), "count": count}
+                for label, (seconds, count) in self.sections.items()
+            },
+            "slowest_files": [
+                {"object_id": object_id, "seconds": round(seconds, 4)}
+                for seconds, object_id in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+class _RawStats:
+    """Adapter that lets pstats.Stats load a stats dict from a worker."""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class ProfileMerger:
+    """Merge cProfile stats dicts from the workers into one pstats file."""
+
+    def __init__(self):
+        self._stats: Optional[pstats.Stats] = None
+
+    def add(self, stats: Optional[dict]) -> None:
+        if not stats:
+            return
+        if self._stats is None:
+            self._stats = pstats.Stats(_RawStats(stats))
+        else:
+            self._stats.add(_RawStats(stats))
+
+    def dump(self, path: Path) -> bool:
+        """Write the merged profile; returns False if nothing was profiled."""
+        if self._stats is None:
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._stats.dump_stats(str(path))
+        return True
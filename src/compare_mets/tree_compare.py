@@ -9,13 +9,28 @@ Normalisation that happens implicitly:
 - leading/trailing whitespace around text is ignored;
 - attribute order is irrelevant (attributes are compared as a mapping);
 - namespace *prefixes* are irrelevant (tags are compared by namespace URI).
+
+tree_digest hashes an element under exactly these rules, so sections with
+equal digests can skip the detailed comparison.
+
+Children are aligned on their tag sequence. Tags listed in the config's
+align table are aligned on a key instead (see alignment_keys), with a
+patience diff, so that one inserted premis:event among dozens is reported
+as one extra element rather than as a cascade of changed values.
 """
+import bisect
+import hashlib
 from collections import Counter
 from difflib import SequenceMatcher
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from lxml import etree
 
-from .config import CompareConfig
+from .config import CompareConfig, ConfigError, _clark
 from .findings import Finding
+from .timings import Timings
+
+KeyFunction = Callable[[etree._Element], Optional[str]]
 
 
 def prefix_map(config: CompareConfig) -> Dict[str, str]:
@@ -32,91 +47,288 @@ def qname(tag: str, prefixes: Dict[str, str]) -> str:
     return f"{prefix}:{local}" if prefix else tag
 
 
+def alignment_keys(config: CompareConfig) -> Dict[str, KeyFunction]:
+    """Build the key function per aligned tag from config.align.
+
+    A key is "@ATTR" (attribute value), "hash" (digest of the normalised
+    element) or a child path relative to the element, whose stripped text
+    is the key. Raises ConfigError for keys that cannot be used.
+    """
+    keys: Dict[str, KeyFunction] = {}
+    probe = etree.Element("probe")
+    for tag, spec in config.align.items():
+        if spec == "hash":
+            keys[tag] = lambda el: tree_digest(el, config)
+        elif spec.startswith("@"):
+            attr = _clark(spec[1:], config.namespaces)
+            keys[tag] = lambda el, attr=attr: el.get(attr)
+        else:
+            try:
+                probe.findtext(spec, namespaces=config.namespaces)
+            except SyntaxError as e:
+                raise ConfigError(f"Invalid alignment key {spec!r}: {e}") from e
+            keys[tag] = lambda el, spec=spec: _norm(
+                el.findtext(spec, namespaces=config.namespaces))
+    return keys
+
+
 def compare_trees(template_el, mets_el, section: str, config: CompareConfig,
-                  path: Optional[str] = None) -> List[Finding]:
-    """Compare two elements recursively and return all differences."""
-    prefixes = prefix_map(config)
+                  path: Optional[str] = None,
+                  prefixes: Optional[Dict[str, str]] = None,
+                  align: Optional[Dict[str, KeyFunction]] = None,
+                  timings: Optional[Timings] = None) -> List[Finding]:
+    """Compare two elements recursively and return all differences.
+
+    prefixes is the prefix_map of config and align its alignment_keys;
+    pass them to avoid rebuilding them. The number of compared element
+    pairs is counted in timings, if given.
+    """
+    if prefixes is None:
+        prefixes = prefix_map(config)
+    if align is None:
+        align = alignment_keys(config)
     if path is None:
         path = qname(template_el.tag, prefixes)
     findings: List[Finding] = []
-    _compare(template_el, mets_el, section, config, prefixes, path, findings,
-             compare_tail=False)
+    n_nodes = _compare(template_el, mets_el, section, config, prefixes, align, path,
+                       findings, compare_tail=False)
+    if timings is not None:
+        timings.count("nodes_compared", n_nodes)
     return findings
 
 
+def tree_digest(el, config: CompareConfig) -> bytes:
+    """Digest of an element under the normalisation rules of compare_trees.
+
+    Tags and attribute names are hashed in Clark notation, attributes in
+    sorted order, text and tails stripped, and the text of ignore_text
+    elements is left out. The tail of el itself is not compared and not
+    hashed. The control characters used as separators cannot occur in XML.
+    """
+    ignore_text = config.ignore_text
+    parts = []
+    append = parts.append
+    for event, node in etree.iterwalk(el, events=("start", "end")):
+        if event == "start":
+            append(f"\x01{node.tag}")
+            for name, value in sorted(node.attrib.items()):
+                append(f"\x02{name}\x03{value}")
+            if node.tag not in ignore_text:
+                append(f"\x04{(node.text or '').strip()}")
+        else:
+            append("\x05")
+            if node is not el:
+                append((node.tail or "").strip())
+    return hashlib.blake2b("".join(parts).encode("utf-8"), digest_size=16).digest()
+
+
 def _norm(text: Optional[str]) -> Optional[str]:
     return (text or "").strip() or None
 
 
-def _child_paths(children, parent_path: str, prefixes: Dict[str, str]) -> List[str]:
-    """Build a path per child, with [n] only when the tag occurs more than once."""
-    counts = Counter(child.tag for child in children)
+# Path steps of the children per parent, so that many findings below one
+# parent do not count its children again for every finding.
+StepCache = Dict[etree._Element, Dict[etree._Element, str]]
+
+
+def _child_steps(parent, prefixes: Dict[str, str]) -> Dict[etree._Element, str]:
+    """Path step of every child of parent, with [n] only when its tag occurs more than once."""
+    counts = Counter(child.tag for child in parent)
     seen: Counter = Counter()
-    paths = []
-    for child in children:
-        seen[child.tag] += 1
+    steps = {}
+    for child in parent:
         name = qname(child.tag, prefixes)
         if counts[child.tag] > 1:
+            seen[child.tag] += 1
             name = f"{name}[{seen[child.tag]}]"
-        paths.append(f"{parent_path}/{name}")
-    return paths
+        steps[child] = name
+    return steps
 
 
-def _compare(template_el, mets_el, section, config, prefixes, path, findings,
-             compare_tail: bool) -> None:
-    if template_el.tag != mets_el.tag:
-        findings.append(Finding(section, "element", path,
-                                qname(template_el.tag, prefixes),
-                                qname(mets_el.tag, prefixes)))
-        return
+def _step(el, prefixes: Dict[str, str], cache: StepCache) -> str:
+    """Path step of el below its parent, from the steps of its siblings cached per parent."""
+    parent = el.getparent()
+    if parent is None:
+        return qname(el.tag, prefixes)
+    steps = cache.get(parent)
+    if steps is None:
+        steps = cache[parent] = _child_steps(parent, prefixes)
+    return steps[el]
+
+
+def _element_path(el, root, root_path: str, prefixes: Dict[str, str],
+                  cache: StepCache) -> str:
+    """Readable path of el, a descendant-or-self of root, built from the parent chain."""
+    steps = []
+    while el is not root:
+        steps.append(_step(el, prefixes, cache))
+        el = el.getparent()
+    return "/".join([root_path, *reversed(steps)])
+
+
+def _anchors(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Longest subsequence of (i, j) pairs, sorted on i, that increases in j.
+
+    Patience sorting with predecessor links: O(n log n).
+    """
+    tails: List[int] = []        # smallest j ending an increasing run of each length
+    tail_index: List[int] = []   # index into pairs of that j
+    previous = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        length = bisect.bisect_left(tails, j)
+        if length == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[length] = j
+            tail_index[length] = k
+        previous[k] = tail_index[length - 1] if length else -1
+    result = []
+    k = tail_index[-1] if tail_index else -1
+    while k != -1:
+        result.append(pairs[k])
+        k = previous[k]
+    return result[::-1]
 
-    template_attrs = dict(template_el.attrib)
-    mets_attrs = dict(mets_el.attrib)
-    for name in sorted(set(template_attrs) | set(mets_attrs)):
-        if template_attrs.get(name) != mets_attrs.get(name):
+
+def _keyed_opcodes(a: Sequence[Hashable], b: Sequence[Hashable]):
+    """Opcodes like SequenceMatcher.get_opcodes, from a patience diff.
+
+    Tokens occurring exactly once on both sides are matched when they keep
+    their relative order; only the gaps between those anchors go through
+    SequenceMatcher, so long keyed runs stay near-linear.
+    """
+    count_a, count_b = Counter(a), Counter(b)
+    position_b = {token: j for j, token in enumerate(b) if count_b[token] == 1}
+    pairs = [(i, position_b[token]) for i, token in enumerate(a)
+             if count_a[token] == 1 and token in position_b]
+    opcodes = []
+    i = j = 0
+    for anchor_i, anchor_j in _anchors(pairs) + [(len(a), len(b))]:
+        if i < anchor_i or j < anchor_j:
+            gap = SequenceMatcher(None, a[i:anchor_i], b[j:anchor_j], autojunk=False)
+            opcodes.extend((op, i + i1, i + i2, j + j1, j + j2)
+                           for op, i1, i2, j1, j2 in gap.get_opcodes())
+        if anchor_i < len(a):
+            opcodes.append(("equal", anchor_i, anchor_i + 1, anchor_j, anchor_j + 1))
+        i, j = anchor_i + 1, anchor_j + 1
+    return opcodes
+
+
+def _tokens(children, tags: List[str], align: Dict[str, KeyFunction]) -> list:
+    """Tag per child, or (tag, key) for children aligned on a key."""
+    return [(tag, align[tag](child)) if tag in align else tag
+            for child, tag in zip(children, tags)]
+
+
+def _compare_attributes(template_el, mets_el, section, prefixes, path_of, findings) -> None:
+    template_names, mets_names = template_el.keys(), mets_el.keys()
+    if template_names == mets_names and all(
+            template_el.get(name) == mets_el.get(name) for name in template_names):
+        return
+    path = path_of(template_el)
+    for name in sorted(set(template_names) | set(mets_names)):
+        template_value, mets_value = template_el.get(name), mets_el.get(name)
+        if template_value != mets_value:
             findings.append(Finding(section, "attribute",
                                     f"{path}/@{qname(name, prefixes)}",
-                                    template_attrs.get(name),
-                                    mets_attrs.get(name)))
-
-    if template_el.tag not in config.ignore_text:
-        template_text, mets_text = _norm(template_el.text), _norm(mets_el.text)
-        if template_text != mets_text:
-            findings.append(Finding(section, "text", path, template_text, mets_text))
-
-    if compare_tail:
-        template_tail, mets_tail = _norm(template_el.tail), _norm(mets_el.tail)
-        if template_tail != mets_tail:
-            findings.append(Finding(section, "text", f"{path} (tail)",
-                                    template_tail, mets_tail))
-
-    template_children = list(template_el)
-    mets_children = list(mets_el)
-    template_paths = _child_paths(template_children, path, prefixes)
-    mets_paths = _child_paths(mets_children, path, prefixes)
-
-    # Align children on their tag sequence, so that a single inserted or
-    # removed element does not misalign everything after it.
-    matcher = SequenceMatcher(
-        None,
-        [child.tag for child in template_children],
-        [child.tag for child in mets_children],
-        autojunk=False,
-    )
-    for op, i1, i2, j1, j2 in matcher.get_opcodes():
-        if op == "equal" or (op == "replace" and (i2 - i1) == (j2 - j1)):
-            for k in range(i2 - i1):
-                _compare(template_children[i1 + k], mets_children[j1 + k],
-                         section, config, prefixes, template_paths[i1 + k],
-                         findings, compare_tail=True)
+                                    template_value, mets_value))
+
+
+def _compare(template_el, mets_el, section, config, prefixes, align, path, findings,
+             compare_tail: bool) -> int:
+    """Compare two subtrees depth-first, with an explicit stack.
+
+    The stack holds pending element pairs and pending missing/extra
+    findings, pushed in reverse so they are handled in document order:
+    findings come out in the same order as a recursive walk would produce,
+    without a recursion limit on deeply nested metadata.
+
+    path belongs to template_el. Paths of descendants are only built, from
+    their parent chain, when a finding is reported for them. Returns the
+    number of element pairs compared.
+    """
+    ignore_text = config.ignore_text
+    root, root_path = template_el, path
+    steps: StepCache = {}  # per parent, filled as findings are reported
+
+    def path_of(el) -> str:
+        return _element_path(el, root, root_path, prefixes, steps)
+
+    n_nodes = 0
+    stack = [(template_el, mets_el, compare_tail)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Finding):
+            findings.append(item)
+            continue
+        template_el, mets_el, compare_tail = item
+        n_nodes += 1
+
+        if template_el.tag != mets_el.tag:
+            findings.append(Finding(section, "element", path_of(template_el),
+                                    qname(template_el.tag, prefixes),
+                                    qname(mets_el.tag, prefixes)))
+            continue
+
+        _compare_attributes(template_el, mets_el, section, prefixes, path_of, findings)
+
+        if template_el.tag not in ignore_text:
+            template_text, mets_text = _norm(template_el.text), _norm(mets_el.text)
+            if template_text != mets_text:
+                findings.append(Finding(section, "text", path_of(template_el),
+                                        template_text, mets_text))
+
+        if compare_tail:
+            template_tail, mets_tail = _norm(template_el.tail), _norm(mets_el.tail)
+            if template_tail != mets_tail:
+                findings.append(Finding(section, "text", f"{path_of(template_el)} (tail)",
+                                        template_tail, mets_tail))
+
+        template_children = list(template_el)
+        mets_children = list(mets_el)
+        if not template_children and not mets_children:
+            continue
+        template_tags = [child.tag for child in template_children]
+        mets_tags = [child.tag for child in mets_children]
+
+        keyed = bool(align) and any(tag in align for tag in (*template_tags, *mets_tags))
+        if keyed:
+            template_tokens = _tokens(template_children, template_tags, align)
+            mets_tokens = _tokens(mets_children, mets_tags, align)
+        else:
+            template_tokens, mets_tokens = template_tags, mets_tags
+
+        if template_tokens == mets_tokens:
+            # The usual case: same children in the same order.
+            pending = [(template_children[k], mets_children[k], True)
+                       for k in range(len(template_children))]
         else:
-            for k in range(i1, i2):
-                findings.append(Finding(section, "missing-element",
-                                        template_paths[k],
-                                        qname(template_children[k].tag, prefixes),
-                                        None))
-            for k in range(j1, j2):
-                findings.append(Finding(section, "extra-element",
-                                        mets_paths[k],
-                                        None,
-                                        qname(mets_children[k].tag, prefixes)))
+            # Align children on their tag sequence (or keys), so that a single
+            # inserted or removed element does not misalign everything after it.
+            if keyed:
+                opcodes = _keyed_opcodes(template_tokens, mets_tokens)
+            else:
+                opcodes = SequenceMatcher(None, template_tags, mets_tags,
+                                          autojunk=False).get_opcodes()
+            pending = []
+            for op, i1, i2, j1, j2 in opcodes:
+                if op == "equal" or (op == "replace" and (i2 - i1) == (j2 - j1)):
+                    for k in range(i2 - i1):
+                        pending.append((template_children[i1 + k], mets_children[j1 + k],
+                                        True))
+                else:
+                    for k in range(i1, i2):
+                        pending.append(Finding(section, "missing-element",
+                                               path_of(template_children[k]),
+                                               qname(template_tags[k], prefixes),
+                                               None))
+                    for k in range(j1, j2):
+                        # An extra element has no template counterpart: its
+                        # path continues from the template parent.
+                        extra_path = (f"{path_of(template_el)}/"
+                                      f"{_step(mets_children[k], prefixes, steps)}")
+                        pending.append(Finding(section, "extra-element", extra_path,
+                                               None, qname(mets_tags[k], prefixes)))
+        stack.extend(reversed(pending))
+    return n_nodes
@@ -0,0 +1,175 @@
+"""Watch mode: compare delivered METS files while the upload is still running.
+
+Suppliers upload a batch over several hours. In watch mode the batch
+directories are polled (listed with scandir, see parser.find) and every
+METS file is compared as soon as it is complete, so feedback on a large
+upload is ready about when the upload itself is done. A file counts as
+complete once its size and modification time have stayed the same for a
+settle period, observed over successive polls, so files that are still
+being written are skipped. The template map and a worker pool are kept
+for the whole session; after every round of comparisons the reports are
+rewritten with all findings so far, under one fixed name.
+"""
+import collections
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .archive import ArchivePath, Source
+from .compare import _auto_workers, compare_files, different_ids, report_key, worker_pool
+from .config import CompareConfig
+from .execution import RECYCLE_CHUNKS
+from .findings import Finding
+from .parser import METS_SUFFIX, find, mets_object_id
+from .writer import write_reports
+
+DEFAULT_INTERVAL = 10.0
+DEFAULT_SETTLE = 30.0
+
+Signature = Tuple[int, int]  # (size, mtime_ns)
+
+
+def _signature(path: Source) -> Signature:
+    """Size and mtime of a file; an archive member changes with its archive."""
+    st = os.stat(path.archive if isinstance(path, ArchivePath) else path)
+    return st.st_size, st.st_mtime_ns
+
+
+class UploadWatcher:
+    """Polls batch directories for METS files whose upload has finished.
+
+    A file is ready once its size and mtime have not changed for settle
+    seconds. A file that changes after it was compared (a re-upload) is
+    compared again once it is stable.
+    """
+
+    def __init__(self, batches: List[Path], settle: float = DEFAULT_SETTLE,
+                 max_depth: Optional[int] = None, prune: Iterable[str] = (),
+                 clock: Callable[[], float] = time.monotonic):
+        self.batches = batches
+        self.settle = settle
+        self.max_depth = max_depth
+        self.prune = tuple(prune)
+        self.clock = clock
+        self.seen: Dict[str, Source] = collections.OrderedDict()  # as of the last poll
+        self._stable_since: Dict[Source, Tuple[Signature, float]] = {}
+        self._compared: Dict[Source, Signature] = {}
+
+    @property
+    def pending(self) -> int:
+        """Files seen in the last poll that have not been compared in their current state."""
+        return sum(1 for path, (signature, _) in self._stable_since.items()
+                   if self._compared.get(path) != signature)
+
+    def poll(self) -> Dict[str, Source]:
+        """Return the complete METS files (by object ID) not yet compared as they are now."""
+        now = self.clock()
+        found = find([(batch, METS_SUFFIX) for batch in self.batches],
+                     self.max_depth, self.prune)
+        seen = collections.OrderedDict()
+        stable_since = {}
+        ready = collections.OrderedDict()
+        for path in (path for paths in found for path in paths):
+            try:
+                signature = _signature(path)
+            except OSError:
+                continue  # removed (or renamed) since it was listed
+            object_id = mets_object_id(path)
+            seen[object_id] = path
+            previous = self._stable_since.get(path)
+            since = previous[1] if previous is not None and previous[0] == signature else now
+            stable_since[path] = (signature, since)
+            if now - since >= self.settle and self._compared.get(path) != signature:
+                ready[object_id] = path
+        self.seen = seen
+        self._stable_since = stable_since
+        return ready
+
+    def mark_compared(self, paths: Iterable[Source]) -> None:
+        for path in paths:
+            self._compared[path] = self._stable_since[path][0]
+
+
+def _write(output: Path, stem: str, errors, seen: Dict[str, Source],
+           templates: Dict[str, Source], batches: List[Path], n_compared: int,
+           json_format: str) -> Tuple[Set[str], Set[str]]:
+    """Write the reports to a staging directory and move them in place, so a
+    reader never sees a half-written report."""
+    mets_diff_ids, templates_diff_ids = different_ids(seen, templates)
+    staging = output / ".watch"
+    for path in write_reports(errors, mets_diff_ids, templates_diff_ids, staging, batches,
+                              n_compared=n_compared, json_format=json_format, stem=stem):
+        os.replace(path, output / path.name)
+    return mets_diff_ids, templates_diff_ids
+
+
+def watch(batches: List[Path], templates: Dict[str, Source], config: CompareConfig,
+          output: Path, interval: float = DEFAULT_INTERVAL, settle: float = DEFAULT_SETTLE,
+          idle: Optional[float] = None, max_depth: Optional[int] = None,
+          prune: Iterable[str] = (), template_index: Optional[Path] = None,
+          max_workers: Optional[int] = None, log_queue=None, json_format: str = "pretty",
+          streaming: bool = True, fast_path: bool = True, prefetch: Optional[int] = None,
+          backend: str = "process", sleep: Callable[[float], None] = time.sleep,
+          ) -> Tuple[Dict[str, List[Finding]], Set[str], Set[str]]:
+    """Compare METS files as their upload completes, rewriting the reports as it goes.
+
+    Polls every interval seconds. Stops once idle seconds have passed
+    without a new comparison while no file is waiting to become stable, or
+    on Ctrl-C (idle None: only on Ctrl-C); the final reports are written
+    either way. Returns the findings and the completeness sets of the final
+    reports.
+    """
+    watcher = UploadWatcher(batches, settle, max_depth, prune)
+    stem = f"compare_report-{batches[0].name.replace(' ', '_')}-watch"
+    errors: Dict[str, List[Finding]] = collections.OrderedDict()
+    report_keys: Dict[str, str] = {}  # object ID -> key of its findings in errors
+    compared: Set[str] = set()
+    workers = max_workers or _auto_workers(len(templates))
+    logging.info(f"Watching {len(batches)} batch directories every {interval:g}s "
+                 f"(files complete after {settle:g}s without change)")
+
+    # The pool lives for the whole session, so its workers are replaced now
+    # and then (see execution.RecyclingExecutor).
+    with worker_pool(len(templates), workers, log_queue, config, streaming, fast_path,
+                     prefetch=prefetch, recycle_after=workers * RECYCLE_CHUNKS,
+                     backend=backend) as pool:
+        last_change = time.monotonic()
+        try:
+            while True:
+                ready = watcher.poll()
+                removed = (set(report_keys) | compared) - set(watcher.seen)
+                if removed:
+                    logging.info(f"{len(removed)} compared METS files were removed")
+                # Drop earlier results of re-uploaded and of removed files.
+                for object_id in [*ready, *removed]:
+                    errors.pop(report_keys.pop(object_id, None), None)
+                compared.difference_update(removed)
+                if ready:
+                    logging.info(f"{len(ready)} complete METS files to compare "
+                                 f"({watcher.pending - len(ready)} still uploading)")
+                    found = compare_files(ready, templates, config, max_workers=workers,
+                                          template_index=template_index, executor=pool)
+                    for object_id, path in ready.items():
+                        key = report_key(object_id, path)
+                        if key in found:
+                            errors[key] = found[key]
+                            report_keys[object_id] = key
+                    compared.update(object_id for object_id in ready if object_id in templates)
+                    watcher.mark_compared(ready.values())
+                if ready or removed:
+                    _write(output, stem, errors, watcher.seen, templates, batches,
+                           len(compared), json_format)
+                    last_change = time.monotonic()
+                elif (idle is not None and not watcher.pending
+                      and time.monotonic() - last_change >= idle):
+                    logging.info(f"No new METS files for {idle:g}s, stopping")
+                    break
+                sleep(interval)
+        except KeyboardInterrupt:
+            logging.info("Watch interrupted, writing the final reports")
+
+    mets_diff_ids, templates_diff_ids = _write(output, stem, errors, watcher.seen, templates,
+                                               batches, len(compared), json_format)
+    return errors, mets_diff_ids, templates_diff_ids
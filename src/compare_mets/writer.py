@@ -1,6 +1,9 @@
+import gzip
 import html
+import io
 import json
 import logging
+import time
 from collections import OrderedDict
 from dataclasses import asdict
 from datetime import datetime
@@ -8,6 +11,15 @@ from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple
 
 from .findings import Finding
+from .grouping import FindingGroups
+from .procinfo import format_bytes, peak_rss_bytes
+from .spill import SpilledFindings
+from .timings import Timings
+
+# All reports are written incrementally through large buffers.
+WRITE_BUFFER = 1024 * 1024
+
+JSON_FORMATS = ("pretty", "compact", "gzip")
 
 
 def _object_id(report_key: str) -> str:
@@ -25,18 +37,20 @@ def group_findings(errors: Dict[str, List[Finding]]):
     """Bundle identical findings across objects.
 
     Returns an OrderedDict keyed on (section, kind, path); each value is an
-    OrderedDict keyed on (template_value, mets_value) mapping to the list of
-    object IDs in which that exact change occurs.
+    OrderedDict keyed on (template_value, mets_value) mapping to the sorted
+    list of object IDs in which that exact change occurs.
     """
-    groups: "OrderedDict[Tuple[str, str, str], OrderedDict]" = OrderedDict()
+    groups = FindingGroups()
     for report_key, findings in errors.items():
-        oid = _object_id(report_key)
-        for f in findings:
-            occurrences = groups.setdefault((f.section, f.kind, f.path), OrderedDict())
-            ids = occurrences.setdefault((f.template_value, f.mets_value), [])
-            if oid not in ids:
-                ids.append(oid)
-    return groups
+        groups.add(_object_id(report_key), findings)
+    return groups.finalise()
+
+
+def total_findings(errors) -> int:
+    """Count all findings; a spill file keeps the count, so it is not read again."""
+    if isinstance(errors, SpilledFindings):
+        return errors.total_findings
+    return sum(len(findings) for findings in errors.values())
 
 
 def _group_object_count(occurrences) -> int:
@@ -50,38 +64,85 @@ def write_reports(
     output: Path,
     batch_paths: List[Path],
     n_compared: Optional[int] = None,
+    cache_stats: Optional[Dict[str, int]] = None,
+    json_format: str = "pretty",
+    groups: Optional[FindingGroups] = None,
+    timings: Optional[Timings] = None,
+    stem: Optional[str] = None,
 ) -> Tuple[Path, Path, Path]:
-    """Write a Markdown report, a JSON file and an interactive HTML report."""
+    """Write a Markdown report, a JSON file and an interactive HTML report.
+
+    errors may be a SpilledFindings file instead of a dict: grouping and
+    each writer then make one streaming pass over it. All three reports are
+    written incrementally, so no writer keeps a full copy of its report.
+
+    cache_stats ({"hits": n, "misses": n}) is included in the summary when
+    the run used the result cache. json_format is "pretty" (indented),
+    "compact" (no whitespace) or "gzip" (compact, as .json.gz). groups are
+    the findings already grouped during the comparison (see compare_files);
+    without them the findings are grouped here. timings, if given, receives
+    the time of each writer and is included as a timings block in the JSON
+    report, which is therefore written last (its own time is not in it).
+    stem replaces the default file name, compare_report-<batch>-<timestamp>,
+    so that repeated calls overwrite the same reports.
+    """
     output.mkdir(parents=True, exist_ok=True)
     batch_id = batch_paths[0].name.replace(" ", "_")
     dt = datetime.now()
-    stem = f"compare_report-{batch_id}-{dt.strftime('%Y%m%d_%H%M%S')}"
+    stem = stem or f"compare_report-{batch_id}-{dt.strftime('%Y%m%d_%H%M%S')}"
     md_path = output / f"{stem}.md"
-    json_path = output / f"{stem}.json"
+    json_path = output / (f"{stem}.json.gz" if json_format == "gzip" else f"{stem}.json")
     html_path = output / f"{stem}.html"
 
-    total_findings = sum(len(findings) for findings in errors.values())
-    groups = group_findings(errors)
+    start = time.perf_counter()
+    n_findings = total_findings(errors)
+    groups = groups.finalise() if groups is not None else group_findings(errors)
 
     logging.info(
         f"Generating report for batch {batch_id} "
-        f"(objects with findings: {len(errors)}, total findings: {total_findings})"
+        f"(objects with findings: {len(errors)}, total findings: {n_findings})"
     )
 
-    _write_markdown(md_path, errors, mets_diff_ids, templates_diff_ids,
-                    batch_id, dt, total_findings, n_compared)
-    _write_json(json_path, errors, groups, mets_diff_ids, templates_diff_ids,
-                batch_paths, batch_id, dt, total_findings, n_compared)
-    _write_html(html_path, errors, groups, mets_diff_ids, templates_diff_ids,
-                batch_id, dt, total_findings, n_compared)
+    if timings is not None:
+        timings.add_phase("grouping", time.perf_counter() - start)
+    _timed(timings, "write_markdown", md_path, _write_markdown, md_path, errors,
+           mets_diff_ids, templates_diff_ids, batch_id, dt, n_findings, n_compared,
+           cache_stats)
+    _timed(timings, "write_html", html_path, _write_html, html_path, errors, groups,
+           mets_diff_ids, templates_diff_ids, batch_id, dt, n_findings, n_compared,
+           cache_stats)
+    _timed(timings, "write_json", json_path, _write_json, json_path, errors, groups,
+           mets_diff_ids, templates_diff_ids, batch_paths, batch_id, dt, n_findings,
+           n_compared, cache_stats, json_format,
+           timings.to_json() if timings is not None else None)
 
     logging.info(f"Saved reports for batch {batch_id} to {md_path}, {json_path} and {html_path}")
     return md_path, json_path, html_path
 
 
+def _timed(timings: Optional[Timings], phase: str, path: Path, write, *args) -> None:
+    """Run one writer and log its size, throughput and the peak memory so far."""
+    start = time.perf_counter()
+    write(*args)
+    elapsed = time.perf_counter() - start
+    if timings is not None:
+        timings.add_phase(phase, elapsed)
+    size = path.stat().st_size
+    rate = size / (1024 * 1024) / elapsed if elapsed > 0 else float("inf")
+    logging.info(f"Wrote {path.name}: {format_bytes(size)} in {elapsed:.2f}s "
+                 f"({rate:.1f} MB/s), peak RSS {format_bytes(peak_rss_bytes())}")
+
+
+def _open_text(path: Path, compress: bool = False):
+    if compress:
+        raw = io.BufferedWriter(gzip.GzipFile(path, "wb"), WRITE_BUFFER)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return path.open("w", encoding="utf-8", buffering=WRITE_BUFFER)
+
+
 def _write_markdown(md_path, errors, mets_diff_ids, templates_diff_ids,
-                    batch_id, dt, total_findings, n_compared) -> None:
-    with md_path.open("w", encoding="utf-8") as f:
+                    batch_id, dt, total_findings, n_compared, cache_stats) -> None:
+    with _open_text(md_path) as f:
         f.write(f"# Compare METS with Templates - {batch_id}\n\n")
         f.write(f"_report generated {dt.strftime('%Y-%m-%d %H:%M:%S')}_\n\n")
 
@@ -91,7 +152,11 @@ def _write_markdown(md_path, errors, mets_diff_ids, templates_diff_ids,
         f.write(f"- Objects with findings: {len(errors)}\n")
         f.write(f"- Total findings: {total_findings}\n")
         f.write(f"- Delivered METS without template: {len(mets_diff_ids)}\n")
-        f.write(f"- Templates not returned in delivery: {len(templates_diff_ids)}\n\n")
+        f.write(f"- Templates not returned in delivery: {len(templates_diff_ids)}\n")
+        if cache_stats is not None:
+            f.write(f"- Result cache: {cache_stats['hits']} hits, "
+                    f"{cache_stats['misses']} misses\n")
+        f.write("\n")
 
         f.write("## Findings\n")
         if errors:
@@ -119,9 +184,44 @@ def _write_markdown(md_path, errors, mets_diff_ids, templates_diff_ids,
             f.write("All object IDs match between templates and delivered METS.\n")
 
 
+class _JsonStyle:
+    """Render JSON fragments either like json.dump(indent=2) or compact."""
+
+    def __init__(self, compact: bool):
+        self.compact = compact
+        self.nl = "" if compact else "\n"
+        self.colon = ":" if compact else ": "
+
+    def pad(self, depth: int) -> str:
+        return "" if self.compact else "  " * depth
+
+    def dumps(self, value, depth: int) -> str:
+        """Render value as it appears nested `depth` levels deep."""
+        if self.compact:
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        text = json.dumps(value, ensure_ascii=False, indent=2)
+        return text.replace("\n", "\n" + self.pad(depth))
+
+    def member(self, key: str, value, depth: int) -> str:
+        return f"{json.dumps(key, ensure_ascii=False)}{self.colon}{self.dumps(value, depth)}"
+
+    def container(self, f, opener: str, closer: str, entries, depth: int) -> None:
+        """Write a list/object whose rendered entries come from an iterator."""
+        f.write(opener)
+        separator = ""
+        for entry in entries:
+            f.write(f"{separator}{self.nl}{self.pad(depth + 1)}{entry}")
+            separator = ","
+        if separator:
+            f.write(f"{self.nl}{self.pad(depth)}")
+        f.write(closer)
+
+
 def _write_json(json_path, errors, groups, mets_diff_ids, templates_diff_ids,
-                batch_paths, batch_id, dt, total_findings, n_compared) -> None:
-    report_data = {
+                batch_paths, batch_id, dt, total_findings, n_compared, cache_stats,
+                json_format="pretty", timings=None) -> None:
+    """Write the JSON report; groups and per-object findings are streamed entry by entry."""
+    head = {
         "generated": dt.isoformat(timespec="seconds"),
         "batch_id": batch_id,
         "batches": [str(p) for p in batch_paths],
@@ -131,36 +231,47 @@ def _write_json(json_path, errors, groups, mets_diff_ids, templates_diff_ids,
             "total_findings": total_findings,
             "mets_without_template": len(mets_diff_ids),
             "templates_not_returned": len(templates_diff_ids),
-        },
-        "grouped": [
-            {
-                "section": section,
-                "kind": kind,
-                "path": path,
-                "object_count": _group_object_count(occurrences),
-                "occurrences": [
-                    {
-                        "template_value": template_value,
-                        "mets_value": mets_value,
-                        "object_ids": ids,
-                    }
-                    for (template_value, mets_value), ids in occurrences.items()
-                ],
-            }
-            for (section, kind, path), occurrences in groups.items()
-        ],
-        "objects": {
-            key: [asdict(finding) | {"description": finding.describe()}
-                  for finding in findings]
-            for key, findings in errors.items()
-        },
-        "ids": {
-            "mets_without_template": sorted(mets_diff_ids),
-            "templates_not_returned": sorted(templates_diff_ids),
+            "cache": cache_stats,
         },
     }
-    with json_path.open("w", encoding="utf-8") as f:
-        json.dump(report_data, f, ensure_ascii=False, indent=2)
+    if timings is not None:
+        head["timings"] = timings
+    grouped = (
+        {
+            "section": section,
+            "kind": kind,
+            "path": path,
+            "object_count": _group_object_count(occurrences),
+            "occurrences": [
+                {
+                    "template_value": template_value,
+                    "mets_value": mets_value,
+                    "object_ids": ids,
+                }
+                for (template_value, mets_value), ids in occurrences.items()
+            ],
+        }
+        for (section, kind, path), occurrences in groups.items()
+    )
+    objects = (
+        (key, [asdict(finding) | {"description": finding.describe()}
+               for finding in findings])
+        for key, findings in errors.items()
+    )
+    ids = {
+        "mets_without_template": sorted(mets_diff_ids),
+        "templates_not_returned": sorted(templates_diff_ids),
+    }
+    js = _JsonStyle(compact=json_format != "pretty")
+    with _open_text(json_path, compress=json_format == "gzip") as f:
+        f.write("{")
+        for key, value in head.items():
+            f.write(f"{js.nl}{js.pad(1)}{js.member(key, value, 1)},")
+        f.write(f'{js.nl}{js.pad(1)}"grouped"{js.colon}')
+        js.container(f, "[", "]", (js.dumps(group, 2) for group in grouped), 1)
+        f.write(f',{js.nl}{js.pad(1)}"objects"{js.colon}')
+        js.container(f, "{", "}", (js.member(key, value, 2) for key, value in objects), 1)
+        f.write(f",{js.nl}{js.pad(1)}{js.member('ids', ids, 1)}{js.nl}}}")
 
 
 _HTML_STYLE = """
@@ -216,9 +327,15 @@ def _finding_html(f: Finding) -> str:
 
 
 def _write_html(html_path, errors, groups, mets_diff_ids, templates_diff_ids,
-                batch_id, dt, total_findings, n_compared) -> None:
-    out = []
-    w = out.append
+                batch_id, dt, total_findings, n_compared, cache_stats) -> None:
+    with _open_text(html_path) as f:
+        _write_html_body(lambda fragment: f.write(fragment + "\n"), errors, groups,
+                         mets_diff_ids, templates_diff_ids, batch_id, dt,
+                         total_findings, n_compared, cache_stats)
+
+
+def _write_html_body(w, errors, groups, mets_diff_ids, templates_diff_ids,
+                     batch_id, dt, total_findings, n_compared, cache_stats) -> None:
     w("<!DOCTYPE html><html lang='en'><head><meta charset='utf-8'>")
     w(f"<title>compare_mets - {html.escape(batch_id)}</title>")
     w(f"<style>{_HTML_STYLE}</style></head><body>")
@@ -239,6 +356,10 @@ def _write_html(html_path, errors, groups, mets_diff_ids, templates_diff_ids,
     warn_ids = " warn" if (mets_diff_ids or templates_diff_ids) else ""
     w(f"<div class='card{warn_ids}'><span class='num'>{len(templates_diff_ids)}</span>"
       f"<span class='lbl'>templates not returned</span></div>")
+    if cache_stats is not None:
+        w(f"<div class='card'><span class='num'>{cache_stats['hits']} / "
+          f"{cache_stats['hits'] + cache_stats['misses']}</span>"
+          f"<span class='lbl'>served from result cache</span></div>")
     w("</div>")
 
     w("<h2>Findings, bundled per change</h2>")
@@ -290,4 +411,3 @@ def _write_html(html_path, errors, groups, mets_diff_ids, templates_diff_ids,
             w("</ul></details>")
 
     w("</body></html>")
-    html_path.write_text("\n".join(out), encoding="utf-8")
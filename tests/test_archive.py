@@ -0,0 +1,127 @@
+"""Tests for comparing METS files inside zip and tar archives."""
+import gzip
+import tarfile
+import zipfile
+
+from compare_mets.archive import ArchivePath, is_archive, list_members, open_member, read_member
+from compare_mets.compare import compare_files, compare_one
+from compare_mets.config import default_config
+from compare_mets.parser import discover, get_mets, get_templates
+from compare_mets.prefetch import read_file
+from compare_mets.result_cache import file_digest
+from compare_mets.template_index import TemplateIndex, default_index_path
+
+from test_compare import build_doc, write_templates
+
+CONFIG = default_config()
+OBJECT_IDS = [f"OBJ{i}" for i in range(6)]  # of make_members()
+
+
+def make_members(n=6):
+    """(name, bytes) of METS members; every third one has a changed ppn."""
+    members = []
+    for i in range(n):
+        doc = build_doc(ppn="changed" if i % 3 == 0 else "123456789").encode("utf-8")
+        name = f"BATCH1/OBJ{i}/OBJ{i}_mets.xml"
+        if i % 2:
+            name, doc = name + ".gz", gzip.compress(doc)
+        members.append((name, doc))
+    return members
+
+
+def make_zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression) as zf:
+        zf.writestr("BATCH1/readme.txt", "not a METS file")
+        for name, data in members:
+            zf.writestr(name, data)
+    return path
+
+
+def make_tar(path, members):
+    with tarfile.open(path, "w") as tf:
+        for name, data in members:
+            path_in = path.parent / "member.tmp"
+            path_in.write_bytes(data)
+            tf.add(path_in, arcname=name)
+    return path
+
+
+def test_list_members_selects_mets_and_gzipped_mets(tmp_path):
+    archive = make_zip(tmp_path / "batch.zip", make_members())
+    members = list_members(archive, "_mets.xml")
+    assert [m.stem for m in members] == [f"OBJ{i}_mets" for i in range(6)]
+    assert members[1].name == "OBJ1_mets.xml.gz"
+    assert list_members(archive, "_mets.xml", prune=["OBJ1"])[1].stem == "OBJ2_mets"
+    assert list_members(archive, "_mets.xml", max_depth=1) == []
+    assert is_archive(archive) and not is_archive(tmp_path)
+
+
+def test_members_are_read_at_their_offset(tmp_path):
+    members = make_members()
+    expected = [gzip.decompress(data) if name.endswith(".gz") else data
+                for name, data in members]
+    for archive in (make_zip(tmp_path / "deflated.zip", members),
+                    make_zip(tmp_path / "stored.zip", members, zipfile.ZIP_STORED),
+                    make_zip(tmp_path / "bzip2.zip", members, zipfile.ZIP_BZIP2),
+                    make_tar(tmp_path / "batch.tar", members)):
+        found = list_members(archive, "_mets.xml")
+        assert [read_member(m) for m in found] == expected, archive
+        with open_member(found[0]) as stream:
+            assert stream.read(5) == expected[0][:5]
+        assert read_file(found[1]) == expected[1]
+
+
+def test_discover_accepts_archives_as_batches_and_templates(tmp_path):
+    archive = make_tar(tmp_path / "batch.tar", make_members())
+    templates = write_templates(tmp_path, OBJECT_IDS)
+    with zipfile.ZipFile(tmp_path / "templates.zip", "w") as zf:
+        for path in templates.iterdir():
+            zf.write(path, arcname=f"templates/{path.name}")
+    mets, from_dir = discover([archive], templates)
+    assert sorted(mets) == [f"OBJ{i}" for i in range(6)]
+    assert all(isinstance(path, ArchivePath) for path in mets.values())
+    from_zip = get_templates(tmp_path / "templates.zip")
+    assert sorted(from_zip) == sorted(from_dir)
+    assert get_mets([tmp_path / "missing.zip"]) == {}
+
+
+def test_compare_from_archive_matches_extracted_batch(tmp_path):
+    members = make_members()
+    templates = get_templates(write_templates(tmp_path, OBJECT_IDS))
+    extracted = tmp_path / "extracted"
+    for name, data in members:
+        path = extracted / name.removesuffix(".gz")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(gzip.decompress(data) if name.endswith(".gz") else data)
+    expected = compare_files(get_mets([extracted / "BATCH1"]), templates, CONFIG,
+                             max_workers=2)
+    assert len(expected) == 2
+    for archive in (make_zip(tmp_path / "BATCH1.zip", members),
+                    make_tar(tmp_path / "BATCH1.tar", members)):
+        mets = get_mets([archive])
+        errors = compare_files(mets, templates, CONFIG, max_workers=2,
+                               prefetch=1024 * 1024)
+        assert sorted(errors.values()) == sorted(expected.values())
+        assert sorted(key.split(" - ")[0] for key in errors) == ["OBJ0", "OBJ3"]
+
+
+def test_corrupt_member_is_reported_as_parse_error(tmp_path):
+    archive = make_zip(tmp_path / "batch.zip", make_members(1))
+    member = list_members(archive, "_mets.xml")[0]
+    data = bytearray(archive.read_bytes())
+    data[member.offset + 40:member.offset + 80] = b"\xff" * 40
+    archive.write_bytes(bytes(data))
+    template = write_templates(tmp_path, ["OBJ0"]) / "OBJ0_mets_template.xml"
+    _, findings = compare_one("OBJ0", member, template, CONFIG)
+    assert [f.kind for f in findings] == ["parse-error"]
+    assert findings[0].path == "OBJ0_mets.xml"
+
+
+def test_template_index_and_cache_keys_for_members(tmp_path):
+    archive = make_zip(tmp_path / "templates.zip", [
+        (f"OBJ{i}_mets_template.xml", build_doc().encode("utf-8")) for i in range(2)])
+    templates = get_templates(archive)
+    assert default_index_path(archive) == tmp_path / "templates.zip.compare_mets_index.sqlite"
+    with TemplateIndex(tmp_path / "index.sqlite", "config") as index:
+        assert sorted(index.stale_ids(templates)) == ["OBJ0", "OBJ1"]
+    assert file_digest(templates["OBJ0"]) == file_digest(templates["OBJ1"])
@@ -4,6 +4,7 @@ Fixtures are minimal METS documents with the same section IDs the KB
 templates use (DMD1, TMD00001, SMD1/SMD2, DPMD1/DPMD2).
 """
 from pathlib import Path
+from typing import Iterable
 
 import pytest
 
@@ -96,6 +97,33 @@ def build_doc(**overrides) -> str:
     return METS_DOC.format(**values, digiprov1=digiprov1, digiprov2=digiprov2)
 
 
+def write_pairs(tmp_path: Path, n: int, changed: Iterable[int] = ()):
+    """METS files OBJ0..OBJ{n-1} in tmp_path/batch, all against one shared
+    template; those with an index in changed have another ppn.
+    Returns the (mets, templates) maps."""
+    changed = set(changed)
+    template_path = tmp_path / "OBJ_mets_template.xml"
+    template_path.write_text(build_doc(), encoding="utf-8")
+    mets, templates = {}, {}
+    for i in range(n):
+        path = tmp_path / "batch" / f"OBJ{i}_mets.xml"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(build_doc(ppn="changed") if i in changed else build_doc(),
+                        encoding="utf-8")
+        mets[f"OBJ{i}"], templates[f"OBJ{i}"] = path, template_path
+    return mets, templates
+
+
+def write_templates(tmp_path: Path, ids: Iterable[str]) -> Path:
+    """A template directory tmp_path/templates with a template per object ID."""
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    for object_id in ids:
+        (templates / f"{object_id}_mets_template.xml").write_text(build_doc(),
+                                                                 encoding="utf-8")
+    return templates
+
+
 def run_compare(tmp_path: Path, template_xml: str, mets_xml: str):
     template_path = tmp_path / "OBJ1_mets_template.xml"
     mets_path = tmp_path / "batch" / "sub" / "OBJ1" / "OBJ1_mets.xml"
@@ -223,3 +251,33 @@ def test_auto_workers_leaves_headroom(monkeypatch):
     assert compare_mod._auto_workers(0) == 1      # minimaal 1
     monkeypatch.setattr(compare_mod.multiprocessing, "cpu_count", lambda: 256)
     assert compare_mod._auto_workers(1000) == 61  # Windows wait-handle limiet
+
+
+def test_chunk_sizer_adapts_to_file_duration():
+    from compare_mets.compare import _ChunkSizer
+    sizer = _ChunkSizer(workers=4, target=0.5, max_size=256)
+    assert sizer.next_size(10_000) == 1             # nothing measured yet
+    sizer.observe(1, 0.01)                          # fast files: bigger chunks
+    assert sizer.next_size(10_000) == 50
+    assert sizer.next_size(40) == 2                 # fair share of the tail
+    sizer.observe(10, 20.0)                         # slow files: back to small chunks
+    assert sizer.next_size(10_000) == 1
+
+
+def test_compare_files_chunks_cover_all_ids(tmp_path):
+    from compare_mets.compare import compare_files
+    mets, templates = write_pairs(tmp_path, 40, changed=range(0, 40, 3))
+    errors = compare_files(mets, templates, CONFIG, max_workers=2)
+    assert sorted(key.split(" - ")[0] for key in errors) == sorted(
+        f"OBJ{i}" for i in range(0, 40, 3))
+
+
+def test_compare_files_groups_findings_in_workers(tmp_path):
+    from compare_mets.compare import compare_files
+    from compare_mets.grouping import FindingGroups
+    from compare_mets.writer import group_findings
+    mets, templates = write_pairs(tmp_path, 12, changed=range(12))
+    groups = FindingGroups()
+    errors = compare_files(mets, templates, CONFIG, max_workers=2, groups=groups)
+    assert len(groups) == 1
+    assert groups.finalise() == group_findings(errors)
@@ -0,0 +1,103 @@
+"""Tests for the execution policy: in-process runs, pool sizing and worker recycling."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from compare_mets.cli import parse_args
+from compare_mets.compare import compare_files, worker_pool
+from compare_mets.config import default_config
+from compare_mets.execution import (MB, RECYCLE_CHUNKS, WORKER_BASE_BYTES, MemoryLimit,
+                                    RecyclingExecutor, choose_strategy, sample_sizes)
+from compare_mets.grouping import FindingGroups
+from compare_mets.timings import Timings
+
+from test_partial import make_delivery
+
+CONFIG = default_config()
+
+
+def canonical(groups):
+    return {key: {value: sorted(ids) for value, ids in values.items()}
+            for key, values in groups.finalise().items()}
+
+
+def test_small_runs_are_compared_in_the_main_process():
+    assert choose_strategy(20, [50_000] * 20, cpu_workers=8).inline
+    assert choose_strategy(500, [50_000] * 64, cpu_workers=8, max_workers=0).inline
+    assert not choose_strategy(20, [50_000] * 20, cpu_workers=8, max_workers=2).inline
+    assert not choose_strategy(20, [5 * MB] * 20, cpu_workers=8).inline  # 100 MB of METS
+    strategy = choose_strategy(500, [50_000] * 64, cpu_workers=8, max_memory=10_000 * MB)
+    assert (strategy.workers, strategy.reason, strategy.recycle_after) == (
+        8, "half the cores", None)
+
+
+def test_pool_is_sized_on_memory_and_recycled_on_large_files():
+    sizes = [1 * MB] * 63 + [100 * MB]
+    streaming = choose_strategy(500, sizes, cpu_workers=8, max_memory=2000 * MB)
+    assert streaming.worker_bytes == WORKER_BASE_BYTES + 400 * MB
+    assert (streaming.workers, streaming.reason) == (4, "limited by memory")
+    assert streaming.recycle_after == 4 * RECYCLE_CHUNKS
+    full = choose_strategy(500, sizes, cpu_workers=8, max_memory=2000 * MB, streaming=False)
+    assert full.workers == 1
+    explicit = choose_strategy(500, sizes, cpu_workers=8, max_workers=6, max_memory=2000 * MB)
+    assert (explicit.workers, explicit.reason) == (6, "--workers")
+
+
+def test_memory_limit_lowers_concurrency_from_observed_rss():
+    limit = MemoryLimit(1000 * MB, workers=8)
+    assert limit.max_running == 8
+    limit.observe(None)
+    limit.observe(100 * MB)
+    assert limit.max_running == 8
+    limit.observe(300 * MB)
+    limit.observe(200 * MB)
+    assert limit.max_running == 3
+    assert MemoryLimit(None, workers=8).max_running == 8
+
+
+def test_recycling_executor_replaces_its_pool():
+    with RecyclingExecutor(lambda: ThreadPoolExecutor(2), recycle_after=3) as executor:
+        futures = [executor.submit(pow, i, 2) for i in range(10)]
+        assert [f.result() for f in futures] == [i * i for i in range(10)]
+        assert executor.generations == 4
+
+
+def test_inline_pool_and_recycled_pool_give_the_same_findings(tmp_path):
+    mets, templates = make_delivery(tmp_path, 12)
+    assert len(sample_sizes(list(mets.values()), 4)) == 4
+    pooled = compare_files(mets, templates, CONFIG, max_workers=2)
+    assert len(pooled) == 3
+    assert dict(compare_files(mets, templates, CONFIG)) == dict(pooled)   # small: inline
+    with worker_pool(12, 2, None, CONFIG, recycle_after=2) as executor:
+        recycled = compare_files(mets, templates, CONFIG, max_workers=2, executor=executor)
+        assert executor.generations > 1
+    assert dict(recycled) == dict(pooled)
+
+
+def test_thread_backend_matches_process_backend(tmp_path):
+    mets, templates = make_delivery(tmp_path, 40)
+    expected_groups = FindingGroups()
+    expected = compare_files(mets, templates, CONFIG, max_workers=2, groups=expected_groups)
+    for prefetch in (None, 1024 * 1024):
+        groups, timings = FindingGroups(), Timings()
+        errors = compare_files(mets, templates, CONFIG, max_workers=3, backend="thread",
+                               groups=groups, timings=timings, prefetch=prefetch)
+        assert dict(errors) == dict(expected)
+        assert canonical(groups) == canonical(expected_groups)
+        assert timings.counters["files"] == 40
+    strategy = choose_strategy(500, [1 * MB] * 64, cpu_workers=8, max_memory=100 * MB,
+                               backend="thread")
+    assert (strategy.workers, strategy.worker_bytes) == (8, 4 * MB)
+
+
+def test_profiling_is_rejected_with_the_thread_backend(tmp_path, capsys):
+    mets, templates = make_delivery(tmp_path, 4)
+    with pytest.raises(ValueError, match="thread backend"):
+        compare_files(mets, templates, CONFIG, backend="thread", profile=tmp_path / "run.prof")
+    with pytest.raises(ValueError, match="thread backend"):
+        worker_pool(4, 2, None, CONFIG, profile=True, backend="thread")
+    with pytest.raises(SystemExit) as exit_info:
+        parse_args(["templates", "batch", "--profile", "run.prof", "--backend", "thread"])
+    assert exit_info.value.code == 2
+    assert "--profile cannot be combined with --backend thread" in capsys.readouterr().err
+    assert parse_args(["templates", "batch", "--profile", "run.prof"]).backend == "process"
@@ -0,0 +1,35 @@
+"""Tests for the compact Finding representation."""
+import pickle
+
+from compare_mets.findings import (Finding, StringPool, StringTable, decode_findings,
+                                   encode_findings)
+
+
+def systemic(i):
+    # Strings rebuilt per object, like a worker builds them.
+    path = "/".join(["mets:digiprovMD[DPMD2]", "premis:agent", "premis:agentName"])
+    return [Finding("mets:" + "digiprovMD", "te" + "xt", path, "Karmac", f"Ander{i % 2}"),
+            Finding("(file)", "parse-error", f"OBJ{i}_mets.xml", None, "boom")]
+
+
+def test_findings_are_slotted_and_picklable():
+    f = systemic(0)[0]
+    assert not hasattr(f, "__dict__")
+    assert pickle.loads(pickle.dumps(f)) == f
+
+
+def test_encoded_chunk_round_trips_with_shared_strings():
+    pool = StringPool()
+    decoded = []
+    for chunk in ([0, 1, 2], [3, 4]):
+        table = StringTable()
+        rows = [encode_findings(systemic(i), table) for i in chunk]
+        assert len(table.strings) == 9 + len(chunk)  # shared strings once per chunk
+        shared = pool.resolve(table.strings)
+        decoded.extend(decode_findings(r, shared) for r in rows)
+
+    assert decoded == [systemic(i) for i in range(5)]
+    first, last = decoded[0][0], decoded[-1][0]
+    assert first.path is last.path and first.section is last.section
+    assert decoded[1][0].mets_value is decoded[3][0].mets_value
+    assert pool.share(systemic(9))[0].path is first.path
@@ -0,0 +1,54 @@
+"""Tests for the live metrics file."""
+import json
+
+from compare_mets.compare import compare_files
+from compare_mets.config import default_config
+from compare_mets.metrics import MetricsWriter
+
+from test_compare import write_pairs
+
+CONFIG = default_config()
+
+
+def test_compare_files_writes_final_json_metrics(tmp_path):
+    mets, templates = write_pairs(tmp_path, 8, changed=range(2))
+    metrics = MetricsWriter(tmp_path / "out" / "metrics.json", interval=0)
+    compare_files(mets, templates, CONFIG, max_workers=2, metrics=metrics)
+    data = json.loads((tmp_path / "out" / "metrics.json").read_text(encoding="utf-8"))
+    assert data["running"] is False
+    assert data["files_total"] == data["files_done"] == 8
+    assert data["objects_with_findings"] == 2
+    assert data["findings"] == 2
+    assert data["in_flight_chunks"] == 0
+    assert data["worker_rss_bytes"]
+    assert not (tmp_path / "out" / "metrics.json.tmp").exists()
+
+
+def test_prometheus_textfile_format(tmp_path):
+    metrics = MetricsWriter(tmp_path / "run.prom")
+    metrics.start(100_000)
+    metrics.add_results(10, 1, 3)
+    metrics.set_worker_rss(42, 1024)
+    metrics.write()
+    lines = (tmp_path / "run.prom").read_text(encoding="utf-8").splitlines()
+    assert "compare_mets_files_total 100000" in lines
+    assert "compare_mets_findings 3" in lines
+    assert "compare_mets_running 1" in lines
+    assert 'compare_mets_worker_rss_bytes{pid="42"} 1024' in lines
+    assert "# TYPE compare_mets_files_done gauge" in lines
+
+
+def test_workers_that_stopped_reporting_are_dropped(tmp_path):
+    metrics = MetricsWriter(tmp_path / "metrics.json", interval=10)
+    metrics.start(100)
+    metrics.set_worker_rss(41, 1024)
+    metrics.set_worker_rss(42, 2048)
+    # Worker 41 was recycled; a minute without progress drops nobody.
+    metrics.last_progress -= 60
+    metrics._rss_reported[41] -= 60
+    metrics._rss_reported[42] -= 40
+    assert metrics.snapshot()["worker_rss_bytes"] == {"41": 1024, "42": 2048}
+    # The others report again, and 41 falls behind by more than three intervals.
+    metrics.add_results(10, 0, 0)
+    metrics.set_worker_rss(42, 3072)
+    assert metrics.snapshot()["worker_rss_bytes"] == {"42": 3072}
@@ -0,0 +1,72 @@
+"""Tests for METS and template discovery."""
+from compare_mets.parser import discover, get_mets, get_templates
+
+
+def touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("<x/>", encoding="utf-8")
+    return path
+
+
+def make_tree(tmp_path):
+    batch = tmp_path / "batch"
+    a = touch(batch / "sub" / "A" / "A_mets.xml")
+    b = touch(batch / "sub" / "B" / "B_mets.xml")
+    touch(batch / "sub" / "A" / "images" / "deep" / "C_mets.xml")
+    touch(batch / "sub" / "A" / "A_0001.jp2")
+    tpl = touch(tmp_path / "templates" / "A_mets_template.xml")
+    return batch, a, b, tpl
+
+
+def test_get_mets_and_templates_find_all_files(tmp_path):
+    batch, a, b, tpl = make_tree(tmp_path)
+    mets = get_mets([batch])
+    assert sorted(mets) == ["A", "B", "C"]
+    assert mets["A"] == a and mets["B"] == b
+    assert get_templates(tmp_path / "templates") == {"A": tpl}
+
+
+def test_prune_and_max_depth_skip_subtrees(tmp_path):
+    batch, *_ = make_tree(tmp_path)
+    assert sorted(get_mets([batch], prune=["images"])) == ["A", "B"]
+    assert sorted(get_mets([batch], max_depth=2)) == ["A", "B"]
+    assert get_mets([batch], max_depth=1) == {}
+
+
+def test_discover_walks_batches_and_templates_together(tmp_path):
+    batch, a, b, tpl = make_tree(tmp_path)
+    other = tmp_path / "batch2"
+    b2 = touch(other / "x" / "B" / "B_mets.xml")
+    mets, templates = discover([batch, other], tmp_path / "templates")
+    assert mets["B"] == b2          # later batch wins, as before
+    assert templates == {"A": tpl}
+
+
+def test_manifest_only_relists_changed_directories(tmp_path, monkeypatch):
+    from compare_mets import parser as parser_mod
+
+    batch, *_ = make_tree(tmp_path)
+    manifest_path = tmp_path / "manifest.json"
+    # Treat every listing as old enough to be trusted on the next run.
+    monkeypatch.setattr(parser_mod, "MTIME_GRACE_NS", -10**18)
+
+    manifest = parser_mod.Manifest(manifest_path)
+    assert sorted(get_mets([batch], manifest=manifest)) == ["A", "B", "C"]
+    manifest.save()
+    n_dirs = manifest.misses
+
+    listed = []
+    real_scan = parser_mod._scan
+    monkeypatch.setattr(parser_mod, "_scan", lambda p: listed.append(p) or real_scan(p))
+    touch(batch / "sub" / "D" / "D_mets.xml")
+
+    manifest = parser_mod.Manifest(manifest_path)
+    assert sorted(get_mets([batch], manifest=manifest)) == ["A", "B", "C", "D"]
+    assert sorted(listed) == [str(batch / "sub"), str(batch / "sub" / "D")]
+    assert manifest.hits == n_dirs - 1
+
+    listed.clear()
+    assert sorted(get_mets([batch], manifest=parser_mod.Manifest(manifest_path,
+                                                                 rescan=True))) == [
+        "A", "B", "C", "D"]
+    assert len(listed) == n_dirs + 1
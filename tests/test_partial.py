@@ -0,0 +1,83 @@
+"""Tests for sharded runs and merging their partial results."""
+import pytest
+
+from compare_mets.compare import compare_files, different_ids
+from compare_mets.config import config_digest, default_config
+from compare_mets.partial import (PartialError, merge_partials, parse_shard, select_shard,
+                                  shard_of, write_partial)
+from compare_mets.timings import Timings
+from compare_mets.writer import group_findings, total_findings
+
+from test_compare import write_pairs
+
+CONFIG = default_config()
+
+
+def make_delivery(tmp_path, n=30):
+    """Pairs with findings in every fourth object, plus unmatched IDs on both sides."""
+    mets, templates = write_pairs(tmp_path, n, changed=range(0, n, 4))
+    for i in range(5):
+        templates[f"GONE{i}"] = templates["OBJ0"]
+        mets[f"EXTRA{i}"] = mets["OBJ1"]
+    return mets, templates
+
+
+def run_shard(tmp_path, mets, templates, shard, digest=None):
+    mets, templates = select_shard(mets, shard), select_shard(templates, shard)
+    timings = Timings()
+    errors = compare_files(mets, templates, CONFIG, max_workers=1, timings=timings)
+    mets_only, templates_only = different_ids(mets, templates)
+    path = tmp_path / "partials" / f"part-{shard[0]}of{shard[1]}.jsonl.gz"
+    return write_partial(path, errors, mets_only, templates_only, [tmp_path / "batch"],
+                         shard, digest or config_digest(CONFIG),
+                         len(set(mets) & set(templates)), {"hits": 1, "misses": 2}, timings)
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for text in ("0/4", "5/4", "2", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+
+def test_shards_split_ids_without_overlap():
+    ids = {f"MMKB{i:08d}": i for i in range(1000)}
+    shards = [select_shard(ids, (i, 4)) for i in range(1, 5)]
+    assert sum(len(s) for s in shards) == len(ids)
+    assert set().union(*shards) == set(ids)
+    assert all(150 < len(s) < 350 for s in shards)
+    assert shard_of("MMKB00000001", 4) == shard_of("MMKB00000001", 4)
+
+
+def test_merged_shards_match_single_run(tmp_path):
+    mets, templates = make_delivery(tmp_path)
+    errors = compare_files(mets, templates, CONFIG, max_workers=1)
+    mets_only, templates_only = different_ids(mets, templates)
+
+    paths = [run_shard(tmp_path, mets, templates, (i, 3)) for i in (3, 1, 2)]
+    for spill in (None, tmp_path / "spill.jsonl.gz"):
+        run = merge_partials(paths, spill)
+        assert dict(run.errors.items()) == dict(errors)
+        assert total_findings(run.errors) == total_findings(errors)
+        assert group_findings(run.errors) == group_findings(errors)
+        assert run.mets_diff_ids == mets_only
+        assert run.templates_diff_ids == templates_only
+        assert run.n_compared == len(set(mets) & set(templates))
+        assert run.cache_stats == {"hits": 3, "misses": 6}
+        assert run.timings.counters["files"] == run.n_compared
+        assert run.batch_paths == [tmp_path / "batch"]
+
+
+def test_merge_rejects_incomplete_or_mixed_shards(tmp_path):
+    mets, templates = make_delivery(tmp_path, 8)
+    one, two = (run_shard(tmp_path, mets, templates, (i, 2)) for i in (1, 2))
+    with pytest.raises(PartialError, match="Missing shards of 2: 2"):
+        merge_partials([one])
+    with pytest.raises(PartialError, match="given twice"):
+        merge_partials([one, one, two])
+    other = run_shard(tmp_path / "other", mets, templates, (2, 2), digest="other")
+    with pytest.raises(PartialError, match="project config"):
+        merge_partials([one, other])
+    (tmp_path / "junk.jsonl.gz").write_bytes(b"not gzip")
+    with pytest.raises(PartialError, match="Cannot read"):
+        merge_partials([tmp_path / "junk.jsonl.gz"])
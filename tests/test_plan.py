@@ -0,0 +1,57 @@
+"""Tests for the compiled comparison plan and config validation."""
+import pytest
+from lxml import etree
+
+from compare_mets.config import (DEFAULT_NAMESPACES, ConfigError, default_config, load_config,
+                                 make_config)
+from compare_mets.plan import compile_plan
+from compare_mets.sections import collect_sections, parse
+
+from test_compare import build_doc
+
+CONFIG = default_config()
+
+
+def test_single_pass_collection_matches_xpath(tmp_path):
+    path = tmp_path / "OBJ1_mets.xml"
+    path.write_text(build_doc(), encoding="utf-8")
+    plan = compile_plan(CONFIG)
+    tree = parse(str(path))
+    collected = collect_sections(tree.getroot(), plan.specs)
+    for xpath, find in plan.xpaths.items():
+        assert collected[xpath] == find(tree), xpath
+    assert plan.extract(str(path), streaming=False).keys() == plan.xpaths.keys()
+
+
+@pytest.mark.parametrize("xpath", ["//mets:dmdSec[", "//nope:dmdSec"])
+def test_invalid_section_xpath_is_a_config_error(xpath):
+    config = make_config(DEFAULT_NAMESPACES, [("broken", xpath)], ())
+    with pytest.raises(ConfigError, match="broken"):
+        compile_plan(config)
+
+
+def test_load_config_reports_malformed_files(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text('ignore_text = ["nope:eventDateTime"]\n', encoding="utf-8")
+    with pytest.raises(ConfigError, match="nope"):
+        load_config(path)
+    path.write_text('[[sections]]\nlabel = "no xpath"\n', encoding="utf-8")
+    with pytest.raises(ConfigError):
+        load_config(path)
+    path.write_text("sections = [", encoding="utf-8")
+    with pytest.raises(ConfigError):
+        load_config(path)
+
+
+def test_plan_keeps_prefixes_and_ignore_set():
+    plan = compile_plan(CONFIG)
+    assert plan.prefixes["http://www.loc.gov/METS/"] == "mets"
+    assert plan.ignore_text == CONFIG.ignore_text
+    assert isinstance(plan.xpaths['//mets:dmdSec[@ID="DMD1"]'], etree.XPath)
+
+
+def test_invalid_alignment_keys_are_config_errors():
+    for align in ({"premis:event": "@nope:ID"}, {"premis:event": "nope:child"},
+                  {"nope:event": "hash"}):
+        with pytest.raises(ConfigError):
+            compile_plan(make_config(DEFAULT_NAMESPACES, [("s", "//mets:dmdSec")], (), align))
@@ -0,0 +1,111 @@
+"""Tests for reading files ahead of the parser."""
+import threading
+import time
+
+import pytest
+
+from compare_mets import prefetch
+from compare_mets.cli import parse_args, parse_serve_args, parse_watch_args
+from compare_mets.compare import compare_files, compare_one
+from compare_mets.config import default_config
+from compare_mets.prefetch import Prefetcher, read_file
+from compare_mets.timings import Timings
+
+from test_compare import build_doc, write_pairs
+
+CONFIG = default_config()
+
+
+def test_read_file_small_and_mapped(tmp_path):
+    path = tmp_path / "doc.xml"
+    path.write_bytes(b"<a>" + b"x" * 5000 + b"</a>")
+    assert read_file(path) == path.read_bytes()
+    assert read_file(path, mmap_threshold=1024) == path.read_bytes()
+    empty = tmp_path / "empty.xml"
+    empty.write_bytes(b"")
+    assert read_file(empty, mmap_threshold=0) == b""
+
+
+def test_iterate_keeps_order_and_reports_failed_reads(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"{i}.xml"
+        path.write_bytes(str(i).encode())
+        paths.append(path)
+    paths[5] = tmp_path / "missing.xml"
+    prefetcher = Prefetcher(budget=1024, threads=3)
+    try:
+        out = list(prefetcher.iterate(range(20), lambda i: [paths[i]]))
+    finally:
+        prefetcher.close()
+    assert [item for item, _ in out] == list(range(20))
+    assert out[0][1] == {paths[0]: b"0"}
+    assert isinstance(out[5][1][paths[5]], FileNotFoundError)
+
+
+def test_read_ahead_stops_at_byte_budget(tmp_path):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f"{i}.xml"
+        path.write_bytes(b"x" * 100)
+        paths.append(path)
+    started = []
+    lock = threading.Lock()
+
+    def read(path):
+        with lock:
+            started.append(path)
+        return prefetch.read_file(path)
+
+    prefetcher = Prefetcher(budget=250, threads=2, read=read)
+    try:
+        items = prefetcher.iterate(range(10), lambda i: [paths[i]])
+        next(items)
+        time.sleep(0.2)
+        # Item 0 was handed out; items 1 and 2 fill the 250-byte budget.
+        assert len(started) == 3
+        assert len(list(items)) == 9
+    finally:
+        prefetcher.close()
+
+
+def test_compare_one_parses_prefetched_bytes(tmp_path):
+    template = tmp_path / "OBJ1_mets_template.xml"
+    mets = tmp_path / "batch" / "OBJ1_mets.xml"
+    mets.parent.mkdir()
+    template.write_text(build_doc(), encoding="utf-8")
+    mets.write_text(build_doc(ppn="changed"), encoding="utf-8")
+    expected = compare_one("OBJ1", mets, template, CONFIG)
+    prefetched = {mets: mets.read_bytes(), template: template.read_bytes()}
+    for streaming in (True, False):
+        timings = Timings()
+        assert compare_one("OBJ1", mets, template, CONFIG, streaming,
+                           timings=timings, prefetched=prefetched) == expected
+        assert timings.counters["bytes_read"] == sum(map(len, prefetched.values()))
+
+
+def test_compare_one_reports_failed_prefetch(tmp_path):
+    template = tmp_path / "OBJ1_mets_template.xml"
+    template.write_text(build_doc(), encoding="utf-8")
+    mets = tmp_path / "OBJ1_mets.xml"
+    _, findings = compare_one("OBJ1", mets, template, CONFIG, prefetched={
+        mets: FileNotFoundError(2, "No such file"), template: template.read_bytes()})
+    assert [f.kind for f in findings] == ["parse-error"]
+
+
+def test_compare_files_with_prefetch_matches_without(tmp_path):
+    mets, templates = write_pairs(tmp_path, 10, changed=range(2))
+    timings = Timings()
+    errors = compare_files(mets, templates, CONFIG, max_workers=2,
+                           prefetch=1024 * 1024, timings=timings)
+    assert dict(errors) == dict(compare_files(mets, templates, CONFIG, max_workers=2))
+    assert "worker_read_wait" in timings.phases
+
+
+def test_negative_prefetch_is_a_usage_error(tmp_path):
+    for parse in (parse_args, parse_watch_args, parse_serve_args):
+        argv = ["templates"] if parse is parse_serve_args else ["templates", "batch"]
+        with pytest.raises(SystemExit) as exit_info:
+            parse([*argv, "--prefetch", "-5"])
+        assert exit_info.value.code == 2
+        assert parse([*argv, "--prefetch", "0"]).prefetch == 0
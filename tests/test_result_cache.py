@@ -0,0 +1,84 @@
+"""Tests for the content-addressed result cache."""
+import logging
+
+import pytest
+
+from compare_mets.cli import parse_args
+from compare_mets.compare import compare_files
+from compare_mets.config import config_digest, default_config
+from compare_mets.findings import Finding
+from compare_mets.result_cache import ResultCache
+
+from test_compare import build_doc
+from test_template_index import write_pair
+
+CONFIG = default_config()
+
+
+def test_rerun_serves_unchanged_pairs_from_cache(tmp_path):
+    t1, m1 = write_pair(tmp_path, build_doc(), build_doc(ppn="1"), "OBJ1")
+    t2, m2 = write_pair(tmp_path, build_doc(), build_doc(), "OBJ2")
+    mets, templates = {"OBJ1": m1, "OBJ2": m2}, {"OBJ1": t1, "OBJ2": t2}
+    cache_path = tmp_path / "cache" / "results.sqlite"
+
+    with ResultCache(cache_path, config_digest(CONFIG)) as cache:
+        first = compare_files(mets, templates, CONFIG, max_workers=1, cache=cache)
+        assert cache.stats() == {"hits": 0, "misses": 2}
+
+    m2.write_text(build_doc(agent="Ander"), encoding="utf-8")
+    with ResultCache(cache_path, config_digest(CONFIG)) as cache:
+        second = compare_files(mets, templates, CONFIG, max_workers=1, cache=cache)
+        assert cache.stats() == {"hits": 1, "misses": 1}
+
+    assert second["OBJ1 - batch"] == first["OBJ1 - batch"]
+    assert [f.mets_value for f in second["OBJ2 - batch"]] == ["Ander"]
+
+
+def test_key_depends_on_config(tmp_path):
+    a = ResultCache(tmp_path / "a.sqlite", "config-a")
+    b = ResultCache(tmp_path / "b.sqlite", "config-b")
+    assert a.key("m", "t") != b.key("m", "t")
+    assert a.key("m", "t") != a.key("t", "m")
+
+
+def test_parse_errors_are_not_cached(tmp_path):
+    with ResultCache(tmp_path / "c.sqlite", "cfg") as cache:
+        cache.put("k1", [Finding("(file)", "parse-error", "x_mets.xml", None, "boom")])
+        assert cache.get("k1") is None
+        cache.put("k2", [])
+        assert cache.get("k2") == []
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    with ResultCache(tmp_path / "c.sqlite", "cfg", max_bytes=10**9) as cache:
+        findings = [Finding("s", "text", f"p{i}", "a" * 50, str(i)) for i in range(20)]
+        for key in ("old", "mid", "new"):
+            cache.put(key, findings)
+        cache.get("old")  # touched, so "mid" is now the least recently used
+        cache.max_bytes = 2 * len(cache._db.execute(
+            "SELECT findings FROM results WHERE key = 'new'").fetchone()[0])
+        assert cache.evict() == 1
+        assert cache.get("mid") is None
+        assert cache.get("old") == findings
+
+
+def test_completion_log_counts_cached_pairs(tmp_path, caplog):
+    t1, m1 = write_pair(tmp_path, build_doc(), build_doc(ppn="1"), "OBJ1")
+    t2, m2 = write_pair(tmp_path, build_doc(), build_doc(), "OBJ2")
+    mets, templates = {"OBJ1": m1, "OBJ2": m2}, {"OBJ1": t1, "OBJ2": t2}
+    cache_path = tmp_path / "results.sqlite"
+    with ResultCache(cache_path, config_digest(CONFIG)) as cache:
+        compare_files(mets, templates, CONFIG, max_workers=1, cache=cache)
+    m2.write_text(build_doc(agent="Ander"), encoding="utf-8")
+    with caplog.at_level(logging.INFO), ResultCache(cache_path, config_digest(CONFIG)) as cache:
+        compare_files(mets, templates, CONFIG, max_workers=1, cache=cache)
+    assert ("Completed comparison for 2 common object IDs (1 served from the result cache)"
+            in caplog.messages)
+
+
+def test_cache_max_size_must_be_positive():
+    for value in ("0", "-1"):
+        with pytest.raises(SystemExit) as exit_info:
+            parse_args(["templates", "batch", "--cache-max-size", value])
+        assert exit_info.value.code == 2
+    assert parse_args(["templates", "batch", "--cache-max-size", "1"]).cache_max_size == 1
@@ -0,0 +1,58 @@
+"""Tests for section selection (streaming and full parse)."""
+from lxml import etree
+
+from compare_mets.config import DEFAULT_NAMESPACES, default_config, make_config
+from compare_mets.sections import extract_sections, stream_spec, stream_specs
+
+from test_compare import build_doc, run_compare
+
+CONFIG = default_config()
+
+BIG_FILESEC = "<mets:fileSec>" + "".join(
+    f'<mets:fileGrp USE="Images"><mets:file ID="FILE{i}"/></mets:fileGrp>'
+    for i in range(200)) + "</mets:fileSec>"
+
+
+def test_stream_spec_accepts_only_simple_xpaths():
+    ns = CONFIG.namespaces
+    assert stream_spec('//mets:dmdSec[@ID="DMD1"]', ns) == (
+        "{http://www.loc.gov/METS/}dmdSec", "ID", "DMD1")
+    assert stream_spec("//kbmd:catalogRecord", ns) == (
+        "{http://schemas.kb.nl/kbmd/v1}catalogRecord", None, None)
+    assert stream_spec("//mets:amdSec/mets:techMD", ns) is None
+    assert stream_spec('//mets:techMD[@ID="A" or @ID="B"]', ns) is None
+    assert stream_spec("//unknown:tag", ns) is None
+    assert stream_specs(CONFIG) is not None
+
+
+def test_streaming_matches_full_parse(tmp_path):
+    path = tmp_path / "OBJ1_mets.xml"
+    path.write_text(build_doc().replace("</mets:mets>", BIG_FILESEC + "</mets:mets>"),
+                    encoding="utf-8")
+    streamed = extract_sections(str(path), CONFIG, streaming=True)
+    full = extract_sections(str(path), CONFIG, streaming=False)
+    assert streamed.keys() == full.keys()
+    for xpath in full:
+        assert ([etree.tostring(n, method="c14n", exclusive=True) for n in streamed[xpath]]
+                == [etree.tostring(n, method="c14n", exclusive=True) for n in full[xpath]])
+    assert [n.get("ID") for n in streamed["//mets:digiprovMD"]] == ["DPMD1", "DPMD2"]
+
+
+def test_non_streamable_xpath_falls_back_to_full_parse(tmp_path):
+    config = make_config(
+        DEFAULT_NAMESPACES,
+        [("mets:sourceMD", "//mets:amdSec/mets:sourceMD[mets:mdWrap]")],
+        ())
+    path = tmp_path / "OBJ1_mets.xml"
+    path.write_text(build_doc(), encoding="utf-8")
+    assert stream_specs(config) is None
+    sections = extract_sections(str(path), config)
+    assert [n.get("ID") for n in sections[config.sections[0][1]]] == ["SMD1", "SMD2"]
+
+
+def test_streamed_compare_reports_change_next_to_large_filesec(tmp_path):
+    tpl = build_doc()
+    mets = build_doc(ppn="987654321").replace("</mets:mets>", BIG_FILESEC + "</mets:mets>")
+    findings = run_compare(tmp_path, tpl, mets)
+    assert [(f.kind, f.template_value, f.mets_value) for f in findings] == [
+        ("text", "123456789", "987654321")]
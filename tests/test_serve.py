@@ -0,0 +1,86 @@
+"""Tests for the comparison service (serve command)."""
+import json
+import threading
+import urllib.request
+
+import pytest
+
+from compare_mets.compare import _init_worker, _plan, _worker_state
+from compare_mets.config import (DEFAULT_NAMESPACES, DEFAULT_SECTIONS, config_digest,
+                                 default_config, make_config)
+from compare_mets.serve import CompareService, is_loopback, make_server, submit_job
+
+from test_compare import build_doc, write_templates
+
+CONFIG = default_config()
+
+
+def write_batch(root, changed=()):
+    for object_id in ("OBJ1", "OBJ2"):
+        path = root / object_id / f"{object_id}_mets.xml"
+        path.parent.mkdir(parents=True)
+        path.write_text(build_doc(ppn="changed") if object_id in changed else build_doc(),
+                        encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def service_url(tmp_path):
+    templates = write_templates(tmp_path, ["OBJ1", "OBJ2"])
+    with CompareService(templates, CONFIG, max_workers=1) as service:
+        server = make_server(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}", templates
+        server.shutdown()
+        server.server_close()
+
+
+def test_jobs_run_on_the_warm_service(service_url, tmp_path):
+    url, templates = service_url
+    clean = submit_job(url, [write_batch(tmp_path / "clean")], tmp_path / "out1")
+    assert clean["exit_code"] == 0 and clean["objects_compared"] == 2
+    assert len(clean["reports"]) == 3
+
+    # A template added while the service runs is found by the next job.
+    (templates / "OBJ3_mets_template.xml").write_text(build_doc(), encoding="utf-8")
+    config = tmp_path / "project.toml"
+    config.write_text('ignore_text = ["premis:eventDateTime"]\n', encoding="utf-8")
+    result = submit_job(url, [write_batch(tmp_path / "changed", changed={"OBJ2"})],
+                        tmp_path / "out2", config=config, json_format="compact")
+    assert result["exit_code"] == 1
+    assert (result["objects_with_findings"], result["templates_not_returned"]) == (1, 1)
+    report = json.loads(open(result["reports"][1], encoding="utf-8").read())
+    assert report["summary"]["objects_compared"] == 2
+
+    with urllib.request.urlopen(f"{url}/health") as response:
+        assert json.load(response)["jobs"] == 2
+
+
+def test_bad_jobs_are_rejected_with_usage_exit_code(service_url, tmp_path):
+    url, _ = service_url
+    missing = submit_job(url, [tmp_path / "missing"], tmp_path / "out")
+    assert missing["exit_code"] == 2 and "does not exist" in missing["error"]
+    (tmp_path / "empty").mkdir()
+    assert "No METS files" in submit_job(url, [tmp_path / "empty"], tmp_path / "out")["error"]
+    bad_config = tmp_path / "bad.toml"
+    bad_config.write_text("ignore_text = [", encoding="utf-8")
+    result = submit_job(url, [write_batch(tmp_path / "batch")], tmp_path / "out",
+                        config=bad_config)
+    assert "Invalid configuration" in result["error"]
+
+
+def test_workers_keep_one_plan_per_config():
+    _init_worker(None, 0, CONFIG)
+    other = make_config(DEFAULT_NAMESPACES, DEFAULT_SECTIONS[:1], [])
+    assert _plan(None) is _plan(CONFIG)
+    assert _plan(other) is _plan(other) is not _plan(CONFIG)
+    assert set(_worker_state()["plans"]) == {config_digest(CONFIG), config_digest(other)}
+    _worker_state().clear()
+
+
+def test_server_only_listens_on_loopback_addresses():
+    assert is_loopback("127.0.0.1") and is_loopback("localhost")
+    assert not is_loopback("0.0.0.0") and not is_loopback("192.0.2.1")
+    with pytest.raises(ValueError, match="no authentication"):
+        make_server(None, "0.0.0.0", 0)
@@ -0,0 +1,62 @@
+"""Tests for spilling findings to disk during a run."""
+import json
+from pathlib import Path
+
+from compare_mets import compare
+from compare_mets.config import default_config
+from compare_mets.findings import StringPool
+from compare_mets.spill import SpilledFindings
+from compare_mets.writer import group_findings, total_findings, write_reports
+
+from test_partial import make_delivery
+from test_writer import make_errors
+
+
+def spill_of(tmp_path, errors):
+    spill = SpilledFindings(tmp_path / "findings.jsonl.gz")
+    for key, findings in errors.items():
+        spill[key] = findings
+    return spill
+
+
+def test_spill_round_trips_findings_in_order(tmp_path):
+    errors = make_errors()
+    spill = spill_of(tmp_path, errors)
+    assert len(spill) == 3
+    assert total_findings(spill) == total_findings(errors) == 4
+    assert list(spill.items()) == list(errors.items())
+    assert list(spill.items()) == list(errors.items())  # every pass re-reads
+    spill.remove()
+    assert not spill.path.exists()
+
+
+def test_reports_from_spill_match_reports_from_dict(tmp_path):
+    errors = make_errors()
+    spill = spill_of(tmp_path, errors)
+    from_dict = write_reports(errors, set(), {"OBJ9"}, tmp_path / "a",
+                              [Path("batchdir")], n_compared=4)
+    from_spill = write_reports(spill, set(), {"OBJ9"}, tmp_path / "b",
+                               [Path("batchdir")], n_compared=4)
+    md_a, js_a, html_a = (p.read_text(encoding="utf-8") for p in from_dict)
+    md_b, js_b, html_b = (p.read_text(encoding="utf-8") for p in from_spill)
+    assert md_a == md_b and html_a == html_b
+    a, b = json.loads(js_a), json.loads(js_b)
+    assert a["objects"] == b["objects"] and a["grouped"] == b["grouped"]
+
+
+def test_spilled_run_keeps_no_strings_per_finding(tmp_path, monkeypatch):
+    mets, templates = make_delivery(tmp_path, 40)
+    expected = compare.compare_files(mets, templates, default_config(), max_workers=2)
+    pools = []
+
+    class RecordingPool(StringPool):
+        def __init__(self):
+            super().__init__()
+            pools.append(self)
+
+    monkeypatch.setattr(compare, "StringPool", RecordingPool)
+    spill = compare.compare_files(mets, templates, default_config(), max_workers=2,
+                                  spill=tmp_path / "findings.jsonl.gz")
+    assert [len(pool._strings) for pool in pools] == [0]
+    assert sorted(spill.items()) == sorted(expected.items())
+    assert dict(group_findings(spill)) == dict(group_findings(expected))
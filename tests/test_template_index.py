@@ -0,0 +1,99 @@
+"""Tests for the on-disk template index."""
+import os
+import zlib
+
+import pytest
+
+from compare_mets.compare import compare_files, compare_one, index_templates
+from compare_mets.config import config_digest, default_config
+from compare_mets.sections import extract_sections
+from compare_mets.template_index import (CorruptEntry, TemplateIndex, decode_sections,
+                                         encode_sections)
+
+from test_compare import build_doc
+
+CONFIG = default_config()
+
+
+def write_pair(tmp_path, template_xml, mets_xml, object_id="OBJ1"):
+    template_path = tmp_path / "templates" / f"{object_id}_mets_template.xml"
+    mets_path = tmp_path / "batch" / "sub" / object_id / f"{object_id}_mets.xml"
+    template_path.parent.mkdir(parents=True, exist_ok=True)
+    mets_path.parent.mkdir(parents=True, exist_ok=True)
+    template_path.write_text(template_xml, encoding="utf-8")
+    mets_path.write_text(mets_xml, encoding="utf-8")
+    return template_path, mets_path
+
+
+def test_encoded_sections_compare_like_parsed_template(tmp_path):
+    template_path, mets_path = write_pair(
+        tmp_path, build_doc(), build_doc(agent="Andere Leverancier B.V."))
+    blob = encode_sections(extract_sections(str(template_path), CONFIG))
+    assert decode_sections(blob).keys() == {xpath for _, xpath in CONFIG.sections}
+
+    from_file = compare_one("OBJ1", mets_path, template_path, CONFIG)
+    from_index = compare_one("OBJ1", mets_path, template_path, CONFIG, template_blob=blob)
+    assert from_index == from_file
+    assert from_index[1][0].mets_value == "Andere Leverancier B.V."
+
+
+def test_changed_template_makes_entry_stale(tmp_path):
+    template_path, _ = write_pair(tmp_path, build_doc(), build_doc())
+    index_path = tmp_path / "index.sqlite"
+    templates = {"OBJ1": template_path}
+    assert index_templates(templates, index_path, CONFIG, max_workers=1) == 1
+    assert index_templates(templates, index_path, CONFIG, max_workers=1) == 0
+
+    template_path.write_text(build_doc(ppn="999999999"), encoding="utf-8")
+    st = template_path.stat()
+    os.utime(template_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    with TemplateIndex(index_path, config_digest(CONFIG)) as index:
+        assert index.stale_ids(templates) == ["OBJ1"]
+    with TemplateIndex(index_path, "other-config") as index:
+        assert index.load("OBJ1") is None
+
+
+def test_compare_files_reads_templates_from_index(tmp_path):
+    template_path, mets_path = write_pair(tmp_path, build_doc(), build_doc(ppn="1"))
+    index_path = tmp_path / "index.sqlite"
+    index_templates({"OBJ1": template_path}, index_path, CONFIG, max_workers=1)
+
+    errors = compare_files({"OBJ1": mets_path}, {"OBJ1": template_path},
+                           config=CONFIG, max_workers=1, template_index=index_path)
+    [(key, findings)] = errors.items()
+    assert key == "OBJ1 - batch"
+    assert [(f.template_value, f.mets_value) for f in findings] == [("123456789", "1")]
+
+
+def test_template_that_fails_to_reindex_is_reported(tmp_path):
+    template_path, mets_path = write_pair(tmp_path, build_doc(), build_doc())
+    index_path = tmp_path / "index.sqlite"
+    index_templates({"OBJ1": template_path}, index_path, CONFIG, max_workers=1)
+
+    template_path.write_text("<mets:mets", encoding="utf-8")
+    st = template_path.stat()
+    os.utime(template_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    errors = compare_files({"OBJ1": mets_path}, {"OBJ1": template_path},
+                           config=CONFIG, max_workers=1, template_index=index_path)
+    [(key, findings)] = errors.items()
+    assert key == "OBJ1 - batch"
+    assert [f.kind for f in findings] == ["parse-error"]
+    with TemplateIndex(index_path, config_digest(CONFIG)) as index:
+        assert index.load("OBJ1") is None
+
+
+def test_corrupt_index_entry_falls_back_to_the_template_file(tmp_path):
+    template_path, mets_path = write_pair(tmp_path, build_doc(), build_doc(ppn="1"))
+    index_path = tmp_path / "index.sqlite"
+    index_templates({"OBJ1": template_path}, index_path, CONFIG, max_workers=1)
+    with TemplateIndex(index_path, config_digest(CONFIG)) as index:
+        st = template_path.stat()
+        index.store("OBJ1", st.st_size, st.st_mtime_ns, b"\x78\x9cgarbage")
+        index.commit()
+
+    errors = compare_files({"OBJ1": mets_path}, {"OBJ1": template_path},
+                           config=CONFIG, max_workers=1, template_index=index_path)
+    [findings] = errors.values()
+    assert [(f.template_value, f.mets_value) for f in findings] == [("123456789", "1")]
+    with pytest.raises(CorruptEntry):
+        decode_sections(zlib.compress(b'{"x": 1}'))
@@ -0,0 +1,49 @@
+"""Tests for run timings, worker aggregation and profile merging."""
+import pstats
+
+from compare_mets.compare import compare_files
+from compare_mets.config import default_config
+from compare_mets.timings import Timings
+
+from test_compare import build_doc
+
+CONFIG = default_config()
+
+
+def test_merge_keeps_the_slowest_files():
+    total = Timings(n_slowest=2)
+    for chunk in ([("A", 0.1), ("B", 0.5)], [("C", 0.3), ("D", 0.05)]):
+        timings = Timings(n_slowest=2)
+        for object_id, seconds in chunk:
+            timings.add_file(object_id, seconds)
+            timings.count("files")
+            timings.add_section("s", seconds)
+        total.merge(timings.export())
+    result = total.to_json()
+    assert [f["object_id"] for f in result["slowest_files"]] == ["B", "C"]
+    assert result["counters"] == {"files": 4}
+    assert result["sections"]["s"]["count"] == 4
+
+
+def test_compare_files_collects_worker_timings_and_profile(tmp_path):
+    template_path = tmp_path / "OBJ_mets_template.xml"
+    template_path.write_text(build_doc(), encoding="utf-8")
+    mets, templates = {}, {}
+    for i in range(6):
+        path = tmp_path / "batch" / f"OBJ{i}_mets.xml"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(build_doc(ppn="changed") if i == 0 else build_doc(), encoding="utf-8")
+        mets[f"OBJ{i}"], templates[f"OBJ{i}"] = path, template_path
+    timings = Timings()
+    profile = tmp_path / "prof" / "run.prof"
+    compare_files(mets, templates, CONFIG, max_workers=2, timings=timings, profile=profile)
+
+    result = timings.to_json()
+    assert result["counters"]["files"] == 6
+    assert result["counters"]["bytes_read"] > 0
+    assert result["counters"]["nodes_compared"] > 0
+    assert "comparison" in result["phases"]
+    assert set(result["sections"]) == {label for label, _ in CONFIG.sections}
+    assert len(result["slowest_files"]) == 6
+    stats = pstats.Stats(str(profile))
+    assert any(func[2] == "compare_one" for func in stats.stats)
@@ -0,0 +1,136 @@
+"""Tests for the normalised section digest used as fast path."""
+from lxml import etree
+
+from compare_mets import tree_compare
+from compare_mets.compare import compare_one
+from compare_mets.config import default_config
+from compare_mets.tree_compare import compare_trees, tree_digest
+
+from test_compare import build_doc
+
+CONFIG = default_config()
+
+
+def el(xml: str):
+    return etree.fromstring(xml)
+
+
+def test_digest_ignores_prefixes_attribute_order_and_whitespace():
+    a = el('<m:a xmlns:m="urn:x" p="1" q="2">\n  <m:b> tekst </m:b>\n</m:a>')
+    b = el('<n:a xmlns:n="urn:x" q="2" p="1"><n:b>tekst</n:b></n:a>')
+    assert tree_digest(a, CONFIG) == tree_digest(b, CONFIG)
+    assert compare_trees(a, b, "s", CONFIG) == []
+
+
+def test_digest_ignores_allowed_text_but_not_structure():
+    premis = 'xmlns:premis="info:lc/xmlns/premis-v2"'
+    a = el(f"<premis:event {premis}><premis:eventDateTime>2023</premis:eventDateTime></premis:event>")
+    b = el(f"<premis:event {premis}><premis:eventDateTime>2026</premis:eventDateTime></premis:event>")
+    c = el(f"<premis:event {premis}><premis:eventDateTime/><premis:x/></premis:event>")
+    assert tree_digest(a, CONFIG) == tree_digest(b, CONFIG)
+    assert tree_digest(a, CONFIG) != tree_digest(c, CONFIG)
+
+
+def test_digest_separates_text_tail_and_attributes():
+    variants = [
+        '<a><b/>x</a>',      # tail
+        '<a><b>x</b></a>',   # text
+        '<a><b x=""/></a>',  # attribute name
+        '<a x=""><b/></a>',  # attribute on parent
+        '<a><b/><b/></a>',
+        '<a><b><b/></b></a>',
+    ]
+    digests = {tree_digest(el(xml), CONFIG) for xml in variants}
+    assert len(digests) == len(variants)
+
+
+def test_fast_path_matches_detailed_comparison(tmp_path):
+    template = build_doc(empty_field="<kbmd:annotation>x</kbmd:annotation>")
+    cases = [
+        build_doc(empty_field="<kbmd:annotation>x</kbmd:annotation>"),
+        build_doc(empty_field="", agent="Ander"),
+        build_doc(digiprov2="", datetime="2026-01-01"),
+        build_doc(rights_attrs='ADMID="TMD00001" ID="RMD2"'),
+    ]
+    template_path = tmp_path / "OBJ1_mets_template.xml"
+    template_path.write_text(template, encoding="utf-8")
+    mets_path = tmp_path / "b" / "s" / "OBJ1" / "OBJ1_mets.xml"
+    mets_path.parent.mkdir(parents=True)
+    for mets in cases:
+        mets_path.write_text(mets, encoding="utf-8")
+        assert (compare_one("OBJ1", mets_path, template_path, CONFIG, fast_path=True)
+                == compare_one("OBJ1", mets_path, template_path, CONFIG, fast_path=False))
+
+
+PREMIS = "info:lc/xmlns/premis-v2"
+
+
+def events(identifiers, outcome=None):
+    root = etree.Element(f"{{{PREMIS}}}object")
+    for value in identifiers:
+        event = etree.SubElement(root, f"{{{PREMIS}}}event")
+        ident = etree.SubElement(event, f"{{{PREMIS}}}eventIdentifier")
+        etree.SubElement(ident, f"{{{PREMIS}}}eventIdentifierValue").text = value
+        etree.SubElement(event, f"{{{PREMIS}}}eventOutcome").text = outcome or f"ok {value}"
+    return root
+
+
+def aligned_config(key):
+    from compare_mets.config import DEFAULT_NAMESPACES, DEFAULT_SECTIONS, make_config
+    return make_config(DEFAULT_NAMESPACES, DEFAULT_SECTIONS, (), {"premis:event": key})
+
+
+def test_keyed_alignment_reports_one_insertion_instead_of_a_cascade():
+    template = events([f"E{i}" for i in range(30)])
+    mets = events([f"E{i}" for i in range(30)])
+    mets.insert(0, events(["NEW"])[0])
+    mets.remove(mets[15])
+
+    cascade = compare_trees(template, mets, "s", CONFIG)
+    assert len(cascade) > 10
+
+    for key in ("premis:eventIdentifier/premis:eventIdentifierValue", "hash"):
+        findings = compare_trees(template, mets, "s", aligned_config(key))
+        assert [(f.kind, f.path) for f in findings] == [
+            ("extra-element", "premis:object/premis:event[1]"),
+            ("missing-element", "premis:object/premis:event[15]"),
+        ], key
+
+
+def test_keyed_alignment_compares_matched_elements():
+    template = events(["A", "B", "C"])
+    mets = events(["C", "A", "B"])
+    mets[2][1].text = "changed"
+    findings = compare_trees(template, mets, "s", aligned_config("premis:eventIdentifier/"
+                                                                 "premis:eventIdentifierValue"))
+    # A and B keep their order and are compared; C moved and is reported
+    # where it was inserted and where it went missing.
+    assert [(f.kind, f.template_value, f.mets_value) for f in findings] == [
+        ("extra-element", None, "premis:event"),
+        ("text", "ok B", "changed"),
+        ("missing-element", "premis:event", None),
+    ]
+
+
+def test_attribute_alignment_key():
+    root = etree.fromstring('<s><f ID="a">1</f><f ID="b">2</f></s>')
+    mets = etree.fromstring('<s><f ID="b">2</f></s>')
+    config = aligned_config("@ID")
+    config.align["f"] = config.align.pop(f"{{{PREMIS}}}event")
+    assert [(f.kind, f.path) for f in compare_trees(root, mets, "s", config)] == [
+        ("missing-element", "s/f[1]")]
+
+
+def test_paths_of_many_findings_count_siblings_once_per_parent(monkeypatch):
+    template = el("<s><a>x</a>" + "<f>1</f>" * 500 + "<g/></s>")
+    mets = el("<s><a>x</a>" + "<f>2</f>" * 500 + "<g/><h/></s>")
+    counted = []
+    child_steps = tree_compare._child_steps
+    monkeypatch.setattr(tree_compare, "_child_steps",
+                        lambda parent, prefixes: counted.append(parent.tag)
+                        or child_steps(parent, prefixes))
+    findings = compare_trees(template, mets, "s", CONFIG)
+    assert len(findings) == 501
+    assert [f.path for f in findings[:2]] == ["s/f[1]", "s/f[2]"]
+    assert (findings[499].path, findings[500].path) == ("s/f[500]", "s/h")
+    assert counted == ["s", "s"]  # template parent, METS parent of the extra element
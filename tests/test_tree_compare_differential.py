@@ -0,0 +1,103 @@
+"""Differential tests: the iterative engine against the original recursive one.
+
+Both engines must report exactly the same findings, in the same order, for
+the fixtures of test_compare and for generated template/METS pairs.
+"""
+import random
+
+import pytest
+from lxml import etree
+
+from compare_mets.config import default_config
+from compare_mets.tree_compare import compare_trees
+
+import reference_tree_compare as reference
+from test_compare import build_doc
+
+CONFIG = default_config()
+
+FIXTURE_VARIANTS = [
+    {},
+    {"ppn": "987654321"},
+    {"empty_field": ""},
+    {"empty_field": "<kbmd:annotation/>"},
+    {"empty_field": "<kbmd:annotation>x</kbmd:annotation><kbmd:extra/>"},
+    {"rights_attrs": 'ADMID="TMD00001" ID="RMD2"'},
+    {"rights_attrs": 'ADMID="TMD00001"'},
+    {"rights_basis": "license"},
+    {"datetime": "2026-01-01"},
+    {"agent": "Ander"},
+    {"digiprov2": ""},
+    {"title": "Andere krant"},
+]
+
+TAGS = ["{urn:a}x", "{urn:a}y", "{urn:b}x", "z"]
+TEXTS = [None, "", "  ", "waarde", "andere waarde"]
+
+
+def both(template_el, mets_el):
+    return (compare_trees(template_el, mets_el, "s", CONFIG, "root"),
+            reference.compare_trees(template_el, mets_el, "s", CONFIG, "root"))
+
+
+@pytest.mark.parametrize("overrides", FIXTURE_VARIANTS)
+def test_fixture_documents(overrides):
+    template = etree.fromstring(build_doc().encode("utf-8"))
+    mets = etree.fromstring(build_doc(**overrides).encode("utf-8"))
+    new, old = both(template, mets)
+    assert new == old
+
+
+def random_tree(rng: random.Random, depth: int = 0):
+    el = etree.Element(rng.choice(TAGS))
+    for name in rng.sample(["a", "b", "{urn:a}c"], rng.randint(0, 2)):
+        el.set(name, rng.choice(["1", "2"]))
+    el.text = rng.choice(TEXTS)
+    if depth < 4:
+        for _ in range(rng.randint(0, 4)):
+            child = random_tree(rng, depth + 1)
+            child.tail = rng.choice(TEXTS)
+            el.append(child)
+    return el
+
+
+def mutate(rng: random.Random, root) -> None:
+    for _ in range(rng.randint(1, 4)):
+        el = rng.choice(list(root.iter()))
+        action = rng.randrange(6)
+        if action == 0:
+            el.text = rng.choice(TEXTS)
+        elif action == 1:
+            el.set(rng.choice(["a", "b", "d"]), rng.choice(["1", "3"]))
+        elif action == 2 and len(el):
+            el.remove(rng.choice(list(el)))
+        elif action == 3:
+            el.insert(rng.randint(0, len(el)), random_tree(rng, 3))
+        elif action == 4 and el is not root:
+            el.tag = rng.choice(TAGS)
+        else:
+            el.tail = rng.choice(TEXTS)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_generated_pairs(seed):
+    rng = random.Random(seed)
+    template = random_tree(rng)
+    mets = etree.fromstring(etree.tostring(template))
+    if seed % 5:
+        mutate(rng, mets)
+    new, old = both(template, mets)
+    assert new == old
+
+
+def test_deep_nesting_does_not_hit_the_recursion_limit():
+    def chain(leaf_text):
+        root = el = etree.Element("a")
+        for _ in range(5000):
+            el = etree.SubElement(el, "a")
+        el.text = leaf_text
+        return root
+
+    findings = compare_trees(chain("x"), chain("y"), "s", CONFIG, "a")
+    assert [(f.kind, f.template_value, f.mets_value) for f in findings] == [("text", "x", "y")]
+    assert findings[0].path.count("/a") == 5000
@@ -0,0 +1,123 @@
+"""Tests for watch mode: comparing METS files while they are uploaded."""
+import json
+import os
+
+from compare_mets.config import default_config
+from compare_mets.parser import get_templates
+from compare_mets.watch import UploadWatcher, watch
+
+from test_compare import build_doc, write_templates
+
+CONFIG = default_config()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def write_mets(batch, object_id, **overrides):
+    path = batch / object_id / f"{object_id}_mets.xml"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(build_doc(**overrides), encoding="utf-8")
+    return path
+
+
+def test_files_are_ready_once_unchanged_for_settle_seconds(tmp_path):
+    batch = tmp_path / "batch"
+    path = write_mets(batch, "OBJ1")
+    clock = Clock()
+    watcher = UploadWatcher([batch], settle=30, clock=clock)
+    assert watcher.poll() == {}
+    clock.now = 20
+    with path.open("a", encoding="utf-8") as f:   # still being written
+        f.write("<!-- more -->")
+    assert watcher.poll() == {}
+    clock.now = 45
+    assert watcher.poll() == {}                    # 25 s since the last change
+    clock.now = 50
+    assert watcher.poll() == {"OBJ1": path}
+    assert watcher.pending == 1
+    watcher.mark_compared([path])
+    assert watcher.poll() == {} and watcher.pending == 0
+
+    write_mets(batch, "OBJ1", ppn="changed")       # re-upload
+    os.utime(path, ns=(0, 10**9))
+    clock.now = 60
+    assert watcher.poll() == {}
+    clock.now = 90
+    assert watcher.poll() == {"OBJ1": path}
+
+
+def test_watch_compares_files_as_they_arrive(tmp_path):
+    batch = tmp_path / "batch"
+    templates = get_templates(write_templates(tmp_path, ["OBJ1", "OBJ2", "OBJ3"]))
+    write_mets(batch, "OBJ1", ppn="changed")
+    uploads = [lambda: write_mets(batch, "OBJ2"),
+               lambda: write_mets(batch, "OBJ4", ppn="changed")]
+    report_names = []
+
+    def sleep(seconds):
+        report_names.append(sorted(p.name for p in (tmp_path / "out").glob("*.json")))
+        if uploads:
+            uploads.pop(0)()
+
+    errors, mets_only, templates_only = watch(
+        [batch], templates, CONFIG, tmp_path / "out", interval=0, settle=0, idle=0,
+        max_workers=1, sleep=sleep)
+    assert [key.split(" - ")[0] for key in errors] == ["OBJ1"]
+    assert mets_only == {"OBJ4"}
+    assert templates_only == {"OBJ3"}
+    assert report_names[0] == ["compare_report-batch-watch.json"]
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == [
+        ".watch", "compare_report-batch-watch.html", "compare_report-batch-watch.json",
+        "compare_report-batch-watch.md"]
+    report = json.loads((tmp_path / "out" / "compare_report-batch-watch.json")
+                        .read_text(encoding="utf-8"))
+    assert report["summary"]["objects_compared"] == 2
+    assert report["summary"]["objects_with_findings"] == 1
+
+
+def test_watch_replaces_findings_of_reuploaded_file(tmp_path):
+    batch = tmp_path / "batch"
+    templates = get_templates(write_templates(tmp_path, ["OBJ1"]))
+    path = write_mets(batch, "OBJ1", ppn="changed")
+
+    def fix():
+        write_mets(batch, "OBJ1")
+        os.utime(path, ns=(0, 10**9))
+
+    uploads = [fix]
+
+    def sleep(seconds):
+        if uploads:
+            uploads.pop(0)()
+
+    errors, _, _ = watch([batch], templates, CONFIG, tmp_path / "out", interval=0,
+                         settle=0, idle=0, max_workers=1, sleep=sleep)
+    assert dict(errors) == {}
+
+
+def test_watch_drops_findings_of_removed_file(tmp_path):
+    batch = tmp_path / "batch"
+    templates = get_templates(write_templates(tmp_path, ["OBJ1", "OBJ2"]))
+    write_mets(batch, "OBJ1", ppn="changed")
+    removed = write_mets(batch, "OBJ2", ppn="changed")
+    report = tmp_path / "out" / "compare_report-batch-watch.json"
+    summaries = []
+
+    def sleep(seconds):
+        summaries.append(json.loads(report.read_text(encoding="utf-8"))["summary"])
+        if removed.exists():
+            removed.unlink()   # no other upload is pending
+
+    errors, _, templates_only = watch([batch], templates, CONFIG, tmp_path / "out",
+                                      interval=0, settle=0, idle=0, max_workers=1,
+                                      sleep=sleep)
+    assert [key.split(" - ")[0] for key in errors] == ["OBJ1"]
+    assert templates_only == {"OBJ2"}
+    assert [s["objects_with_findings"] for s in summaries[:2]] == [2, 1]
+    assert summaries[1]["objects_compared"] == 1
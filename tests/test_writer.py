@@ -1,4 +1,5 @@
 """Tests for report grouping and output files."""
+import json
 from pathlib import Path
 
 from compare_mets.findings import Finding
@@ -47,3 +48,38 @@ def test_html_marks_change_in_all_objects(tmp_path):
     content = htm.read_text(encoding="utf-8")
     assert "count all" in content
     assert "3 / 3 objects" in content
+
+
+def test_cache_stats_in_summary(tmp_path):
+    md, js, _ = write_reports(make_errors(), set(), set(), tmp_path, [Path("batchdir")],
+                              n_compared=3, cache_stats={"hits": 2, "misses": 1})
+    assert "- Result cache: 2 hits, 1 misses" in md.read_text(encoding="utf-8")
+    assert json.loads(js.read_text(encoding="utf-8"))["summary"]["cache"] == {
+        "hits": 2, "misses": 1}
+
+
+def test_gzip_json_report_holds_same_data(tmp_path):
+    import gzip
+    _, pretty, _ = write_reports(make_errors(), set(), set(), tmp_path / "a",
+                                 [Path("batchdir")], n_compared=3)
+    _, packed, _ = write_reports(make_errors(), set(), set(), tmp_path / "b",
+                                 [Path("batchdir")], n_compared=3, json_format="gzip")
+    assert packed.name.endswith(".json.gz")
+    data = json.loads(gzip.decompress(packed.read_bytes()).decode("utf-8"))
+    expected = json.loads(pretty.read_text(encoding="utf-8"))
+    assert data["objects"] == expected["objects"]
+    assert data["grouped"] == expected["grouped"]
+
+
+def test_merged_chunk_groups_match_group_findings():
+    from compare_mets.findings import StringPool, StringTable, encode_findings
+    from compare_mets.grouping import ChunkGroups, FindingGroups
+
+    errors = make_errors()
+    groups, pool = FindingGroups(), StringPool()
+    for chunk in (["OBJ3 - batch"], ["OBJ1 - batch", "OBJ2 - batch"]):
+        table, chunk_groups = StringTable(), ChunkGroups()
+        for key in chunk:
+            chunk_groups.add(key.split(" - ")[0], encode_findings(errors[key], table))
+        groups.merge(chunk_groups.export(), pool.resolve(table.strings))
+    assert groups.finalise() == group_findings(errors)